@@ -0,0 +1,70 @@
+import hashlib
+import os
+import re
+
+import numpy as np
+
+
+class CacheUtils:
+    DEFAULT_DIR = "data/cache"
+
+    file_digests = {}
+
+    @staticmethod
+    def file_digest(path: str) -> str:
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+        if memo_key not in CacheUtils.file_digests:
+            digest = hashlib.blake2b(digest_size=16)
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+
+            CacheUtils.file_digests[memo_key] = digest.hexdigest()
+
+        return CacheUtils.file_digests[memo_key]
+
+    @staticmethod
+    def key(*parts) -> str:
+        return hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def path(cache_dir: str, name: str, key: str, extension: str) -> str:
+        return os.path.join(cache_dir, f"{name}-{key}{extension}")
+
+    @staticmethod
+    def evict(cache_dir: str, name: str, key: str, extension: str) -> None:
+        # removes the files cached for name under any key other than this one
+        pattern = re.compile(re.escape(name) + "-[0-9a-f]{32}" + re.escape(extension))
+        keep = os.path.basename(CacheUtils.path(cache_dir, name, key, extension))
+        try:
+            files = os.listdir(cache_dir)
+        except OSError:
+            return
+
+        for file in files:
+            if file != keep and pattern.fullmatch(file):
+                try:
+                    os.remove(os.path.join(cache_dir, file))
+                except OSError:
+                    pass
+
+    @staticmethod
+    def load_npz(path: str) -> dict[str, np.ndarray] | None:
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                return {name: data[name] for name in data.files}
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def save_npz(path: str, **arrays: np.ndarray) -> None:
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                np.savez(f, **arrays)
+            os.replace(temp_path, path)
+        except OSError:
+            pass
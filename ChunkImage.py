@@ -0,0 +1,78 @@
+import math
+
+import numpy as np
+from matplotlib.colors import to_rgba
+
+from PointTable import PointTable
+
+
+class ChunkImage:
+    # paints chunk points into an RGBA image with one pixel per region file, or per k x k block of them when the
+    # window is wider than max_size pixels
+    def __init__(self, points_list: PointTable, colors: list[str], region_conversion: int, max_size: int = 2048):
+        self.cells = np.column_stack((points_list.x, points_list.y)).astype(np.int64) // region_conversion
+        self.region = points_list.region
+        self.palette = np.array([to_rgba(color) for color in colors] or [(0, 0, 0, 0)], dtype=np.float32)
+        self.region_conversion = region_conversion
+        self.max_size = max_size
+
+        if len(self.cells):
+            self.lower = self.cells.min(axis=0)
+            self.upper = self.cells.max(axis=0) + 1
+        else:
+            self.lower = np.zeros(2, dtype=np.int64)
+            self.upper = np.ones(2, dtype=np.int64)
+
+        self.image = None
+        self.updating = False
+
+    def extent(self) -> tuple[float, float, float, float]:
+        return (self.lower[0] * self.region_conversion, self.upper[0] * self.region_conversion,
+                self.lower[1] * self.region_conversion, self.upper[1] * self.region_conversion)
+
+    def render(self, xlim=None, ylim=None) -> tuple[np.ndarray, tuple[float, float, float, float]]:
+        lower = self.lower.copy()
+        upper = self.upper.copy()
+
+        if xlim is not None and ylim is not None:
+            window_lower = np.floor(np.array([min(xlim), min(ylim)]) / self.region_conversion).astype(np.int64)
+            window_upper = np.ceil(np.array([max(xlim), max(ylim)]) / self.region_conversion).astype(np.int64)
+            lower = np.clip(window_lower, self.lower, self.upper - 1)
+            upper = np.clip(window_upper, lower + 1, self.upper)
+
+        factor = max(1, math.ceil(int((upper - lower).max()) / self.max_size))
+        shape = -(-(upper - lower) // factor)
+
+        visible = np.all((self.cells >= lower) & (self.cells < upper), axis=1)
+        pixels = (self.cells[visible] - lower) // factor
+
+        image = np.zeros((shape[1], shape[0], 4), dtype=np.float32)
+        image[pixels[:, 1], pixels[:, 0]] = self.palette[self.region[visible]]
+
+        upper = lower + shape * factor
+        extent = (lower[0] * self.region_conversion, upper[0] * self.region_conversion,
+                  lower[1] * self.region_conversion, upper[1] * self.region_conversion)
+
+        return image, extent
+
+    def attach(self, axs, zorder: float = 1):
+        image, extent = self.render()
+        self.image = axs.imshow(image, extent=extent, origin="lower", interpolation="nearest", zorder=zorder)
+
+        # re-render the visible window at full detail whenever the view is zoomed or panned
+        def update(changed_axs):
+            if self.updating:
+                return
+
+            self.updating = True
+            try:
+                image, extent = self.render(changed_axs.get_xlim(), changed_axs.get_ylim())
+                self.image.set_data(image)
+                self.image.set_extent(extent)
+            finally:
+                self.updating = False
+
+        axs.callbacks.connect("xlim_changed", update)
+        axs.callbacks.connect("ylim_changed", update)
+
+        return self.image
@@ -0,0 +1,46 @@
+import numpy as np
+
+from CacheUtils import CacheUtils
+
+
+class ChunkListing:
+    # the region2d files seen by the last sync, by file name, with the (mtime, size) the server reported for each
+    def __init__(self, entries: dict[str, tuple[int, int]] = None):
+        self.entries = entries if entries is not None else {}
+
+    def add(self, name: str, mtime: int, size: int) -> None:
+        self.entries[name] = (mtime or 0, size or 0)
+
+    def diff(self, previous) -> tuple[list[str], list[str]]:
+        # a region file rewritten in place keeps its coordinates, so only added and removed names matter to the store
+        if previous is None:
+            return list(self.entries), []
+
+        added = [name for name in self.entries if name not in previous.entries]
+        removed = [name for name in previous.entries if name not in self.entries]
+
+        return added, removed
+
+    @staticmethod
+    def region_of(name: str) -> tuple[int, int] | None:
+        nums = name.split('.')
+        if len(nums) < 3 or nums[-1] != "2dr":
+            return None
+
+        try:
+            return int(nums[0]), int(nums[1])
+        except ValueError:
+            return None
+
+    def save(self, path: str) -> None:
+        names = list(self.entries)
+        attributes = np.array([self.entries[name] for name in names], dtype=np.int64).reshape(-1, 2)
+        CacheUtils.save_npz(path, names=np.array(names, dtype=str), mtimes=attributes[:, 0], sizes=attributes[:, 1])
+
+    @staticmethod
+    def load(path: str):
+        data = CacheUtils.load_npz(path)
+        if data is None:
+            return None
+
+        return ChunkListing(dict(zip(data["names"].tolist(), zip(data["mtimes"].tolist(), data["sizes"].tolist()))))
@@ -0,0 +1,94 @@
+import os
+import struct
+
+import numpy as np
+
+
+class ChunkStore:
+    # flat little-endian file of int32 (x, z) region2d coordinates behind a fixed size header
+    MAGIC = b"BTECHUNK"
+    VERSION = 1
+    HEADER = struct.Struct("<8sIIQ")
+    DTYPE = np.dtype("<i4")
+
+    EXTENSION = ".bin"
+
+    @staticmethod
+    def path(region_name: str, data_dir: str = "data") -> str:
+        return os.path.join(data_dir, region_name + "_chunks" + ChunkStore.EXTENSION)
+
+    @staticmethod
+    def legacy_path(region_name: str, data_dir: str = "data") -> str:
+        return os.path.join(data_dir, region_name + "_chunks")
+
+    @staticmethod
+    def keys(regions: np.ndarray) -> np.ndarray:
+        regions = np.asarray(regions).reshape(-1, 2).astype(np.int64)
+        return (regions[:, 0] << 32) | (regions[:, 1] & 0xffffffff)
+
+    @staticmethod
+    def write(path: str, regions) -> None:
+        regions = np.ascontiguousarray(np.asarray(regions).reshape(-1, 2), dtype=ChunkStore.DTYPE)
+
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(ChunkStore.HEADER.pack(ChunkStore.MAGIC, ChunkStore.VERSION, 0, len(regions)))
+            regions.tofile(f)
+
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def read(path: str) -> np.ndarray:
+        with open(path, "rb") as f:
+            magic, version, _, count = ChunkStore.HEADER.unpack(f.read(ChunkStore.HEADER.size))
+
+        if magic != ChunkStore.MAGIC or version != ChunkStore.VERSION:
+            raise ValueError(f"{path} is not a version {ChunkStore.VERSION} chunk store")
+
+        if count == 0:
+            return np.zeros((0, 2), dtype=ChunkStore.DTYPE)
+
+        return np.memmap(path, dtype=ChunkStore.DTYPE, mode="r", offset=ChunkStore.HEADER.size, shape=(count, 2))
+
+    @staticmethod
+    def read_legacy(path: str) -> np.ndarray:
+        if os.path.getsize(path) == 0:
+            return np.zeros((0, 2), dtype=ChunkStore.DTYPE)
+
+        return np.loadtxt(path, dtype=np.int64, ndmin=2).reshape(-1, 2).astype(ChunkStore.DTYPE)
+
+    @staticmethod
+    def load(region_name: str, data_dir: str = "data") -> np.ndarray:
+        # converts a "x y" per line chunk list left over from older syncs the first time it is read
+        path = ChunkStore.path(region_name, data_dir)
+        legacy_path = ChunkStore.legacy_path(region_name, data_dir)
+
+        if not os.path.exists(path) and os.path.exists(legacy_path):
+            ChunkStore.write(path, ChunkStore.read_legacy(legacy_path))
+
+        return ChunkStore.read(path)
+
+    @staticmethod
+    def count(region_name: str, data_dir: str = "data") -> int:
+        # regions stored, read from the header or the legacy chunk list without converting it
+        path = ChunkStore.path(region_name, data_dir)
+        if os.path.exists(path):
+            return len(ChunkStore.read(path))
+
+        legacy_path = ChunkStore.legacy_path(region_name, data_dir)
+        if os.path.exists(legacy_path):
+            return len(ChunkStore.read_legacy(legacy_path))
+
+        return 0
+
+    @staticmethod
+    def apply_delta(path: str, added, removed) -> np.ndarray:
+        regions = np.asarray(ChunkStore.read(path))
+        removed = np.asarray(removed, dtype=np.int64).reshape(-1, 2)
+
+        if len(removed):
+            regions = regions[~np.isin(ChunkStore.keys(regions), ChunkStore.keys(removed))]
+
+        regions = np.concatenate((regions, np.asarray(added, dtype=ChunkStore.DTYPE).reshape(-1, 2)))
+        ChunkStore.write(path, regions)
+        return regions
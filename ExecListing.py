@@ -0,0 +1,83 @@
+import shlex
+import zlib
+
+import paramiko
+
+from ChunkListing import ChunkListing
+from Instrumentation import Instrumentation
+from SftpPool import SftpPool
+
+
+class ExecListing:
+    # every region2d name with its mtime and size from one remote find, gzipped on the server and parsed as it streams
+    # in, instead of a READDIR round trip per batch of full attribute structs
+    TRAILER = b"#end"
+    READ_SIZE = 1 << 16
+    # seconds without any output before the exec is given up for SFTP
+    TIMEOUT = 60
+
+    @staticmethod
+    def command(directory: str) -> str:
+        # the trailer is only printed when find succeeded, so a missing directory, a find without -printf or a
+        # missing gzip all end in an incomplete stream rather than a silently short listing
+        trailer = ExecListing.TRAILER.decode()
+        return (f"cd {shlex.quote(directory)} && {{ find . -maxdepth 1 -type f -name '*.2dr' -printf '%f %T@ %s\\n' "
+                f"&& echo '{trailer}'; }} | gzip -1")
+
+    @staticmethod
+    def parse(chunks, listing: ChunkListing) -> bool:
+        # adds every listed file to the listing and returns whether the stream ran to the trailer
+        decompressor = zlib.decompressobj(wbits=31)
+        rest = b""
+        complete = False
+
+        for chunk in chunks:
+            lines = (rest + decompressor.decompress(chunk)).split(b"\n")
+            rest = lines.pop()
+
+            for line in lines:
+                if line == ExecListing.TRAILER:
+                    complete = True
+                    continue
+
+                name, mtime, size = line.decode().rsplit(" ", 2)
+                if ChunkListing.region_of(name) is not None:
+                    # find prints fractional seconds, SFTP reports whole ones
+                    listing.add(name, int(mtime.split(".")[0]), int(size))
+
+        return complete and decompressor.eof and not rest
+
+    @staticmethod
+    def read(channel: paramiko.Channel, record: dict):
+        while True:
+            data = channel.recv(ExecListing.READ_SIZE)
+            if not data:
+                return
+
+            record["bytes"] = record.get("bytes", 0) + len(data)
+            yield data
+
+    @staticmethod
+    def list_directory(pool: SftpPool, username: str, directory: str, listing: ChunkListing) -> bool:
+        # returns False when the server refuses the exec or the command does not run to the end, the listing should
+        # then be thrown away and made over SFTP
+        with Instrumentation.stage("exec_listing", directory=directory) as record:
+            try:
+                channel = pool.get_transport(username).open_session()
+            except (paramiko.SSHException, OSError, EOFError):
+                return False
+
+            try:
+                channel.settimeout(ExecListing.TIMEOUT)
+                channel.exec_command(ExecListing.command(directory))
+                complete = ExecListing.parse(ExecListing.read(channel, record), listing)
+                complete = channel.recv_exit_status() == 0 and complete
+            except (paramiko.SSHException, OSError, EOFError, zlib.error, ValueError):
+                # socket timeouts and dropped channels included, the listing is then made over SFTP
+                return False
+            finally:
+                channel.close()
+
+            record["files"] = len(listing.entries)
+
+        return complete
@@ -0,0 +1,92 @@
+import json
+import re
+from collections.abc import Iterator
+
+
+class GeoJsonReader:
+    # inside a feature only braces and strings matter, coordinate arrays are skipped by the regex engine itself
+    FEATURE_TOKENS = re.compile(r'"(?:[^"\\]|\\.)*"|"|[{}]')
+    TOP_LEVEL_TOKENS = re.compile(r'"(?:[^"\\]|\\.)*"|"|[{}\[\]]')
+    FEATURES_ARRAY = re.compile(r'\s*:\s*\[')
+    PROPERTIES_KEY = re.compile(r'"properties"\s*:\s*')
+
+    DECODER = json.JSONDecoder()
+
+    @staticmethod
+    def feature_name(properties: dict) -> str:
+        name = ""
+        name = properties.get("name", name)
+        name = properties.get("NAME", name)
+        name = properties.get("ADMIN", name)
+        return name
+
+    @staticmethod
+    def iter_features(path: str, names=None, chunk_size: int = 1 << 20) -> Iterator[dict]:
+        # yields the parsed features whose name is in names (or every feature when names is None), only ever holding
+        # the text of a single feature in memory and never decoding the geometry of features that are filtered out
+        for text in GeoJsonReader.iter_feature_texts(path, chunk_size):
+            if names is not None:
+                match = GeoJsonReader.PROPERTIES_KEY.search(text)
+                properties = GeoJsonReader.DECODER.raw_decode(text, match.end())[0] if match else {}
+
+                if not isinstance(properties, dict) or GeoJsonReader.feature_name(properties) not in names:
+                    continue
+
+            yield json.loads(text)
+
+    @staticmethod
+    def iter_feature_texts(path: str, chunk_size: int = 1 << 20) -> Iterator[str]:
+        with open(path, "r", encoding="utf-8") as f:
+            buffer = ""
+            position = 0
+            depth = 0
+            in_features = False
+            feature_start = None
+            eof = False
+
+            while True:
+                tokens = GeoJsonReader.TOP_LEVEL_TOKENS if depth <= 1 else GeoJsonReader.FEATURE_TOKENS
+                match = tokens.search(buffer, position)
+
+                # a lone quote is a string cut off by the end of the buffer, as is a "features" key without its array
+                incomplete = match is None or match.group() == '"'
+                if not incomplete and depth == 1 and match.group() == '"features"':
+                    array = GeoJsonReader.FEATURES_ARRAY.match(buffer, match.end())
+                    incomplete = array is None and not buffer[match.end():].strip(" \t\r\n:")
+
+                if incomplete:
+                    if eof:
+                        return
+
+                    rescan = match.start() if match is not None else len(buffer)
+                    keep = feature_start if feature_start is not None else rescan
+                    buffer = buffer[keep:]
+                    position = rescan - keep
+                    if feature_start is not None:
+                        feature_start = 0
+
+                    chunk = f.read(chunk_size)
+                    eof = not chunk
+                    buffer += chunk
+                    continue
+
+                token = match.group()
+                position = match.end()
+
+                if token == "{":
+                    if depth == 1 and in_features:
+                        feature_start = match.start()
+                    depth += 1
+                elif token == "}":
+                    depth -= 1
+                    if depth == 1 and feature_start is not None:
+                        yield buffer[feature_start:position]
+                        feature_start = None
+                elif token == "]":
+                    if depth == 1:
+                        in_features = False
+                elif depth == 1 and token == '"features"':
+                    array = GeoJsonReader.FEATURES_ARRAY.match(buffer, position)
+                    if array is not None:
+                        in_features = True
+                        position = array.end()
@@ -0,0 +1,137 @@
+import cProfile
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+
+class Instrumentation:
+    # named pipeline stages with their duration, item counts and the rates derived from them. code records into the
+    # active instance through Instrumentation.stage, which does nothing when none is installed
+    ACTIVE = None
+
+    RATE_KEYS = ("points", "vertices", "features", "chunks", "files", "tiles", "bytes")
+    FORMATS = ("table", "jsonl")
+
+    def __init__(self, output=None, output_format: str = "table", profile: list[str] = None,
+                 trace_memory: list[str] = None, profile_dir: str = "data/profiles"):
+        if output_format not in Instrumentation.FORMATS:
+            raise ValueError(f"Unknown metrics format {output_format!r}, expected one of {Instrumentation.FORMATS}")
+
+        self.output = output
+        self.output_format = output_format
+        self.profile = set(profile or [])
+        self.trace_memory = set(trace_memory or [])
+        self.profile_dir = profile_dir
+
+        self.records = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.started = time.perf_counter()
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = Instrumentation.ACTIVE
+        Instrumentation.ACTIVE = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        Instrumentation.ACTIVE = self.previous
+        self.previous = None
+
+    @staticmethod
+    def stage(name: str, **fields):
+        if Instrumentation.ACTIVE is None:
+            return contextlib.nullcontext({})
+
+        return Instrumentation.ACTIVE.record(name, **fields)
+
+    @contextlib.contextmanager
+    def record(self, name: str, **fields):
+        # the yielded dict takes item counts filled in while the stage runs
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+
+        record = {"stage": name, "parent": stack[-1]["stage"] if stack else None, "depth": len(stack),
+                  "thread": threading.current_thread().name, **fields}
+
+        profiler = None
+        if name in self.profile and not getattr(self.local, "profiling", False):
+            profiler = cProfile.Profile()
+            self.local.profiling = True
+
+        tracing = name in self.trace_memory
+        started_tracing = tracing and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        elif tracing:
+            tracemalloc.reset_peak()
+
+        stack.append(record)
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                self.local.profiling = False
+
+            seconds = time.perf_counter() - start
+            stack.pop()
+
+            if tracing:
+                record["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+                if started_tracing:
+                    tracemalloc.stop()
+
+            if profiler is not None:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                path = os.path.join(self.profile_dir, f"{name}-{os.getpid()}-{len(self.records)}.prof")
+                profiler.dump_stats(path)
+                record["profile"] = path
+
+            record["start"] = start - self.started
+            record["seconds"] = seconds
+            for key in Instrumentation.RATE_KEYS:
+                if isinstance(record.get(key), (int, float)) and seconds > 0:
+                    record[key + "_per_s"] = record[key] / seconds
+
+            with self.lock:
+                self.records.append(record)
+                if self.output is not None and self.output_format == "jsonl":
+                    self.output.write(json.dumps(record) + "\n")
+                    self.output.flush()
+
+    def summary(self) -> str:
+        # one row per stage name in the order stages were first entered, repeated stages are summed
+        rows = {}
+        for record in sorted(self.records, key=lambda record: record["start"]):
+            row = rows.setdefault(record["stage"], {"depth": record["depth"], "calls": 0, "seconds": 0.0})
+            row["calls"] += 1
+            row["seconds"] += record["seconds"]
+            for key in Instrumentation.RATE_KEYS:
+                if isinstance(record.get(key), (int, float)):
+                    row[key] = row.get(key, 0) + record[key]
+            if "peak_bytes" in record:
+                row["peak_bytes"] = max(row.get("peak_bytes", 0), record["peak_bytes"])
+
+        lines = [f"{'stage':<32} {'calls':>6} {'seconds':>10}  rates"]
+        for name, row in rows.items():
+            rates = ", ".join(f"{row[key] / row['seconds']:,.0f} {key}/s" for key in Instrumentation.RATE_KEYS
+                              if key in row and row["seconds"] > 0)
+            if "peak_bytes" in row:
+                rates += f"{', ' if rates else ''}peak {row['peak_bytes'] / 2 ** 20:,.1f} MiB"
+            lines.append(f"{'  ' * row['depth'] + name:<32} {row['calls']:>6} {row['seconds']:>10.3f}  {rates}")
+
+        return "\n".join(lines)
+
+    def report(self) -> None:
+        if self.output_format == "table":
+            print(self.summary(), file=self.output or sys.stdout)
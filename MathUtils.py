@@ -1,5 +1,7 @@
 import math
 
+import numpy as np
+
 
 class MathUtils:
     ROOT3 = math.sqrt(3)
@@ -57,3 +59,37 @@ class MathUtils:
                 result[i] += matrix[i][j] * vector[j]
 
         return result[0], result[1], result[2]
+
+    @staticmethod
+    def geo_to_spherical_array(longitudes: np.ndarray, latitudes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        l = np.radians(longitudes)
+        p = np.radians(90 - latitudes)
+        return l, p
+
+    @staticmethod
+    def spherical_to_geo_array(l: np.ndarray, p: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        lon = np.degrees(l)
+        lat = 90 - np.degrees(p)
+        return lon, lat
+
+    @staticmethod
+    def spherical_to_cartesian_array(l: np.ndarray, p: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        sin_phi = np.sin(p)
+        x = sin_phi * np.cos(l)
+        y = sin_phi * np.sin(l)
+        z = np.cos(p)
+        return x, y, z
+
+    @staticmethod
+    def cartesian_to_spherical_array(x: np.ndarray, y: np.ndarray, z: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        l = np.arctan2(y, x)
+        p = np.arctan2(np.sqrt(x * x + y * y), z)
+        return l, p
+
+    @staticmethod
+    def mat_vec_prod_d_array(matrices: np.ndarray, x: np.ndarray, y: np.ndarray, z: np.ndarray) -> tuple[
+        np.ndarray, np.ndarray, np.ndarray]:
+        # matrices has shape (n, 3, 3); summed in the same order as mat_vec_prod_d so results match bit for bit
+        return (matrices[:, 0, 0] * x + matrices[:, 0, 1] * y + matrices[:, 0, 2] * z,
+                matrices[:, 1, 0] * x + matrices[:, 1, 1] * y + matrices[:, 1, 2] * z,
+                matrices[:, 2, 0] * x + matrices[:, 2, 1] * y + matrices[:, 2, 2] * z)
@@ -0,0 +1,55 @@
+import numpy as np
+
+
+class PointTable:
+    # columnar chunk points: int32 block coordinates, a region id column and a packed inside-the-border bitmask
+    def __init__(self, x: np.ndarray, y: np.ndarray, region: np.ndarray, inside: np.ndarray = None):
+        self.x = np.ascontiguousarray(x, dtype=np.int32)
+        self.y = np.ascontiguousarray(y, dtype=np.int32)
+
+        region = np.asarray(region)
+        region_dtype = np.uint8 if not len(region) or region.max() < 256 else np.uint16
+        self.region = np.ascontiguousarray(region, dtype=region_dtype)
+
+        if inside is None:
+            inside = np.zeros(len(self.x), dtype=bool)
+        self.inside_bits = np.packbits(np.asarray(inside, dtype=bool))
+
+    @staticmethod
+    def from_regions(points_by_region: list[np.ndarray], inside_by_region: list[np.ndarray], region_ids: list[int]):
+        counts = [len(points) for points in points_by_region]
+        points = (np.concatenate(points_by_region) if points_by_region else np.zeros((0, 2))).reshape(-1, 2)
+        inside = np.concatenate(inside_by_region) if inside_by_region else np.zeros(0, dtype=bool)
+
+        return PointTable(points[:, 0], points[:, 1], np.repeat(np.asarray(region_ids, dtype=np.int64), counts), inside)
+
+    def __len__(self) -> int:
+        return len(self.x)
+
+    @property
+    def points(self) -> np.ndarray:
+        return np.column_stack((self.x, self.y))
+
+    @property
+    def inside(self) -> np.ndarray:
+        return np.unpackbits(self.inside_bits, count=len(self.x)).astype(bool)
+
+    @property
+    def nbytes(self) -> int:
+        return self.x.nbytes + self.y.nbytes + self.region.nbytes + self.inside_bits.nbytes
+
+    def select(self, mask: np.ndarray):
+        return PointTable(self.x[mask], self.y[mask], self.region[mask], self.inside[mask])
+
+    def inside_points(self):
+        return self.select(self.inside)
+
+    def region_ids(self) -> np.ndarray:
+        return np.unique(self.region)
+
+    def region_points(self, region_id: int) -> np.ndarray:
+        mask = self.region == region_id
+        return np.column_stack((self.x[mask], self.y[mask]))
+
+    def counts(self, minlength: int = 0) -> np.ndarray:
+        return np.bincount(self.region, minlength=minlength)
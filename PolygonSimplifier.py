@@ -0,0 +1,192 @@
+import numpy as np
+
+from RegionRaster import RegionRaster
+from SpatialIndex import BoundingBoxGrid
+
+
+class PolygonSimplifier:
+    # douglas-peucker on the border chains of projected rings, checked on the region lattice near every edge it changed
+    ATTEMPTS = 4
+
+    @staticmethod
+    def segment_distances(points: np.ndarray, start: np.ndarray, stop: np.ndarray) -> np.ndarray:
+        direction = stop - start
+        length = float(np.dot(direction, direction))
+        if length == 0:
+            return np.hypot(*(points - start).T)
+
+        t = np.clip((points - start) @ direction / length, 0, 1)
+        return np.hypot(*(points - start - t[:, np.newaxis] * direction).T)
+
+    @staticmethod
+    def douglas_peucker(line: np.ndarray, tolerance: float) -> np.ndarray:
+        # mask of the vertices kept, the two ends always are
+        keep = np.zeros(len(line), dtype=bool)
+        keep[[0, -1]] = True
+
+        stack = [(0, len(line) - 1)]
+        while stack:
+            first, last = stack.pop()
+            if last - first < 2:
+                continue
+
+            distances = PolygonSimplifier.segment_distances(line[first + 1:last], line[first], line[last])
+            farthest = int(np.argmax(distances))
+            if distances[farthest] > tolerance:
+                split = first + 1 + farthest
+                keep[split] = True
+                stack.append((first, split))
+                stack.append((split, last))
+
+        return keep
+
+    @staticmethod
+    def vertex_ids(rings: list[np.ndarray]) -> list[np.ndarray]:
+        # one id per distinct point, neighbouring states share the exact projected vertices of their common border
+        if not rings:
+            return []
+
+        _, inverse = np.unique(np.concatenate(rings), axis=0, return_inverse=True)
+        return np.split(inverse.ravel(), np.cumsum([len(ring) for ring in rings])[:-1])
+
+    @staticmethod
+    def open_count(ring: np.ndarray) -> int:
+        # vertices of a ring without the closing copy of its first one
+        return len(ring) - 1 if len(ring) > 1 and np.array_equal(ring[0], ring[-1]) else len(ring)
+
+    @staticmethod
+    def nodes(rings: list[np.ndarray], ids: list[np.ndarray]) -> list[np.ndarray]:
+        # positions where a border chain starts or ends: vertices with other than two distinct edges, where borders of
+        # several rings meet or part. a ring without any gets its lowest id vertex and the one farthest from it, so
+        # every copy of it, like an island and the lake it fills, is cut the same way
+        counts = [PolygonSimplifier.open_count(ring) for ring in rings]
+        edges = np.concatenate([np.column_stack((ring_ids[:count], np.roll(ring_ids[:count], -1)))
+                                for ring_ids, count in zip(ids, counts)] or [np.zeros((0, 2), dtype=np.int64)])
+        edges = np.unique(np.sort(edges[edges[:, 0] != edges[:, 1]], axis=1), axis=0)
+        size = max((int(ring_ids.max()) + 1 for ring_ids in ids if len(ring_ids)), default=0)
+        degree = np.bincount(edges.ravel(), minlength=size)
+
+        nodes = []
+        for ring, ring_ids, count in zip(rings, ids, counts):
+            positions = np.flatnonzero(degree[ring_ids[:count]] != 2)
+            if not len(positions) and count:
+                first = int(np.argmin(ring_ids[:count]))
+                distances = np.hypot(*(ring[:count] - ring[first]).T)
+                farthest = np.flatnonzero(distances == distances.max())
+                positions = np.unique([first, farthest[np.argmin(ring_ids[farthest])]])
+            nodes.append(positions)
+
+        return nodes
+
+    @staticmethod
+    def simplify_chains(rings: list[np.ndarray], ids: list[np.ndarray], tolerance: float) -> list[np.ndarray]:
+        # douglas-peucker once per chain of border between two nodes, in an orientation that does not depend on the
+        # ring it was met in, so both sides of a shared border keep the same vertices
+        masks = {}
+        keeps = []
+        for ring, ring_ids, positions in zip(rings, ids, PolygonSimplifier.nodes(rings, ids)):
+            keep = np.ones(len(ring), dtype=bool)
+            count = PolygonSimplifier.open_count(ring)
+            if count < 4:
+                keeps.append(keep)
+                continue
+
+            for first, last in zip(positions, np.append(positions[1:], positions[0] + count)):
+                chain = np.arange(first, last + 1) % count
+                chain_ids = ring_ids[chain]
+                reverse = tuple(chain_ids[::-1].tolist()) < tuple(chain_ids.tolist())
+                if reverse:
+                    chain = chain[::-1]
+
+                key = chain_ids[::-1].tobytes() if reverse else chain_ids.tobytes()
+                if key not in masks:
+                    masks[key] = PolygonSimplifier.douglas_peucker(ring[chain], tolerance)
+                keep[chain] = masks[key]
+
+            # rings smaller than the tolerance would collapse to a line, they keep every vertex instead
+            if np.count_nonzero(keep[:count]) < 3:
+                keep[:] = True
+            keep[count:] = keep[0]
+            keeps.append(keep)
+
+        return PolygonSimplifier.unify(keeps, ids)
+
+    @staticmethod
+    def unify(keeps: list[np.ndarray], ids: list[np.ndarray]) -> list[np.ndarray]:
+        # a vertex kept by any ring is kept by every ring it is on
+        if not keeps:
+            return keeps
+
+        kept = np.zeros(max(int(ring_ids.max()) + 1 if len(ring_ids) else 0 for ring_ids in ids), dtype=bool)
+        for keep, ring_ids in zip(keeps, ids):
+            kept[ring_ids[keep]] = True
+
+        return [kept[ring_ids] for ring_ids in ids]
+
+    @staticmethod
+    def spans(keep: np.ndarray) -> list[tuple[int, int]]:
+        # (first, last) kept vertex of every run of dropped ones, last may be len(ring) for the wrap back to vertex 0
+        kept = np.flatnonzero(np.append(keep, True))
+        gaps = np.flatnonzero(np.diff(kept) > 1)
+        return list(zip(kept[gaps].tolist(), kept[gaps + 1].tolist()))
+
+    @staticmethod
+    def changed_edges(rings: list[np.ndarray], spans: list[list[tuple[int, int]]]) -> tuple[np.ndarray, np.ndarray]:
+        # start and end points of the original edges a simplified edge replaced
+        start = []
+        stop = []
+        for ring, ring_spans in zip(rings, spans):
+            closed = np.concatenate((ring, ring[:1]))
+            for first, last in ring_spans:
+                start.append(closed[first:last])
+                stop.append(closed[first + 1:last + 1])
+
+        if not start:
+            return np.zeros((0, 2)), np.zeros((0, 2))
+
+        return np.concatenate(start), np.concatenate(stop)
+
+    @staticmethod
+    def padding(region_conversion: int, radius: float, tolerance: float) -> float:
+        # the buffered outline reaches twice the radius past an edge, and a simplified edge is within the tolerance
+        # of the original ones it replaces
+        return 2 * abs(radius) + 2 * tolerance + region_conversion
+
+    @staticmethod
+    def band_points(bounds: np.ndarray, start: np.ndarray, stop: np.ndarray, region_conversion: int,
+                    padding: float) -> tuple[np.ndarray, np.ndarray]:
+        # ids and coordinates of the region lattice points within padding of the edges, inside the given bounds
+        lower = np.ceil(bounds[:2] / region_conversion).astype(np.int64)
+        upper = np.floor(bounds[2:] / region_conversion).astype(np.int64)
+        if np.any(upper < lower) or not len(start):
+            return np.zeros(0, dtype=np.int64), np.zeros((0, 2))
+
+        shape = (upper[1] - lower[1] + 1, upper[0] - lower[0] + 1)
+        cells = RegionRaster.band_cells(start, stop, lower, shape, padding, region_conversion)
+        return cells, (np.column_stack((cells % shape[1], cells // shape[1])) + lower) * float(region_conversion)
+
+    @staticmethod
+    def refine(rings: list[np.ndarray], keeps: list[np.ndarray], spans: list[list[tuple[int, int]]],
+               points: np.ndarray, padding: float, tolerance: float):
+        # spans with a moved point within padding of them are simplified again at the lower tolerance, returns the
+        # new masks and the spans that changed
+        boxes = []
+        owners = []
+        for ring_id, (ring, ring_spans) in enumerate(zip(rings, spans)):
+            closed = np.concatenate((ring, ring[:1]))
+            for first, last in ring_spans:
+                span = closed[first:last + 1]
+                boxes.append([*span.min(axis=0), *span.max(axis=0)])
+                owners.append((ring_id, first, last))
+
+        keeps = [np.append(keep, True) for keep in keeps]
+        refined = [[] for _ in rings]
+        for box_id, _ in BoundingBoxGrid(BoundingBoxGrid.pad(boxes, padding)).query_points(points):
+            ring_id, first, last = owners[box_id]
+            closed = np.concatenate((rings[ring_id], rings[ring_id][:1]))
+
+            span_keep = keeps[ring_id][first:last + 1]
+            span_keep |= PolygonSimplifier.douglas_peucker(closed[first:last + 1], tolerance)
+            refined[ring_id].extend((first + a, first + b) for a, b in PolygonSimplifier.spans(span_keep[:-1]))
+
+        return [keep[:-1] for keep in keeps], refined
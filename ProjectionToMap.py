@@ -1,164 +1,681 @@
-import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 
 import matplotlib.path as Path
 import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib.collections import PolyCollection
 
+from CacheUtils import CacheUtils
+from ChunkImage import ChunkImage
+from ChunkStore import ChunkStore
+from GeoJsonReader import GeoJsonReader
+from Instrumentation import Instrumentation
+from PointTable import PointTable
+from PolygonSimplifier import PolygonSimplifier
+from RegionRaster import RegionRaster
+from SpatialIndex import BoundingBoxGrid, SegmentGrid
+from TileExporter import TileExporter
 from projections.GeographicProjection import GeographicProjection
 
 map_scale = 7318261.522857145
 radius = 16 * 32 * 4
 region_conversion = 16 * 32
+# starting douglas-peucker tolerance of the optional border simplification, in projected units
+simplify_tolerance = region_conversion / 8
 
 
-def is_ccw(p):
-    v = p.vertices - p.vertices[0, :]
-    a = np.arctan2(v[1:, 1], v[1:, 0])
-    return (a[1:] >= a[:-1]).astype(int).mean() >= 0.5
+class Map:
+    # bump when the packed geometry layout changes so old geo caches are not read back
+    CACHE_VERSION = 3
 
+    # rough costs of one contains_points call in point-vertex tests: a fixed overhead plus stroking the buffered
+    # outline once per vertex, measured against matplotlib's point in path test
+    CALL_COST = 7000
+    STROKE_COST = 32
 
-class Map:
-    def __init__(self, geo_file: str, projection: GeographicProjection):
+    def __init__(self, geo_file: str, projection: GeographicProjection, cache_dir=None, names=None, simplify=False):
         self.features = []
-        data = {}
-        with open(geo_file, "r") as f:
-            data = json.load(f)
-
-        if data["features"]:
-            for feature in data["features"]:
-                self.features.append(Feature(feature, projection))
+        self.indexes = {}
+        self.segment_indexes = {}
+        self.tolerance = simplify_tolerance if simplify else None
+
+        if names is not None:
+            names = set(names)
+
+        with Instrumentation.stage("geo_load", bytes=os.path.getsize(geo_file)) as record:
+            record["cached"] = self.load_features(geo_file, projection, cache_dir, names)
+            record["features"] = len(self.features)
+            record["vertices"] = sum(len(ring) for feature in self.features for poly in feature.polygons
+                                     for ring in poly.rings)
+
+    def load_features(self, geo_file, projection, cache_dir, names):
+        cache_path = None
+        if cache_dir:
+            key = CacheUtils.key(CacheUtils.file_digest(geo_file), projection.name(), map_scale,
+                                 sorted(names) if names is not None else None, self.tolerance, Map.CACHE_VERSION)
+            cache_path = CacheUtils.path(cache_dir, "geo", key, ".npz")
+
+            cached = CacheUtils.load_npz(cache_path)
+            if cached is not None:
+                self.features = Map.unpack_features(cached)
+                return True
+
+        # features no region asks for are skipped by the reader before their geometry is ever decoded
+        for feature in GeoJsonReader.iter_features(geo_file, names):
+            self.features.append(Feature(feature, projection))
+
+        if self.tolerance is not None:
+            Map.simplify_features(self.features, self.tolerance)
+
+        if cache_path:
+            CacheUtils.save_npz(cache_path, **self.pack_features())
+
+        return False
+
+    @staticmethod
+    def simplify_features(features, tolerance):
+        # all features at once, a border two states share is simplified the same way for both of them
+        polygons = MyPolygon.simplify_shared([poly for feature in features for poly in feature.polygons], tolerance)
+        for feature in features:
+            feature.polygons, polygons = polygons[:len(feature.polygons)], polygons[len(feature.polygons):]
+            feature.set_paths()
+
+    def pack_features(self):
+        # the first ring of every polygon is its outer ring, orientation is already normalized
+        polygons = [poly for feature in self.features for poly in feature.polygons]
+        rings = [ring for poly in polygons for ring in poly.rings]
+
+        return {
+            "names": np.array([feature.name for feature in self.features], dtype=str),
+            "feature_offsets": np.concatenate(([0], np.cumsum([len(feature.polygons) for feature in self.features],
+                                                              dtype=np.int64))),
+            "polygon_offsets": np.concatenate(([0], np.cumsum([len(poly.rings) for poly in polygons],
+                                                              dtype=np.int64))),
+            "ring_offsets": np.concatenate(([0], np.cumsum([len(ring) for ring in rings], dtype=np.int64))),
+            "vertices": np.concatenate(rings) if rings else np.zeros((0, 2)),
+        }
+
+    @staticmethod
+    def unpack_features(data):
+        feature_offsets = data["feature_offsets"].tolist()
+        polygon_offsets = data["polygon_offsets"].tolist()
+        ring_offsets = data["ring_offsets"].tolist()
+        vertices = data["vertices"]
+
+        rings = [np.asarray(vertices[ring_offsets[i]:ring_offsets[i + 1]]) for i in range(len(ring_offsets) - 1)]
+        polygons = [MyPolygon.from_projected(rings[polygon_offsets[i]:polygon_offsets[i + 1]])
+                    for i in range(len(polygon_offsets) - 1)]
+
+        return [Feature.from_polygons(name, polygons[feature_offsets[i]:feature_offsets[i + 1]])
+                for i, name in enumerate(data["names"].tolist())]
 
     def get_geo(self, filter_list):
         return [poly for geo in [feature.get_geo(filter_list) for feature in self.features] for poly in geo]
 
+    def get_index(self, filter_list):
+        key = tuple(sorted(filter_list))
+        if key not in self.indexes:
+            features = [feature for feature in self.features if feature.name in filter_list]
+            self.indexes[key] = (features, Map.build_index(features))
+
+        return self.indexes[key]
+
+    @staticmethod
+    def build_index(features):
+        # boxes are per polygon so only points near some part of a feature are tested against it
+        counts = [len(feature.polygons) for feature in features]
+        polygon_features = np.repeat(np.arange(len(features)), counts)
+        polygon_ids = np.arange(sum(counts)) - np.repeat(np.cumsum(counts) - counts, counts)
+        boxes = np.array([poly.bounds for feature in features for poly in feature.polygons]).reshape(-1, 4)
+
+        return BoundingBoxGrid(boxes), polygon_features.tolist(), polygon_ids.tolist()
+
+    def get_segment_index(self, filter_list):
+        key = tuple(sorted(filter_list))
+        if key not in self.segment_indexes:
+            features = [feature for feature in self.features if feature.name in filter_list]
+            self.segment_indexes[key] = (features, *Map.build_segment_index(features))
+
+        return self.segment_indexes[key]
+
+    @staticmethod
+    def build_segment_index(features):
+        # every ring edge of the features, tagged with the feature it belongs to
+        rings = [(feature_id, ring) for feature_id, feature in enumerate(features) for poly in feature.polygons
+                 for ring in poly.rings]
+        if not rings:
+            return SegmentGrid(np.zeros((0, 2)), np.zeros((0, 2))), np.zeros(0, dtype=np.int64)
+
+        start = np.concatenate([ring for _, ring in rings])
+        stop = np.concatenate([np.roll(ring, -1, axis=0) for _, ring in rings])
+        owners = np.concatenate([np.full(len(ring), feature_id) for feature_id, ring in rings])
+
+        # an edge two of the features share lies inside their union, not on its outline
+        swap = (start[:, 0] > stop[:, 0]) | ((start[:, 0] == stop[:, 0]) & (start[:, 1] > stop[:, 1]))
+        edges = np.where(swap[:, np.newaxis], np.column_stack((stop, start)), np.column_stack((start, stop)))
+        _, inverse = np.unique(edges, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+
+        first_owner = np.full(inverse.max() + 1, len(features))
+        last_owner = np.full(inverse.max() + 1, -1)
+        np.minimum.at(first_owner, inverse, owners)
+        np.maximum.at(last_owner, inverse, owners)
+        border = first_owner[inverse] == last_owner[inverse]
+
+        return SegmentGrid(start[border], stop[border]), owners[border]
+
+    def distance_to_border(self, filter_list, points, names=False):
+        # signed distance in blocks from every point to the outline of the selected states, negative inside, and the
+        # name of the state whose border is nearest when asked. thresholds can then be applied without any geometry
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        features, grid, owners = self.get_segment_index(filter_list)
+
+        with Instrumentation.stage("border_distance", points=len(points)):
+            distance, segments = grid.nearest(points)
+            distance[Map.contains_points(*self.get_index(filter_list), points, 0)] *= -1
+
+        if not names:
+            return distance
+
+        feature_names = np.array([feature.name for feature in features] + [None], dtype=object)
+        # points with no border at all, from an empty selection, get None through the extra owner at index -1
+        return distance, feature_names[np.append(owners, len(features))[segments]]
+
+    def get_feature_ids(self, filter_list):
+        return tuple(i for i, feature in enumerate(self.features) if feature.name in filter_list)
+
+    @staticmethod
+    def compound_candidates(feature, hits):
+        # the points to test against the whole feature at once, or None when polygon by polygon is cheaper. costs are
+        # in point-vertex tests and the union is only built once a lower bound says it may pay
+        polygon_cost = sum((len(candidates) + Map.STROKE_COST) * len(poly.path.vertices) + Map.CALL_COST
+                           for poly, candidates in hits if len(candidates))
+        vertices = len(feature.path.vertices)
+        compound_cost = Map.STROKE_COST * vertices + Map.CALL_COST
+
+        if max(len(candidates) for _, candidates in hits) * vertices + compound_cost > polygon_cost:
+            return None
+
+        union = np.unique(np.concatenate([candidates for _, candidates in hits]))
+        return union if len(union) * vertices + compound_cost <= polygon_cost else None
+
     def is_point_inside(self, filter_list, points):
-        contains = [False] * len(points)
-        for feature in self.features:
-            contains = [a or b for a, b in zip(contains, feature.are_points_inside(filter_list, points))]
+        features, index = self.get_index(filter_list)
+        return Map.contains_points(features, index, points)
+
+    @staticmethod
+    def contains_points(features, index, points, radius=radius):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        contains = np.zeros(len(points), dtype=bool)
+
+        grid, polygon_features, polygon_ids = index
+        candidates_by_feature = {}
+        for poly_id, candidates in grid.query_points(points):
+            candidates_by_feature.setdefault(int(polygon_features[poly_id]), []).append((poly_id, candidates))
+
+        for feature_id in sorted(candidates_by_feature):
+            feature = features[feature_id]
+            hits = [(feature.polygons[polygon_ids[poly_id]], candidates[~contains[candidates]])
+                    for poly_id, candidates in candidates_by_feature[feature_id]]
+
+            # a feature of many small polygons, like an archipelago, is one call over its compound path, while a few
+            # large ones are cheaper tested one by one against only the points near each
+            union = Map.compound_candidates(feature, hits)
+            if union is not None:
+                contains[union] = feature.contains_points(points[union], radius)
+                continue
+
+            for poly, candidates in hits:
+                candidates = candidates[~contains[candidates]]
+                if len(candidates):
+                    contains[candidates] = poly.contains_points(points[candidates], radius)
 
         return contains
 
 
 class Feature:
     def __init__(self, data, projection: GeographicProjection):
-        self.name = ""
-        self.name = data["properties"].get("name", self.name)
-        self.name = data["properties"].get("NAME", self.name)
-        self.name = data["properties"].get("ADMIN", self.name)
+        self.name = GeoJsonReader.feature_name(data["properties"])
 
         self.polygons = []
 
         if data["geometry"]["type"] == "Polygon":
-            self.polygons.append(MyPolygon(data["geometry"]["coordinates"][0], projection))
+            self.polygons.append(MyPolygon(data["geometry"]["coordinates"], projection))
 
         if data["geometry"]["type"] == "MultiPolygon":
             for poly in data["geometry"]["coordinates"]:
-                self.polygons.append(MyPolygon(poly[0], projection))
+                self.polygons.append(MyPolygon(poly, projection))
+
+        self.set_paths()
+
+    @staticmethod
+    def from_polygons(name, polygons):
+        feature = Feature.__new__(Feature)
+        feature.name = name
+        feature.polygons = polygons
+        feature.set_paths()
+        return feature
+
+    def set_paths(self):
+        # every outer ring in one compound path and every hole in another, matplotlib tests each subpath on its own
+        # and ORs the results, so holes cannot share the outer rings' path
+        self.path = MyPolygon.compound_path([poly.rings[0] for poly in self.polygons])
+
+        holes = [ring for poly in self.polygons for ring in poly.rings[1:]]
+        self.holes = MyPolygon.compound_path(holes) if holes else None
 
     def get_geo(self, filter_list):
         if self.name in filter_list or not filter_list:
-            return [polygon.path.vertices for polygon in self.polygons]
+            return [ring for polygon in self.polygons for ring in polygon.rings]
         else:
             return []
 
+    def contains_points(self, points, radius=radius):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if not self.polygons or not len(points):
+            return np.zeros(len(points), dtype=bool)
+
+        contains = self.path.contains_points(points, radius=radius)
+
+        if self.holes is not None and contains.any():
+            in_hole = np.flatnonzero(contains)[self.holes.contains_points(points[contains], radius=radius)]
+
+            # a point in some hole can still be on an island inside it, so those few are settled polygon by polygon
+            if len(in_hole):
+                settled = np.zeros(len(in_hole), dtype=bool)
+                for poly in self.polygons:
+                    settled |= poly.contains_points(points[in_hole], radius)
+                contains[in_hole] = settled
+
+        return contains
+
     def are_points_inside(self, filter_list, points):
-        contains = [False] * len(points)
         if self.name in filter_list:
-            for poly in self.polygons:
-                contains = [a or b for a, b in
-                            zip(contains, poly.path.contains_points(points, radius=radius * poly.radius_multiplier))]
+            return self.contains_points(points)
 
-        return contains
+        return np.zeros(len(points), dtype=bool)
 
 
 class MyPolygon:
+    # one polygon of a feature: its outer ring and any holes, projected, with outer rings counterclockwise and holes
+    # clockwise so a positive contains_points radius grows the outer ring and shrinks the holes alike
     def __init__(self, data, projection: GeographicProjection):
-        self.radius_multiplier = 1
+        rings = [np.asarray(ring, dtype=np.float64).reshape(-1, 2) for ring in data]
+        lengths = [len(ring) for ring in rings]
+        coords = np.concatenate(rings) if rings else np.zeros((0, 2))
 
-        geometry = data
+        x, y = projection.from_geo_array(coords[:, 0], coords[:, 1])
+        geometry = np.column_stack((x, y)) * map_scale
 
-        geometry = [list(projection.from_geo(coord[0], coord[1])) for coord in geometry]
-        geometry = [[coord[0] * map_scale, coord[1] * map_scale] for coord in geometry]
+        self.set_geometry(np.split(geometry, np.cumsum(lengths)[:-1]))
 
-        self.path = Path.Path(geometry)
+    @staticmethod
+    def from_projected(rings):
+        polygon = MyPolygon.__new__(MyPolygon)
+        polygon.set_geometry(rings)
+        return polygon
 
-        if not is_ccw(self.path):
-            self.radius_multiplier = -1
+    @staticmethod
+    def signed_area(ring):
+        x = ring[:, 0]
+        y = ring[:, 1]
+        return 0.5 * float(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
 
+    @staticmethod
+    def compound_path(rings):
+        vertices = []
+        codes = []
+        for ring in rings:
+            # an explicitly closed ring drops its repeated first vertex in favour of CLOSEPOLY
+            if len(ring) > 1 and np.array_equal(ring[0], ring[-1]):
+                ring = ring[:-1]
 
-class ProjectionToMap:
+            vertices.extend((ring, ring[:1]))
+            codes.append(np.full(len(ring) + 1, Path.Path.LINETO, dtype=Path.Path.code_type))
+            codes[-1][0] = Path.Path.MOVETO
+            codes[-1][-1] = Path.Path.CLOSEPOLY
 
-    def __init__(self, regions, projection: GeographicProjection, geo_file, filtered_region_list=[]):
-        self.regions = regions
-        self.projection = projection
-        self.border_map = Map(geo_file, self.projection)
+        if not vertices:
+            return Path.Path(np.zeros((0, 2)))
 
-        filtered_regions = list(
-            filter(lambda x: x["region_name"] in filtered_region_list or not filtered_region_list, self.regions))
+        return Path.Path(np.concatenate(vertices), np.concatenate(codes))
 
-        self.filtered_states = [filtered_state for filtered_region in filtered_regions for filtered_state in
-                                filtered_region["states"]]
+    def set_geometry(self, rings):
+        rings = [np.asarray(ring, dtype=np.float64).reshape(-1, 2) for ring in rings if len(ring)]
 
-        self.points_list = self.get_points(filtered_regions)
+        # outer rings counterclockwise, holes clockwise
+        self.rings = [ring if (MyPolygon.signed_area(ring) >= 0) == (i == 0) else ring[::-1].copy()
+                      for i, ring in enumerate(rings)]
 
-    def get_points(self, filtered_regions):
-        to_ret = []
-        for i, region in enumerate(filtered_regions):
-            points = []
-            with open("data/" + region["region_name"] + "_chunks", "r") as infile:
-                for line in infile:
-                    nums = line.split(' ')
-                    x = int(nums[0])
-                    y = -int(nums[1])
+        self.path = MyPolygon.compound_path(self.rings[:1])
+        self.holes = MyPolygon.compound_path(self.rings[1:]) if len(self.rings) > 1 else None
 
-                    points.append([x * region_conversion, y * region_conversion])
+        # the buffered outline of contains_points reaches at most twice the radius past a vertex at miter limit
+        outer = self.rings[0] if self.rings else np.zeros((1, 2))
+        self.bounds = BoundingBoxGrid.pad([*outer.min(axis=0), *outer.max(axis=0)], 2 * radius)[0]
 
-            points_inside = self.border_map.is_point_inside(region["states"], points)
+    def contains_points(self, points, radius=radius):
+        contains = self.path.contains_points(points, radius=radius)
 
-            to_ret.append({'region': i, 'points': points, 'points_inside': points_inside})
+        if self.holes is not None and contains.any():
+            contains[contains] = ~self.holes.contains_points(points[contains], radius=radius)
 
-        return to_ret
+        return contains
 
-    def get_points_inside(self):
-        # to_ret = [(i, inside_point) for (i,inside_point) in enumerate(inside_points) for i[(_region["points"], _region["points_inside"]) for _region in self.points_list]]
-        to_ret = []
-        for _region in self.points_list:
-            points = _region["points"]
-            inside_points = _region["points_inside"]
+    @staticmethod
+    def simplify_shared(polygons, tolerance):
+        # every border chain is simplified once for all polygons, so neighbours keep sharing their edges exactly.
+        # spans of dropped vertices that would move a region across a polygon's border are simplified again at half
+        # the tolerance, and put back whole on the last attempt, a polygon keeps every vertex if that has still not
+        # settled. a vertex put back is put back on every ring it is on, so its neighbours are checked again
+        rings = [ring for poly in polygons for ring in poly.rings]
+        ids = PolygonSimplifier.vertex_ids(rings)
+        keeps = PolygonSimplifier.simplify_chains(rings, ids, tolerance)
+        offsets = np.cumsum([0] + [len(poly.rings) for poly in polygons])
+
+        # only lattice points this close to a replaced edge can change side
+        padding = PolygonSimplifier.padding(region_conversion, radius, tolerance)
+        bands = {}
+        tolerances = [tolerance] * len(polygons)
+        failures = [0] * len(polygons)
+        checked = [None] * len(polygons)
+
+        pending = range(len(polygons))
+        while pending:
+            failed = []
+            for poly_id in pending:
+                poly, first, last = polygons[poly_id], offsets[poly_id], offsets[poly_id + 1]
+                poly_keeps = keeps[first:last]
+                checked[poly_id] = np.concatenate(poly_keeps) if poly_keeps else None
+                if all(keep.all() for keep in poly_keeps):
+                    continue
+
+                spans = [PolygonSimplifier.spans(keep) for keep in poly_keeps]
+                near, points = PolygonSimplifier.band_points(poly.bounds,
+                                                             *PolygonSimplifier.changed_edges(poly.rings, spans),
+                                                             region_conversion, padding)
+                # kept vertices only ever grow, so a later band is part of the first one, whose classification is reused
+                if poly_id not in bands:
+                    bands[poly_id] = near, points, poly.contains_points(points, radius)
+                cells, points, inside = bands[poly_id]
+                selected = np.isin(cells, near)
+                points, inside = points[selected], inside[selected]
+
+                candidate = MyPolygon.from_projected([ring[keep] for ring, keep in zip(poly.rings, poly_keeps)])
+                moved = candidate.contains_points(points, radius) != inside
+                if not moved.any():
+                    continue
+
+                failures[poly_id] += 1
+                failed.append(poly_id)
+                if failures[poly_id] >= PolygonSimplifier.ATTEMPTS:
+                    keeps[first:last] = [np.ones(len(ring), dtype=bool) for ring in poly.rings]
+                    continue
+
+                last_attempt = failures[poly_id] == PolygonSimplifier.ATTEMPTS - 1
+                tolerances[poly_id] = 0 if last_attempt else tolerances[poly_id] / 2
+                keeps[first:last], _ = PolygonSimplifier.refine(poly.rings, poly_keeps, spans, points[moved], padding,
+                                                                tolerances[poly_id])
+
+            keeps = PolygonSimplifier.unify(keeps, ids)
+            changed = [poly_id for poly_id in range(len(polygons)) if checked[poly_id] is not None
+                       and not np.array_equal(np.concatenate(keeps[offsets[poly_id]:offsets[poly_id + 1]]),
+                                              checked[poly_id])]
+            pending = sorted(set(failed) | set(changed))
+
+        return [MyPolygon.from_projected([ring[keep] for ring, keep in zip(poly.rings, keeps[first:last])])
+                if not all(keep.all() for keep in keeps[first:last]) else poly
+                for poly, first, last in zip(polygons, offsets[:-1], offsets[1:])]
+
+
+class ParallelPruner:
+    # runs Map.is_point_inside over shards of the points on a process pool, the border geometry and the points are
+    # handed to the workers as memory-mapped .npy files instead of being pickled
+    worker_features = None
+    worker_indexes = {}
+
+    def __init__(self, border_map: Map, workers: int):
+        self.border_map = border_map
+        self.workers = workers
+        self.directory = tempfile.mkdtemp(prefix="bte-prune-")
+        self.calls = 0
+
+        for name, array in border_map.pack_features().items():
+            np.save(os.path.join(self.directory, name + ".npy"), array)
+
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=ParallelPruner.init_worker,
+                                            initargs=(self.directory,))
+
+    @staticmethod
+    def init_worker(directory):
+        data = {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode="r" if name == "vertices" else None)
+                for name in ("names", "feature_offsets", "polygon_offsets", "ring_offsets", "vertices")}
+
+        ParallelPruner.worker_features = Map.unpack_features(data)
+        ParallelPruner.worker_indexes = {}
+
+    @staticmethod
+    def classify_shard(points_path, start, stop, feature_ids):
+        if feature_ids not in ParallelPruner.worker_indexes:
+            features = [ParallelPruner.worker_features[i] for i in feature_ids]
+            ParallelPruner.worker_indexes[feature_ids] = (features, Map.build_index(features))
+
+        features, index = ParallelPruner.worker_indexes[feature_ids]
+        points = np.load(points_path, mmap_mode="r")[start:stop]
+
+        return np.packbits(Map.contains_points(features, index, points))
+
+    def is_point_inside(self, filter_list, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if not len(points):
+            return np.zeros(0, dtype=bool)
+
+        self.calls += 1
+        points_path = os.path.join(self.directory, f"points-{self.calls}.npy")
+        np.save(points_path, points)
+
+        feature_ids = self.border_map.get_feature_ids(filter_list)
+        bounds = np.linspace(0, len(points), min(self.workers * 4, len(points)) + 1).astype(np.int64).tolist()
 
-            points_inside = []
+        try:
+            futures = [self.executor.submit(ParallelPruner.classify_shard, points_path, start, stop, feature_ids)
+                       for start, stop in zip(bounds[:-1], bounds[1:])]
 
-            for i, inside_point in enumerate(inside_points):
-                if inside_point:
-                    points_inside.append(points[i])
+            return np.concatenate([np.unpackbits(future.result(), count=stop - start).astype(bool)
+                                   for future, start, stop in zip(futures, bounds[:-1], bounds[1:])])
+        finally:
+            os.remove(points_path)
 
-            to_ret.append({'region': _region["region"], 'points': points_inside})
+    def close(self):
+        self.executor.shutdown()
+        shutil.rmtree(self.directory, ignore_errors=True)
 
-        return to_ret
+    def __enter__(self):
+        return self
 
-    def print(self):
-        fig, axs = plt.subplots()
-        axs.set_aspect('equal', 'datalim')
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
-        border_map_poly_collection = PolyCollection(self.border_map.get_geo(self.filtered_states), facecolors='None')
-        axs.add_collection(border_map_poly_collection)
 
-        polys = []
-        colors = []
+class ProjectionToMap:
+
+    ENGINES = ("path", "raster")
+    RENDER_MODES = ("polygons", "raster")
 
-        for _region in self.points_list:
-            region = self.regions[_region["region"]]
+    def __init__(self, regions, projection: GeographicProjection, geo_file, filtered_region_list=[], engine="path",
+                 cache_dir=CacheUtils.DEFAULT_DIR, workers=1, simplify=False):
+        if engine not in ProjectionToMap.ENGINES:
+            raise ValueError(f"Unknown pruning engine {engine!r}, expected one of {ProjectionToMap.ENGINES}")
 
-            for point in _region["points"]:
-                polys.append([(point[0], point[1]),
-                              (point[0], point[1] + region_conversion),
-                              (point[0] + region_conversion, point[1] + region_conversion),
-                              (point[0] + region_conversion, point[1])])
+        self.regions = regions
+        self.projection = projection
+        self.geo_file = geo_file
+        self.engine = engine
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.pruner = None
+        self.rasters = {}
 
-                colors.append(region["color"])
+        filtered_regions = list(
+            filter(lambda x: x["region_name"] in filtered_region_list or not filtered_region_list, self.regions))
 
-        poly_collection = PolyCollection(polys, facecolors=colors)
-        axs.add_collection(poly_collection)
-        axs.autoscale_view()
-        plt.show()
+        self.filtered_states = [filtered_state for filtered_region in filtered_regions for filtered_state in
+                                filtered_region["states"]]
+
+        self.border_map = Map(geo_file, self.projection, cache_dir, self.filtered_states, simplify)
+
+        self.points_list = self.get_points(filtered_regions)
+
+    def missing_states(self):
+        # configured states the geo file has no feature for, the chunks of their regions would all be classed outside
+        loaded = {feature.name for feature in self.border_map.features}
+        return sorted(set(self.filtered_states) - loaded)
+
+    def get_points(self, filtered_regions):
+        points_by_region = []
+        inside_by_region = []
+        region_ids = []
+
+        try:
+            for region in filtered_regions:
+                with Instrumentation.stage("chunk_load", region=region["region_name"]) as record:
+                    regions = ChunkStore.load(region["region_name"])
+                    points = regions * np.array([region_conversion, -region_conversion], dtype=np.int64)
+                    record["chunks"] = len(points)
+                    record["bytes"] = regions.nbytes
+
+                with Instrumentation.stage("containment", region=region["region_name"], states=region["states"],
+                                           engine=self.engine, points=len(points)):
+                    inside_by_region.append(self.classify_with_cache(region, points))
+
+                points_by_region.append(points)
+                region_ids.append(self.regions.index(region))
+        finally:
+            if self.pruner is not None:
+                self.pruner.close()
+                self.pruner = None
+
+        return PointTable.from_regions(points_by_region, inside_by_region, region_ids)
+
+    def classify(self, states, points):
+        if self.engine == "raster":
+            return self.get_raster(states).contains_points(points)
+
+        if self.workers > 1:
+            # started on the first points the inside cache does not answer, a fully cached run never forks
+            if self.pruner is None:
+                self.pruner = ParallelPruner(self.border_map, self.workers)
+            return self.pruner.is_point_inside(states, points)
+
+        return self.border_map.is_point_inside(states, points)
+
+    def classify_with_cache(self, region, points):
+        # keeps the result of every region point of the last run so a sync that adds a few regions only pays for those.
+        # removed regions are dropped on the next write, and files left under an older border key on the first one
+        if not self.cache_dir:
+            return self.classify(region["states"], points)
+
+        name = "inside-" + region["region_name"]
+        key = self.border_key(region["states"])
+        path = CacheUtils.path(self.cache_dir, name, key, ".npz")
+        keys = ChunkStore.keys(points // region_conversion)
+
+        inside = np.zeros(len(points), dtype=bool)
+        known = np.zeros(len(points), dtype=bool)
+
+        cached = CacheUtils.load_npz(path)
+        if cached is not None and len(cached["keys"]):
+            positions = np.minimum(np.searchsorted(cached["keys"], keys), len(cached["keys"]) - 1)
+            known = cached["keys"][positions] == keys
+            inside[known] = cached["inside"][positions[known]]
+
+        unknown = ~known
+        if unknown.any():
+            inside[unknown] = self.classify(region["states"], points[unknown])
+
+        if cached is None or unknown.any() or len(cached["keys"]) != np.count_nonzero(known):
+            order = np.argsort(keys, kind="stable")
+            CacheUtils.save_npz(path, keys=keys[order], inside=inside[order])
+
+        if cached is None:
+            CacheUtils.evict(self.cache_dir, name, key, ".npz")
+
+        return inside
+
+    def border_key(self, states):
+        return CacheUtils.key(CacheUtils.file_digest(self.geo_file), self.projection.name(), map_scale, radius,
+                              region_conversion, self.border_map.tolerance, sorted(states))
+
+    def get_raster(self, states):
+        key = self.border_key(states)
+
+        if key not in self.rasters:
+            path = CacheUtils.path(self.cache_dir, "raster", key, ".npz") if self.cache_dir else None
+            raster = RegionRaster.load(path) if path else None
+
+            if raster is None:
+                features, _ = self.border_map.get_index(states)
+                raster = RegionRaster.rasterize([poly for feature in features for poly in feature.polygons],
+                                                region_conversion, radius)
+                if path:
+                    raster.save(path)
+
+            self.rasters[key] = raster
+
+        return self.rasters[key]
+
+    def get_points_inside(self):
+        return self.points_list.inside_points()
+
+    def export_tiles(self, output_dir, min_zoom=0, max_zoom=None, workers=4):
+        with Instrumentation.stage("render", mode="tiles", points=len(self.points_list)) as record:
+            exporter = TileExporter(self.points_list, [region["color"] for region in self.regions],
+                                    self.border_map.get_geo(self.filtered_states), region_conversion,
+                                    self.border_key(self.filtered_states))
+            result = exporter.export(output_dir, min_zoom, max_zoom, workers)
+            record["tiles"] = result["rendered"]
+
+        return result
+
+    def print(self, mode="polygons", output=None):
+        if mode not in ProjectionToMap.RENDER_MODES:
+            raise ValueError(f"Unknown render mode {mode!r}, expected one of {ProjectionToMap.RENDER_MODES}")
+
+        with Instrumentation.stage("render", mode=mode, points=len(self.points_list)):
+            fig, axs = plt.subplots()
+            axs.set_aspect('equal', 'datalim')
+
+            border_map_poly_collection = PolyCollection(self.border_map.get_geo(self.filtered_states),
+                                                        facecolors='None', zorder=2)
+            axs.add_collection(border_map_poly_collection)
+
+            if mode == "raster":
+                # one image pixel per region file, so drawing cost no longer grows with the number of chunks
+                chunk_image = ChunkImage(self.points_list, [region["color"] for region in self.regions],
+                                         region_conversion)
+                chunk_image.attach(axs)
+
+                x0, x1, y0, y1 = chunk_image.extent()
+                axs.update_datalim([(x0, y0), (x1, y1)])
+            else:
+                points = self.points_list.points
+                corners = np.array([(0, 0), (0, region_conversion), (region_conversion, region_conversion),
+                                    (region_conversion, 0)])
+                polys = points[:, np.newaxis, :] + corners
+
+                region_colors = np.array([region["color"] for region in self.regions], dtype=object)
+                colors = region_colors[self.points_list.region].tolist()
+
+                poly_collection = PolyCollection(polys, facecolors=colors)
+                axs.add_collection(poly_collection)
+
+            axs.autoscale_view()
+
+        if output:
+            fig.savefig(output, dpi=200)
+            plt.close(fig)
+        else:
+            plt.show()
@@ -0,0 +1,132 @@
+import numpy as np
+
+from CacheUtils import CacheUtils
+
+
+class RegionRaster:
+    # bitmap of the region grid, cell (i, j) says whether the point (origin + (j, i)) * region_conversion is inside
+    def __init__(self, origin: np.ndarray, mask: np.ndarray, region_conversion: int):
+        self.origin = np.asarray(origin, dtype=np.int64)
+        self.mask = mask
+        self.region_conversion = region_conversion
+
+    def contains_points(self, points: np.ndarray) -> np.ndarray:
+        points = np.asarray(points).reshape(-1, 2)
+
+        cells = np.floor_divide(points, self.region_conversion).astype(np.int64) - self.origin
+        on_raster = np.all((cells >= 0) & (cells < self.mask.shape[::-1]), axis=1)
+
+        contains = np.zeros(len(points), dtype=bool)
+        contains[on_raster] = self.mask[cells[on_raster, 1], cells[on_raster, 0]]
+        return contains
+
+    def save(self, path: str) -> None:
+        CacheUtils.save_npz(path, origin=self.origin, shape=np.array(self.mask.shape),
+                            bits=np.packbits(self.mask, axis=None), region_conversion=np.array(self.region_conversion))
+
+    @staticmethod
+    def load(path: str):
+        data = CacheUtils.load_npz(path)
+        if data is None:
+            return None
+
+        shape = tuple(data["shape"].tolist())
+        mask = np.unpackbits(data["bits"], count=shape[0] * shape[1]).astype(bool).reshape(shape)
+        return RegionRaster(data["origin"], mask, int(data["region_conversion"]))
+
+    @staticmethod
+    def rasterize(polygons, region_conversion: int, radius: float):
+        # every polygon needs rings, bounds and a buffered contains_points like MyPolygon
+        if not polygons:
+            return RegionRaster(np.zeros(2), np.zeros((0, 0), dtype=bool), region_conversion)
+
+        bounds = np.array([poly.bounds for poly in polygons])
+        origin = np.ceil(bounds[:, :2].min(axis=0) / region_conversion).astype(np.int64)
+        end = np.floor(bounds[:, 2:].max(axis=0) / region_conversion).astype(np.int64)
+
+        mask = np.zeros((max(end[1] - origin[1] + 1, 0), max(end[0] - origin[0] + 1, 0)), dtype=bool)
+
+        for poly in polygons:
+            lower = np.maximum(np.ceil(poly.bounds[:2] / region_conversion).astype(np.int64), origin)
+            upper = np.minimum(np.floor(poly.bounds[2:] / region_conversion).astype(np.int64), end)
+            if np.any(upper < lower):
+                continue
+
+            local = RegionRaster.rasterize_polygon(poly, lower, upper, region_conversion, radius)
+            mask[lower[1] - origin[1]:upper[1] - origin[1] + 1, lower[0] - origin[0]:upper[0] - origin[0] + 1] |= local
+
+        return RegionRaster(origin, mask, region_conversion)
+
+    @staticmethod
+    def rasterize_polygon(poly, lower: np.ndarray, upper: np.ndarray, region_conversion: int,
+                          radius: float) -> np.ndarray:
+        shape = (upper[1] - lower[1] + 1, upper[0] - lower[0] + 1)
+        start = np.concatenate(poly.rings)
+        stop = np.concatenate([np.roll(ring, -1, axis=0) for ring in poly.rings])
+
+        # even-odd scanline fill of the unbuffered outer ring and holes, one crossing per edge and lattice row it spans
+        low_y = np.minimum(start[:, 1], stop[:, 1])
+        high_y = np.maximum(start[:, 1], stop[:, 1])
+        first_row = np.ceil(low_y / region_conversion).astype(np.int64)
+        last_row = np.ceil(high_y / region_conversion).astype(np.int64) - 1
+        counts = np.maximum(last_row - first_row + 1, 0)
+
+        edges = np.repeat(np.arange(len(start)), counts)
+        rows = first_row[edges] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        y = rows * float(region_conversion)
+        t = (y - start[edges, 1]) / (stop[edges, 1] - start[edges, 1])
+        x = start[edges, 0] + t * (stop[edges, 0] - start[edges, 0])
+
+        order = np.lexsort((x, rows))
+        rows = rows[order]
+        x = x[order]
+
+        diff = np.zeros((shape[0], shape[1] + 1), dtype=np.int32)
+        span_rows = rows[0::2] - lower[1]
+        span_starts = np.ceil(x[0::2] / region_conversion).astype(np.int64) - lower[0]
+        span_ends = np.floor(x[1::2] / region_conversion).astype(np.int64) - lower[0] + 1
+
+        keep = (span_rows >= 0) & (span_rows < shape[0])
+        span_rows = span_rows[keep]
+        span_starts = np.clip(span_starts[keep], 0, shape[1])
+        span_ends = np.clip(span_ends[keep], 0, shape[1])
+
+        valid = span_starts < span_ends
+        np.add.at(diff, (span_rows[valid], span_starts[valid]), 1)
+        np.add.at(diff, (span_rows[valid], span_ends[valid]), -1)
+        local = np.cumsum(diff, axis=1)[:, :-1] > 0
+
+        # lattice points near the outline are settled by contains_points itself so the buffer matches exactly
+        band = RegionRaster.band_cells(start, stop, lower, shape, 2 * abs(radius) + region_conversion,
+                                       region_conversion)
+        band_points = (np.column_stack((band % shape[1], band // shape[1])) + lower) * float(region_conversion)
+        local.ravel()[band] = poly.contains_points(band_points, radius)
+
+        return local
+
+    @staticmethod
+    def band_cells(start: np.ndarray, stop: np.ndarray, lower: np.ndarray, shape: tuple[int, int], padding: float,
+                   region_conversion: int) -> np.ndarray:
+        # split long edges so every piece only sweeps a small padded box of lattice cells
+        pieces = np.maximum(np.ceil(np.hypot(*(stop - start).T) / padding).astype(np.int64), 1)
+        edges = np.repeat(np.arange(len(start)), pieces)
+        steps = np.arange(pieces.sum()) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+        fraction = (stop[edges] - start[edges]) / pieces[edges, np.newaxis]
+        piece_start = start[edges] + steps[:, np.newaxis] * fraction
+        piece_stop = piece_start + fraction
+
+        low = np.ceil((np.minimum(piece_start, piece_stop) - padding) / region_conversion).astype(np.int64) - lower
+        high = np.floor((np.maximum(piece_start, piece_stop) + padding) / region_conversion).astype(np.int64) - lower
+        low = np.maximum(low, 0)
+        high = np.minimum(high, np.array(shape[::-1]) - 1)
+
+        width = np.maximum(high[:, 0] - low[:, 0] + 1, 0)
+        height = np.maximum(high[:, 1] - low[:, 1] + 1, 0)
+        counts = width * height
+
+        boxes = np.repeat(np.arange(len(counts)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cx = low[boxes, 0] + offsets % width[boxes]
+        cy = low[boxes, 1] + offsets // width[boxes]
+
+        return np.unique(cy * shape[1] + cx)
@@ -0,0 +1,188 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import paramiko
+from paramiko import SFTP_NO_SUCH_FILE, SFTP_OK
+from paramiko.sftp import CMD_REMOVE, CMD_STATUS
+
+from ChunkStore import ChunkStore
+from Instrumentation import Instrumentation
+from SftpPool import SftpPool
+
+
+class DeletionJournal:
+    # paths the server confirmed gone, one per line and synced after every batch, so an interrupted run resumes
+    # where it stopped
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.done = set()
+        self.file = None
+
+        # bytes of complete lines, a line cut short by a crash is not a confirmed deletion and is cut off on reopening
+        self.complete = 0
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for line in f:
+                    if line.endswith(b"\n"):
+                        self.done.add(line[:-1].decode())
+                        self.complete += len(line)
+
+    def record(self, paths: list[str]) -> None:
+        if not paths:
+            return
+
+        with self.lock:
+            # opened on the first confirmed deletion so a dry run leaves no journal behind
+            if self.file is None:
+                self.file = open(self.path, "a")
+                self.file.truncate(self.complete)
+
+            self.file.write("".join(path + "\n" for path in paths))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.done.update(paths)
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class RemoveResponses:
+    # status codes of pipelined remove requests by request number, paramiko hands every response read off the
+    # channel to the object the request was sent with
+    def __init__(self):
+        self.numbers = []
+        self.codes = {}
+
+    def _async_response(self, t, msg, num):
+        self.codes[num] = msg.get_int() if t == CMD_STATUS else None
+
+    def results(self, count: int) -> list[int | None]:
+        # codes in the order the first count removes were meant to be sent, None for those without a reply
+        return [self.codes.get(num) for num in self.numbers] + [None] * (count - len(self.numbers))
+
+
+class RemoteDeleter:
+    # region2d files outside the borders and the region3d files of the same columns, removed over pooled SFTP
+    # channels with many requests in flight on each
+    WINDOW = 64
+    BATCH = 256
+
+    @staticmethod
+    def region3d_of(name: str) -> tuple[int, int, int] | None:
+        nums = name.split('.')
+        if len(nums) < 4 or nums[-1] != "3dr":
+            return None
+
+        try:
+            return int(nums[0]), int(nums[1]), int(nums[2])
+        except ValueError:
+            return None
+
+    @staticmethod
+    def plan(regions, region3d_names: list[str]) -> tuple[list[str], list[str]]:
+        # a region3d file is 256 blocks wide, so its x and z halved land in the region2d file of its column
+        regions = np.asarray(regions, dtype=np.int64).reshape(-1, 2)
+        region2d = [f"region2d/{x}.{z}.2dr" for x, z in regions.tolist()]
+
+        cubes = [(name, cube) for name in region3d_names if (cube := RemoteDeleter.region3d_of(name)) is not None]
+        if not cubes or not len(regions):
+            return region2d, []
+
+        columns = np.array([(x, z) for _, (x, _, z) in cubes], dtype=np.int64) // 2
+        matches = np.isin(ChunkStore.keys(columns), ChunkStore.keys(regions))
+        region3d = [f"region3d/{name}" for (name, _), match in zip(cubes, matches.tolist()) if match]
+
+        return region2d, sorted(region3d)
+
+    @staticmethod
+    def finished_regions(region2d: list[str], region3d: list[str], done: set[str]) -> list[tuple[int, int]]:
+        # region2d files confirmed gone whose planned region3d files are all gone too. a column with region3d files
+        # left stays in the chunk store so the next plan still covers them
+        left = {(x // 2, z // 2) for x, _, z in (RemoteDeleter.region3d_of(path.split("/")[-1])
+                                                 for path in region3d if path not in done)}
+        regions = [tuple(map(int, path.split("/")[-1].split(".")[:2])) for path in region2d if path in done]
+        return [region for region in regions if region not in left]
+
+    @staticmethod
+    def list_region3d(pool: SftpPool, username: str, world_name: str) -> list[str]:
+        with Instrumentation.stage("sftp_listing", region=world_name, folder="region3d") as record, \
+                pool.sftp(username) as sftp:
+            try:
+                names = [file.filename for file in sftp.listdir_iter('./' + world_name + '/region3d')]
+            except FileNotFoundError:
+                names = []
+            record["files"] = len(names)
+
+        return names
+
+    @staticmethod
+    def remove_pipelined(sftp, paths: list[str], responses: RemoveResponses = None,
+                         window: int = WINDOW) -> list[int | None]:
+        # sends up to window removes before reading any status back instead of waiting a round trip for each file,
+        # the replies are matched by request number so their order does not matter. responses keeps the replies that
+        # came in before a dropped connection raised
+        responses = responses if responses is not None else RemoveResponses()
+        for path in paths:
+            responses.numbers.append(sftp._async_request(responses, CMD_REMOVE, sftp._adjust_cwd(path)))
+            while len(responses.numbers) - len(responses.codes) >= window:
+                sftp._read_response()
+
+        while len(responses.codes) < len(responses.numbers):
+            sftp._read_response()
+
+        return responses.results(len(paths))
+
+    def __init__(self, pool: SftpPool, username: str, world_name: str, journal: DeletionJournal, workers: int = 1):
+        self.pool = pool
+        self.username = username
+        self.world_name = world_name
+        self.journal = journal
+        self.workers = max(workers, 1)
+
+    def remove_batch(self, paths: list[str]) -> list[str]:
+        responses = RemoveResponses()
+        try:
+            with self.pool.sftp(self.username) as sftp:
+                RemoteDeleter.remove_pipelined(sftp, ['./' + self.world_name + '/' + path for path in paths], responses)
+        except (OSError, EOFError, paramiko.SSHException):
+            # the pool has closed the dropped channel, files without a reply are reported and the other batches go on
+            pass
+
+        codes = responses.results(len(paths))
+
+        # a file already missing counts as removed, it was deleted by an earlier run that did not get to journal it
+        done = [path for path, code in zip(paths, codes) if code in (SFTP_OK, SFTP_NO_SUCH_FILE)]
+        self.journal.record(done)
+
+        return [path for path, code in zip(paths, codes) if code not in (SFTP_OK, SFTP_NO_SUCH_FILE)]
+
+    def apply(self, paths: list[str]) -> tuple[int, list[str]]:
+        # returns the number of files removed by this run and the paths that could not be removed
+        pending = [path for path in paths if path not in self.journal.done]
+        batches = [pending[i:i + RemoteDeleter.BATCH] for i in range(0, len(pending), RemoteDeleter.BATCH)]
+
+        failed = []
+        with Instrumentation.stage("sftp_delete", region=self.world_name, workers=self.workers) as record:
+            if self.workers <= 1:
+                for batch in batches:
+                    failed.extend(self.remove_batch(batch))
+            else:
+                # the pool blocks once max_channels sessions are busy, which bounds the concurrency per user
+                with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                    for batch_failed in executor.map(self.remove_batch, batches):
+                        failed.extend(batch_failed)
+
+            record["files"] = len(pending) - len(failed)
+
+        return len(pending) - len(failed), failed
@@ -0,0 +1,111 @@
+import threading
+from contextlib import contextmanager
+
+import paramiko
+
+
+class SftpPool:
+    # one authenticated transport per username, each carrying up to max_channels SFTP sessions that are reused
+    def __init__(self, host: str, port: int, password: str, max_channels: int = 4):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.max_channels = max(max_channels, 1)
+
+        self.lock = threading.Lock()
+        self.transports = {}
+        self.connect_locks = {}
+        self.idle = {}
+        self.open_counts = {}
+        self.limits = {}
+        self.conditions = {}
+
+    def get_transport(self, username: str) -> paramiko.Transport:
+        with self.lock:
+            connect_lock = self.connect_locks.setdefault(username, threading.Lock())
+
+        with connect_lock:
+            transport = self.transports.get(username)
+            if transport is None or not transport.is_active():
+                transport = paramiko.Transport((self.host, self.port))
+                transport.connect(username=username, password=self.password)
+
+                with self.lock:
+                    self.transports[username] = transport
+                    self.idle[username] = []
+                    self.open_counts[username] = 0
+
+            return transport
+
+    @contextmanager
+    def sftp(self, username: str):
+        client = self.acquire(username)
+        try:
+            yield client
+        except Exception:
+            self.release(username, client, broken=True)
+            raise
+        else:
+            self.release(username, client)
+
+    def acquire(self, username: str) -> paramiko.SFTPClient:
+        transport = self.get_transport(username)
+
+        with self.lock:
+            condition = self.conditions.setdefault(username, threading.Condition(self.lock))
+            limit = self.limits.setdefault(username, self.max_channels)
+
+            while True:
+                if self.idle[username]:
+                    return self.idle[username].pop()
+
+                if self.open_counts[username] < limit:
+                    self.open_counts[username] += 1
+                    break
+
+                condition.wait()
+
+        try:
+            return paramiko.SFTPClient.from_transport(transport)
+        except paramiko.ChannelException:
+            with self.lock:
+                self.open_counts[username] -= 1
+
+                # the server refuses more sessions on this transport, stop asking and share the open ones instead
+                if self.open_counts[username] == 0:
+                    raise
+
+                self.limits[username] = self.open_counts[username]
+
+            return self.acquire(username)
+
+    def release(self, username: str, client: paramiko.SFTPClient, broken: bool = False) -> None:
+        if broken:
+            client.close()
+
+        with self.lock:
+            if broken:
+                self.open_counts[username] -= 1
+            else:
+                self.idle[username].append(client)
+
+            self.conditions[username].notify()
+
+    def close(self) -> None:
+        with self.lock:
+            for clients in self.idle.values():
+                for client in clients:
+                    client.close()
+
+            for transport in self.transports.values():
+                transport.close()
+
+            self.idle.clear()
+            self.transports.clear()
+            self.open_counts.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,337 @@
+from collections.abc import Iterator
+
+import numpy as np
+
+
+class BoundingBoxGrid:
+    # uniform grid over axis aligned (min x, min y, max x, max y) boxes, used to find which boxes can hold which points
+    def __init__(self, boxes: np.ndarray, cell_size: float | None = None):
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+
+        if cell_size is None:
+            extents = np.maximum(self.boxes[:, 2] - self.boxes[:, 0], self.boxes[:, 3] - self.boxes[:, 1])
+            cell_size = float(np.median(extents)) if len(extents) else 1.0
+
+        self.cell_size = max(cell_size, 1.0)
+
+        if len(self.boxes):
+            self.origin = self.boxes[:, :2].min(axis=0)
+            self.shape = (np.floor((self.boxes[:, 2:].max(axis=0) - self.origin) / self.cell_size)
+                          .astype(np.int64) + 1)
+        else:
+            self.origin = np.zeros(2)
+            self.shape = np.ones(2, dtype=np.int64)
+
+        lower = np.floor((self.boxes[:, :2] - self.origin) / self.cell_size).astype(np.int64)
+        upper = np.floor((self.boxes[:, 2:] - self.origin) / self.cell_size).astype(np.int64)
+
+        cells = {}
+        for box_id in range(len(self.boxes)):
+            for ix in range(lower[box_id, 0], upper[box_id, 0] + 1):
+                for iy in range(lower[box_id, 1], upper[box_id, 1] + 1):
+                    cells.setdefault(ix * int(self.shape[1]) + iy, []).append(box_id)
+
+        self.cells = cells
+
+    def query_points(self, points: np.ndarray) -> Iterator[tuple[int, np.ndarray]]:
+        # yields (box id, sorted indices of the points inside that box) for every box holding at least one point
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+        cell = np.floor((points - self.origin) / self.cell_size)
+        on_grid = np.all((cell >= 0) & (cell < self.shape), axis=1)
+
+        indices = np.flatnonzero(on_grid)
+        keys = cell[indices, 0].astype(np.int64) * int(self.shape[1]) + cell[indices, 1].astype(np.int64)
+
+        order = np.argsort(keys, kind="stable")
+        indices = indices[order]
+        keys = keys[order]
+
+        unique_keys, starts = np.unique(keys, return_index=True)
+        ends = np.append(starts[1:], len(keys))
+
+        hits = {}
+        for key, start, end in zip(unique_keys.tolist(), starts.tolist(), ends.tolist()):
+            box_ids = self.cells.get(key)
+            if box_ids is None:
+                continue
+
+            candidates = indices[start:end]
+            candidate_points = points[candidates]
+
+            for box_id in box_ids:
+                box = self.boxes[box_id]
+                inside = ((candidate_points[:, 0] >= box[0]) & (candidate_points[:, 0] <= box[2]) &
+                          (candidate_points[:, 1] >= box[1]) & (candidate_points[:, 1] <= box[3]))
+                if inside.any():
+                    hits.setdefault(box_id, []).append(candidates[inside])
+
+        for box_id in sorted(hits):
+            yield box_id, np.sort(np.concatenate(hits[box_id]))
+
+    @staticmethod
+    def pad(boxes: np.ndarray, padding: float) -> np.ndarray:
+        boxes = np.array(boxes, dtype=np.float64).reshape(-1, 4)
+        boxes[:, :2] -= padding
+        boxes[:, 2:] += padding
+        return boxes
+
+
+class SegmentGrid:
+    # uniform grid over line segments, used to find the segment nearest to each point without testing them all
+    # cells or point-segment pairs handled per numpy pass, small enough for the temporaries to stay in cache
+    MAX_PAIRS = 1 << 16
+    # cells holding this many points are never merged into bigger tiles, and tiles are split into up to 2 ** (2 *
+    # MAX_SPLIT) groups of about TILE_POINTS points
+    DENSE_CELL = 64
+    TILE_POINTS = 16
+    MAX_SPLIT = 3
+
+    def __init__(self, start: np.ndarray, stop: np.ndarray, cell_size: float | None = None):
+        self.start = np.asarray(start, dtype=np.float64).reshape(-1, 2)
+        self.stop = np.asarray(stop, dtype=np.float64).reshape(-1, 2)
+
+        ends = np.concatenate((self.start, self.stop))
+        lengths = np.hypot(*(self.stop - self.start).T)
+
+        if cell_size is None and len(lengths):
+            extent = ends.max(axis=0) - ends.min(axis=0)
+            cell_size = max(float(np.median(lengths)), float(np.sqrt(extent[0] * extent[1] / len(lengths))))
+
+        self.cell_size = max(cell_size or 1.0, 1.0)
+        self.origin = ends.min(axis=0) if len(ends) else np.zeros(2)
+        self.shape = (np.floor((ends.max(axis=0) - self.origin) / self.cell_size).astype(np.int64) + 1
+                      if len(ends) else np.ones(2, dtype=np.int64))
+
+        # segments are split into pieces no longer than a cell and filed under every cell a piece's box touches
+        segments, steps = SegmentGrid.ranges(np.maximum(np.ceil(lengths / self.cell_size).astype(np.int64), 1))
+        pieces = np.maximum(np.ceil(lengths / self.cell_size), 1)[segments, np.newaxis]
+        fraction = (self.stop[segments] - self.start[segments]) / pieces
+        piece_start = self.start[segments] + steps[:, np.newaxis] * fraction
+        piece_stop = self.start[segments] + (steps[:, np.newaxis] + 1) * fraction
+        # the last piece ends exactly on the segment's end, a rounded one could fall outside the grid
+        last = steps + 1 == pieces[:, 0]
+        piece_stop[last] = self.stop[segments[last]]
+
+        low = np.clip(self.cells(np.minimum(piece_start, piece_stop)), 0, self.shape - 1)
+        high = np.clip(self.cells(np.maximum(piece_start, piece_stop)), 0, self.shape - 1)
+        height = high[:, 1] - low[:, 1] + 1
+        boxes, offsets = SegmentGrid.ranges((high[:, 0] - low[:, 0] + 1) * height)
+        cell_ids = ((low[boxes, 0] + offsets // height[boxes]) * int(self.shape[1]) + low[boxes, 1] +
+                    offsets % height[boxes])
+
+        keys = np.unique(cell_ids * max(len(lengths), 1) + segments[boxes])
+        self.segments = keys % max(len(lengths), 1)
+        cell_counts = np.bincount(keys // max(len(lengths), 1), minlength=int(self.shape.prod()))
+        self.offsets = np.concatenate(([0], np.cumsum(cell_counts)))
+
+        # summed area table of the per cell counts, so whether a block of cells holds any segment is four lookups
+        self.summed = np.zeros((self.shape[0] + 1, self.shape[1] + 1), dtype=np.int64)
+        self.summed[1:, 1:] = cell_counts.reshape(self.shape).cumsum(axis=0).cumsum(axis=1)
+
+    @staticmethod
+    def ranges(counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # for counts [2, 3]: owners [0, 0, 1, 1, 1] and offsets [0, 1, 0, 1, 2]
+        counts = np.asarray(counts, dtype=np.int64)
+        owners = np.repeat(np.arange(len(counts)), counts)
+        return owners, np.arange(len(owners)) - np.repeat(np.cumsum(counts) - counts, counts)
+
+    def cells(self, points: np.ndarray) -> np.ndarray:
+        return np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+
+    def block_count(self, cells: np.ndarray, reach: np.ndarray) -> np.ndarray:
+        # segment entries in the cells within reach (chebyshev) of each cell
+        low = np.maximum(cells - reach[:, np.newaxis], 0)
+        high = np.minimum(cells + reach[:, np.newaxis], self.shape - 1) + 1
+        empty = np.any(high <= low, axis=1)
+        low = np.minimum(low, self.shape)
+        high = np.maximum(high, low)
+
+        count = (self.summed[high[:, 0], high[:, 1]] - self.summed[low[:, 0], high[:, 1]] -
+                 self.summed[high[:, 0], low[:, 1]] + self.summed[low[:, 0], low[:, 1]])
+        return np.where(empty, 0, count)
+
+    def block_segments(self, low: np.ndarray, high: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # (block, segment) pairs, sorted and without repeats, for the blocks of cells from low to high inclusive
+        low = np.maximum(low, 0)
+        high = np.minimum(high, self.shape - 1)
+        height = np.maximum(high[:, 1] - low[:, 1] + 1, 0)
+        blocks, offsets = SegmentGrid.ranges(np.maximum(high[:, 0] - low[:, 0] + 1, 0) * height)
+        cell_ids = ((low[blocks, 0] + offsets // height[blocks]) * int(self.shape[1]) + low[blocks, 1] +
+                    offsets % height[blocks])
+
+        starts = self.offsets[cell_ids]
+        cells, entries = SegmentGrid.ranges(self.offsets[cell_ids + 1] - starts)
+        keys = np.unique(blocks[cells] * len(self.start) + self.segments[starts[cells] + entries])
+        return keys // len(self.start), keys % len(self.start)
+
+    @staticmethod
+    def squared_distances(points: np.ndarray, start: np.ndarray, stop: np.ndarray) -> np.ndarray:
+        # squared distance from each point to the segment on the same row, computed in place to keep the passes few
+        dx = stop[:, 0] - start[:, 0]
+        dy = stop[:, 1] - start[:, 1]
+        ox = points[:, 0] - start[:, 0]
+        oy = points[:, 1] - start[:, 1]
+
+        length = dx * dx
+        length += dy * dy
+        t = ox * dx
+        t += oy * dy
+        np.divide(t, length, out=t, where=length > 0)
+        t[length == 0] = 0
+        np.clip(t, 0, 1, out=t)
+
+        ox -= t * dx
+        oy -= t * dy
+        ox *= ox
+        oy *= oy
+        ox += oy
+        return ox
+
+    def prune(self, owners: np.ndarray, segments: np.ndarray, centers: np.ndarray,
+              half_diagonals: np.ndarray) -> np.ndarray:
+        # owners are sorted squares given by their centers and half diagonals. a segment more than a diagonal farther
+        # from its square's center than the closest one cannot be nearest to any point of that square
+        to_center = np.sqrt(SegmentGrid.squared_distances(centers[owners], np.take(self.start, segments, axis=0),
+                                                          np.take(self.stop, segments, axis=0)))
+        starts = np.flatnonzero(np.diff(owners, prepend=-1))
+        closest = np.repeat(np.minimum.reduceat(to_center, starts), np.diff(starts, append=len(owners)))
+        return to_center <= closest + 2 * half_diagonals[owners]
+
+    def nearest(self, points: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # distance to and id of the nearest segment for every point, inf and -1 when there are no segments
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        distance = np.full(len(points), np.inf)
+        nearest = np.full(len(points), -1, dtype=np.int64)
+        if not len(self.start) or not len(points):
+            return distance, nearest
+
+        cells, inverse = SegmentGrid.unique_cells(self.cells(points))
+
+        # smallest block around every occupied cell that holds a segment, bisected on the summed counts
+        low = np.zeros(len(cells), dtype=np.int64)
+        high = np.maximum(np.abs(cells), np.abs(cells - self.shape + 1)).max(axis=1)
+        while np.any(low < high):
+            middle = (low + high) // 2
+            found = self.block_count(cells, middle) > 0
+            high = np.where(found, middle, high)
+            low = np.where(found, low, middle + 1)
+
+        # candidates are searched for per square tile of cells, sparse cells far from every segment share tiles of up
+        # to half that distance
+        level = np.floor(np.log2(np.maximum(low, 2))).astype(np.int64) - 1
+        level[np.bincount(inverse, minlength=len(cells)) >= SegmentGrid.DENSE_CELL] = 0
+        tiles, tile_of = SegmentGrid.unique_cells(np.column_stack((cells >> level[:, np.newaxis], level)))
+        first_found = np.full(len(tiles), np.iinfo(np.int64).max)
+        np.minimum.at(first_found, tile_of, low)
+
+        side = np.left_shift(1, tiles[:, 2])
+        tile_cells = tiles[:, :2] * side[:, np.newaxis]
+        size = side * self.cell_size
+        tile_low = self.origin + tile_cells * self.cell_size
+        centers = tile_low + size[:, np.newaxis] / 2
+        half_diagonals = size * np.sqrt(0.5)
+
+        # the closest of the segments in the first block that holds any bounds the distance from the tile's center,
+        # so every segment that could be nearer to some point of the tile is filed under a cell within reach
+        bound = np.zeros(len(tiles))
+        found_low = tile_cells - first_found[:, np.newaxis]
+        found_high = tile_cells + (side + first_found)[:, np.newaxis] - 1
+        found_cells = np.prod(np.minimum(found_high, self.shape - 1) - np.maximum(found_low, 0) + 1, axis=1)
+        for first, last in SegmentGrid.batches(found_cells):
+            tile, segments = self.block_segments(found_low[first:last], found_high[first:last])
+            tile += first
+            to_center = np.sqrt(SegmentGrid.squared_distances(centers[tile], np.take(self.start, segments, axis=0),
+                                                              np.take(self.stop, segments, axis=0)))
+            starts = np.flatnonzero(np.diff(tile, prepend=-1))
+            bound[tile[starts]] = np.minimum.reduceat(to_center, starts)
+
+        reach = ((bound + 2 * half_diagonals) // self.cell_size).astype(np.int64)[:, np.newaxis] + 1
+        block_low = tile_cells - reach
+        block_high = tile_cells + side[:, np.newaxis] - 1 + reach
+
+        # crowded tiles are split into groups of fewer points, each keeping only the tile's candidates it can use
+        point_tiles = tile_of[inverse]
+        splits = np.clip(np.log2(np.maximum(np.bincount(point_tiles, minlength=len(tiles)), 1) /
+                                 SegmentGrid.TILE_POINTS).astype(np.int64) // 2, 0, SegmentGrid.MAX_SPLIT)
+        group_size = size / np.left_shift(1, splits)
+        sub_tiles = np.clip(np.floor((points - tile_low[point_tiles]) / group_size[point_tiles, np.newaxis]), 0,
+                            np.left_shift(1, splits)[point_tiles, np.newaxis] - 1).astype(np.int64)
+        groups, point_groups = SegmentGrid.unique_cells(np.column_stack((point_tiles, sub_tiles)))
+        group_tiles = groups[:, 0]
+        group_centers = tile_low[group_tiles] + (groups[:, 1:] + 0.5) * group_size[group_tiles, np.newaxis]
+        group_half_diagonals = group_size[group_tiles] * np.sqrt(0.5)
+        tile_groups = np.searchsorted(group_tiles, np.arange(len(tiles) + 1))
+
+        order = np.argsort(point_groups, kind="stable")
+        members = np.bincount(point_groups, minlength=len(groups))
+        member_starts = np.cumsum(members) - members
+
+        block_cells = np.prod(np.maximum(np.minimum(block_high, self.shape - 1) - np.maximum(block_low, 0) + 1, 0),
+                              axis=1)
+        for first, last in SegmentGrid.batches(block_cells):
+            tile, segments = self.block_segments(block_low[first:last], block_high[first:last])
+            tile += first
+            keep = self.prune(tile, segments, centers, half_diagonals)
+            tile = tile[keep]
+            segments = segments[keep]
+
+            candidates = np.bincount(tile - first, minlength=last - first)
+            candidate_starts = np.cumsum(candidates) - candidates
+            batch_groups = np.arange(tile_groups[first], tile_groups[last])
+            group_candidates = candidates[group_tiles[batch_groups] - first]
+
+            group, offset = SegmentGrid.ranges(group_candidates)
+            group = batch_groups[group]
+            group_segments = segments[candidate_starts[group_tiles[group] - first] + offset]
+            keep = self.prune(group, group_segments, group_centers, group_half_diagonals)
+            group = group[keep]
+            group_segments = group_segments[keep]
+
+            candidates = np.bincount(group - batch_groups[0], minlength=len(batch_groups))
+            candidate_starts = np.cumsum(candidates) - candidates
+            for pair_first, pair_last in SegmentGrid.batches(members[batch_groups] * candidates):
+                pair_groups, pairs = SegmentGrid.ranges(members[batch_groups[pair_first:pair_last]] *
+                                                        candidates[pair_first:pair_last])
+                pair_groups += pair_first
+                count = candidates[pair_groups]
+                point = order[member_starts[batch_groups[pair_groups]] + pairs // count]
+                segment = group_segments[candidate_starts[pair_groups] + pairs % count]
+
+                # the pairs of a point are next to each other, its nearest segment is the first that reaches the min
+                squared = SegmentGrid.squared_distances(np.take(points, point, axis=0),
+                                                        np.take(self.start, segment, axis=0),
+                                                        np.take(self.stop, segment, axis=0))
+                starts = np.flatnonzero(np.diff(point, prepend=-1))
+                best = np.minimum.reduceat(squared, starts)
+                hits = np.flatnonzero(squared == np.repeat(best, np.diff(starts, append=len(point))))
+                hits = hits[np.flatnonzero(np.diff(point[hits], prepend=-1))]
+
+                distance[point[hits]] = np.sqrt(squared[hits])
+                nearest[point[hits]] = segment[hits]
+
+        return distance, nearest
+
+    @staticmethod
+    def batches(costs: np.ndarray) -> list[tuple[int, int]]:
+        # consecutive (first, last) ranges whose costs add up to about MAX_PAIRS, each holding at least one item
+        batch = (np.cumsum(costs) - costs) // SegmentGrid.MAX_PAIRS
+        bounds = np.concatenate(([0], np.flatnonzero(np.diff(batch)) + 1, [len(costs)]))
+        return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+    @staticmethod
+    def unique_cells(cells: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # like np.unique(cells, axis=0, return_inverse=True) for integer rows, through one int64 key per row
+        low = cells.min(axis=0)
+        span = cells.max(axis=0) - low + 1
+        keys = np.zeros(len(cells), dtype=np.int64)
+        for column in range(cells.shape[1]):
+            keys = keys * span[column] + cells[:, column] - low[column]
+
+        keys, inverse = np.unique(keys, return_inverse=True)
+        unique = np.zeros((len(keys), cells.shape[1]), dtype=np.int64)
+        for column in reversed(range(cells.shape[1])):
+            keys, unique[:, column] = np.divmod(keys, span[column])
+        unique += low
+
+        return unique, inverse.ravel()
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from matplotlib.colors import to_rgba
+from PIL import Image, ImageDraw
+
+from PointTable import PointTable
+
+
+class TileExporter:
+    # z/x/y PNG pyramid over BTE block coordinates, a square world of WORLD_SIZE blocks centered on the origin where
+    # one pixel of the deepest zoom level is one region file
+    TILE_SIZE = 256
+    WORLD_SIZE = 1 << 26
+    MANIFEST = "manifest.json"
+    MANIFEST_VERSION = 1
+
+    BORDER_COLOR = (0, 0, 0, 255)
+
+    def __init__(self, points_list: PointTable, colors: list[str], borders: list[np.ndarray], region_conversion: int,
+                 border_digest: str = ""):
+        self.points_list = points_list
+        self.palette = np.array([[round(channel * 255) for channel in to_rgba(color)] for color in colors] or
+                                [(0, 0, 0, 0)], dtype=np.uint8)
+        self.borders = [np.asarray(border, dtype=np.float64) for border in borders]
+        self.region_conversion = region_conversion
+        self.border_digest = border_digest
+
+        self.max_zoom = int(np.log2(TileExporter.WORLD_SIZE // (TileExporter.TILE_SIZE * region_conversion)))
+        self.left = -TileExporter.WORLD_SIZE // 2
+        self.top = TileExporter.WORLD_SIZE // 2
+
+    def pixel_size(self, zoom: int) -> int:
+        return self.region_conversion << (self.max_zoom - zoom)
+
+    def to_pixels(self, x: np.ndarray, y: np.ndarray, zoom: int) -> tuple[np.ndarray, np.ndarray]:
+        # chunk points are the lower left corner of a region, so the pixel row is taken from its top edge
+        size = self.pixel_size(zoom)
+        return ((np.asarray(x, dtype=np.int64) - self.left) // size,
+                (self.top - np.asarray(y, dtype=np.int64) - self.region_conversion) // size)
+
+    def coverage_tiles(self, zoom: int) -> dict[tuple[int, int], tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        px, py = self.to_pixels(self.points_list.x, self.points_list.y, zoom)
+        region = self.points_list.region
+
+        tiles = np.column_stack((px, py)) // TileExporter.TILE_SIZE
+        keys = tiles[:, 0] * (1 << 32) + tiles[:, 1]
+        order = np.argsort(keys, kind="stable")
+        _, starts = np.unique(keys[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+
+        coverage = {}
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            selected = order[start:end]
+            tile = (int(tiles[selected[0], 0]), int(tiles[selected[0], 1]))
+            coverage[tile] = (px[selected] % TileExporter.TILE_SIZE, py[selected] % TileExporter.TILE_SIZE,
+                              region[selected])
+
+        return coverage
+
+    def border_tiles(self, zoom: int) -> set[tuple[int, int]]:
+        # every tile an outline passes through, found by sampling each edge at half tile steps
+        tile_blocks = self.pixel_size(zoom) * TileExporter.TILE_SIZE
+        tiles = set()
+
+        for border in self.borders:
+            if len(border) < 2:
+                continue
+
+            start = border[:-1]
+            step = border[1:] - start
+            samples = np.maximum(np.ceil(np.hypot(*step.T) / (tile_blocks / 2)).astype(np.int64), 1)
+            edges = np.repeat(np.arange(len(start)), samples + 1)
+            fraction = (np.arange(len(edges)) - np.repeat(np.cumsum(samples + 1) - samples - 1, samples + 1)) \
+                / np.repeat(samples, samples + 1)
+            points = start[edges] + step[edges] * fraction[:, np.newaxis]
+
+            tile_x = np.floor((points[:, 0] - self.left) / tile_blocks).astype(np.int64)
+            tile_y = np.floor((self.top - points[:, 1]) / tile_blocks).astype(np.int64)
+            tiles.update(zip(tile_x.tolist(), tile_y.tolist()))
+
+        tiles_per_side = 1 << zoom
+        return {(x, y) for x, y in tiles if 0 <= x < tiles_per_side and 0 <= y < tiles_per_side}
+
+    def render_tile(self, zoom: int, tile: tuple[int, int], coverage) -> Image.Image:
+        image = np.zeros((TileExporter.TILE_SIZE, TileExporter.TILE_SIZE, 4), dtype=np.uint8)
+
+        if coverage is not None:
+            px, py, region = coverage
+            image[py, px] = self.palette[region]
+
+        picture = Image.fromarray(image, "RGBA")
+
+        size = self.pixel_size(zoom)
+        tile_left = self.left + tile[0] * TileExporter.TILE_SIZE * size
+        tile_top = self.top - tile[1] * TileExporter.TILE_SIZE * size
+        tile_blocks = TileExporter.TILE_SIZE * size
+
+        draw = ImageDraw.Draw(picture)
+        for border in self.borders:
+            if (border[:, 0].max() < tile_left or border[:, 0].min() > tile_left + tile_blocks or
+                    border[:, 1].min() > tile_top or border[:, 1].max() < tile_top - tile_blocks):
+                continue
+
+            pixels = np.column_stack(((border[:, 0] - tile_left) / size, (tile_top - border[:, 1]) / size))
+            draw.line([tuple(pixel) for pixel in pixels.tolist()], fill=TileExporter.BORDER_COLOR, width=1)
+
+        return picture
+
+    def tile_digest(self, coverage) -> str:
+        digest = hashlib.blake2b(self.border_digest.encode(), digest_size=16)
+        if coverage is not None:
+            for column in coverage:
+                digest.update(np.ascontiguousarray(column).tobytes())
+
+            # the colors the tile is drawn with, so a region given a new color in the config is drawn again
+            digest.update(self.palette[np.unique(coverage[2])].tobytes())
+
+        return digest.hexdigest()
+
+    def export(self, output_dir: str, min_zoom: int = 0, max_zoom: int = None, workers: int = 4) -> dict[str, int]:
+        # only tiles whose coverage or borders changed since the manifest was written are rendered again
+        max_zoom = self.max_zoom if max_zoom is None else min(max_zoom, self.max_zoom)
+        manifest_path = os.path.join(output_dir, TileExporter.MANIFEST)
+
+        previous = {}
+        try:
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == TileExporter.MANIFEST_VERSION:
+                previous = manifest["tiles"]
+        except (OSError, ValueError):
+            pass
+
+        tiles = {}
+        jobs = []
+        for zoom in range(min_zoom, max_zoom + 1):
+            coverage = self.coverage_tiles(zoom)
+
+            for tile in sorted(coverage.keys() | self.border_tiles(zoom)):
+                name = f"{zoom}/{tile[0]}/{tile[1]}"
+                tiles[name] = self.tile_digest(coverage.get(tile))
+
+                if previous.get(name) != tiles[name] or not os.path.exists(os.path.join(output_dir, name + ".png")):
+                    jobs.append((zoom, tile, coverage.get(tile), name))
+
+        def write(job):
+            zoom, tile, coverage, name = job
+            path = os.path.join(output_dir, name + ".png")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.render_tile(zoom, tile, coverage).save(path, optimize=False)
+
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            list(executor.map(write, jobs))
+
+        removed = [name for name in previous if name not in tiles]
+        for name in removed:
+            try:
+                os.remove(os.path.join(output_dir, name + ".png"))
+            except OSError:
+                pass
+
+        os.makedirs(output_dir, exist_ok=True)
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump({"version": TileExporter.MANIFEST_VERSION, "tiles": tiles}, f)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+        return {"tiles": len(tiles), "rendered": len(jobs), "removed": len(removed)}
@@ -0,0 +1,126 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Benchmark:
+    def __init__(self, repeat: int = 3, track_memory: bool = True, only: list[str] = None):
+        self.repeat = repeat
+        self.track_memory = track_memory
+        self.only = only
+        self.results = {}
+        self.imports = {}
+
+    def selected(self, name: str) -> bool:
+        return not self.only or any(pattern in name for pattern in self.only)
+
+    def run(self, name: str, function, items: int, nbytes: int = None):
+        # best of repeat runs for the timing, then one extra run under tracemalloc for the peak allocation
+        if not self.selected(name):
+            return None
+
+        seconds = float("inf")
+        result = None
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            result = function()
+            seconds = min(seconds, time.perf_counter() - start)
+
+        peak_bytes = None
+        if self.track_memory:
+            tracemalloc.start()
+            try:
+                function()
+                peak_bytes = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        self.results[name] = {
+            "items": items,
+            "seconds": seconds,
+            "rate": items / seconds if seconds > 0 else None,
+            "bytes_rate": nbytes / seconds if nbytes is not None and seconds > 0 else None,
+            "peak_bytes": peak_bytes,
+        }
+
+        rate = self.results[name]["rate"]
+        print(f"{name:<40} {seconds * 1000:>10.2f} ms {rate or 0:>14,.0f} items/s "
+              f"{(peak_bytes or 0) / 2 ** 20:>9.1f} MiB", flush=True)
+
+        return result
+
+    def import_time(self, module: str):
+        # a fresh interpreter per sample, so nothing is already in sys.modules
+        if not self.selected("import:" + module):
+            return
+
+        code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+        samples = []
+        for _ in range(self.repeat):
+            completed = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, capture_output=True, text=True)
+            if completed.returncode != 0:
+                print(f"import:{module:<33} failed: {completed.stderr.strip().splitlines()[-1:]}", flush=True)
+                return
+            samples.append(float(completed.stdout.strip().splitlines()[-1]))
+
+        self.imports[module] = min(samples)
+        print(f"{'import:' + module:<40} {self.imports[module] * 1000:>10.2f} ms", flush=True)
+
+    @staticmethod
+    def metadata() -> dict:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True)
+
+        max_rss = None
+        try:
+            import resource
+            # kilobytes on linux, bytes on macOS
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        except ImportError:
+            pass
+
+        return {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": commit.stdout.strip() or None,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "max_rss_bytes": max_rss,
+        }
+
+    def save(self, path: str, config: dict) -> None:
+        with open(path, "w") as f:
+            json.dump({"meta": Benchmark.metadata(), "config": config, "results": self.results,
+                       "imports": self.imports}, f, indent=2)
+
+    def compare(self, baseline_path: str, threshold: float) -> list[str]:
+        # ratios are current / baseline seconds, so anything above threshold is a slowdown
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+        rows = [(name, baseline["results"][name]["seconds"], result["seconds"])
+                for name, result in self.results.items() if name in baseline.get("results", {})]
+        rows += [("import:" + module, baseline["imports"][module], seconds)
+                 for module, seconds in self.imports.items() if module in baseline.get("imports", {})]
+
+        regressions = []
+        print(f"\n{'benchmark':<40} {'baseline':>12} {'current':>12} {'ratio':>7}")
+        for name, before, after in rows:
+            ratio = after / before if before > 0 else float("inf")
+            flag = ""
+            if ratio > threshold:
+                flag = " slower"
+                regressions.append(name)
+            elif ratio < 1 / threshold:
+                flag = " faster"
+            print(f"{name:<40} {before * 1000:>10.2f}ms {after * 1000:>10.2f}ms {ratio:>7.2f}{flag}")
+
+        return regressions
@@ -0,0 +1,122 @@
+import json
+import math
+import os
+
+import numpy as np
+
+from ChunkStore import ChunkStore
+from MathUtils import MathUtils
+from projections.ConformalDynmaxionProjection import ConformalDynmaxionProjection
+
+
+class Synthetic:
+    # the continental United States, where every input below is placed
+    LONGITUDE_RANGE = (-120.0, -75.0)
+    LATITUDE_RANGE = (28.0, 48.0)
+
+    @staticmethod
+    def lon_lat(count: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+        rng = np.random.default_rng(seed)
+        return rng.uniform(*Synthetic.LONGITUDE_RANGE, count), rng.uniform(*Synthetic.LATITUDE_RANGE, count)
+
+    @staticmethod
+    def triangle_points(count: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+        # uniform over the unit conformal triangle (0, 0), (1, 0), (0.5, sqrt(3) / 2)
+        rng = np.random.default_rng(seed)
+        a, b = rng.random(count), rng.random(count)
+        folded = a + b > 1
+        a[folded], b[folded] = 1 - a[folded], 1 - b[folded]
+
+        return a + 0.5 * b, MathUtils.ROOT3 / 2 * b
+
+    @staticmethod
+    def conformal_table(path: str) -> str:
+        # a smooth distortion of the regular triangle lattice in the same big-endian layout as data/conformal
+        side_length = ConformalDynmaxionProjection.SIDE_LENGTH
+        arc = ConformalDynmaxionProjection.ARC
+
+        v = np.repeat(np.arange(side_length + 1), np.arange(side_length + 1, 0, -1))
+        u = np.arange(len(v)) - ConformalDynmaxionProjection.ROW_OFFSETS_ARRAY[v]
+
+        x = (u + 0.5 * v) / side_length
+        y = MathUtils.ROOT3 / 2 * v / side_length
+        vectors = np.column_stack(((x - 0.5) * arc * (1 + 0.03 * np.sin(3 * y)),
+                                   (y - MathUtils.ROOT3 / 6) * arc * (1 + 0.02 * np.cos(2 * x))))
+
+        (vectors / ConformalDynmaxionProjection.VECTOR_SCALE_FACTOR).astype(">f8").tofile(path)
+        return path
+
+    @staticmethod
+    def chunk_store(path: str, count: int, projection, map_scale: float, region_conversion: int,
+                    seed: int = 0) -> str:
+        # distinct region2d coordinates drawn from the projected bounding box of the input area
+        rng = np.random.default_rng(seed)
+
+        corners = np.meshgrid(Synthetic.LONGITUDE_RANGE, Synthetic.LATITUDE_RANGE)
+        x, y = projection.from_geo_array(corners[0].ravel(), corners[1].ravel())
+        lower = np.floor(np.array([x.min(), -y.max()]) * map_scale / region_conversion).astype(np.int64)
+        upper = np.ceil(np.array([x.max(), -y.min()]) * map_scale / region_conversion).astype(np.int64)
+
+        width, height = upper - lower
+        cells = rng.choice(width * height, size=min(count, width * height), replace=False)
+        regions = np.column_stack((lower[0] + cells % width, lower[1] + cells // width))
+
+        ChunkStore.write(path, regions)
+        return path
+
+    @staticmethod
+    def geojson(path: str, features: int, parts: int, vertices: int, seed: int = 0) -> list[str]:
+        # MultiPolygon features of wobbly rings laid out on a grid over the input area
+        rng = np.random.default_rng(seed)
+        names = [f"State {i}" for i in range(features)]
+
+        columns = math.ceil(math.sqrt(features))
+        rows = math.ceil(features / columns)
+        cell_width = (Synthetic.LONGITUDE_RANGE[1] - Synthetic.LONGITUDE_RANGE[0]) / columns
+        cell_height = (Synthetic.LATITUDE_RANGE[1] - Synthetic.LATITUDE_RANGE[0]) / rows
+
+        angles = np.linspace(0, 2 * math.pi, vertices, endpoint=False)
+
+        with open(path, "w") as f:
+            f.write('{"type": "FeatureCollection", "features": [')
+
+            for i, name in enumerate(names):
+                left = Synthetic.LONGITUDE_RANGE[0] + (i % columns) * cell_width
+                bottom = Synthetic.LATITUDE_RANGE[0] + (i // columns) * cell_height
+
+                polygons = []
+                for _ in range(parts):
+                    size = rng.uniform(0.05, 0.2) * min(cell_width, cell_height)
+                    center_x = left + rng.uniform(size, cell_width - size)
+                    center_y = bottom + rng.uniform(size, cell_height - size)
+                    wobble = 1 + 0.2 * np.sin(rng.integers(3, 9) * angles + rng.uniform(0, 2 * math.pi))
+
+                    ring = np.column_stack((center_x + size * wobble * np.cos(angles),
+                                            center_y + size * wobble * np.sin(angles)))
+                    polygons.append([np.vstack((ring, ring[:1])).round(6).tolist()])
+
+                feature = {"type": "Feature", "properties": {"name": name},
+                           "geometry": {"type": "MultiPolygon", "coordinates": polygons}}
+                f.write(("," if i else "") + json.dumps(feature))
+
+            f.write("]}")
+
+        return names
+
+    @staticmethod
+    def size(text: str) -> int:
+        suffixes = {"k": 10 ** 3, "m": 10 ** 6}
+        text = text.strip().lower()
+        if text[-1:] in suffixes:
+            return int(float(text[:-1]) * suffixes[text[-1]])
+
+        return int(text)
+
+    @staticmethod
+    def ensure_conformal_table(work_dir: str) -> bool:
+        # benchmarks run without the real table by pointing the projection at a generated one
+        if os.path.exists(ConformalDynmaxionProjection.DATA_PATH):
+            return False
+
+        ConformalDynmaxionProjection.DATA_PATH = Synthetic.conformal_table(os.path.join(work_dir, "conformal"))
+        return True
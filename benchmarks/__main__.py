@@ -0,0 +1,173 @@
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from benchmarks.Benchmark import Benchmark
+from benchmarks.Synthetic import Synthetic
+
+IMPORT_MODULES = ["ChunkStore", "SftpPool", "projections.BTEDymaxionProjection", "ProjectionToMap", "main"]
+
+
+def projection_cases(benchmark: Benchmark, scalar_count: int, array_count: int):
+    from projections.BTEDymaxionProjection import BTEDymaxionProjection
+
+    benchmark.run("conformal_load", lambda: BTEDymaxionProjection.load_vectors(
+        BTEDymaxionProjection.DATA_PATH, BTEDymaxionProjection.VECTOR_COUNT, BTEDymaxionProjection.VECTOR_SCALE_FACTOR),
+                  BTEDymaxionProjection.VECTOR_COUNT)
+    projection = BTEDymaxionProjection()
+
+    longitudes, latitudes = Synthetic.lon_lat(array_count)
+    scalar_longitudes, scalar_latitudes = longitudes[:scalar_count].tolist(), latitudes[:scalar_count].tolist()
+
+    benchmark.run("from_geo", lambda: [projection.from_geo(longitude, latitude) for longitude, latitude in
+                                       zip(scalar_longitudes, scalar_latitudes)], scalar_count)
+    benchmark.run("from_geo_array", lambda: projection.from_geo_array(longitudes, latitudes), array_count)
+
+    x, y = projection.from_geo_array(longitudes, latitudes)
+
+    scalar_x, scalar_y = x[:scalar_count].tolist(), y[:scalar_count].tolist()
+    benchmark.run("to_geo", lambda: [projection.to_geo(x, y) for x, y in zip(scalar_x, scalar_y)], scalar_count)
+    benchmark.run("to_geo_array", lambda: projection.to_geo_array(x, y), array_count)
+
+    u, v = Synthetic.triangle_points(array_count)
+    scalar_u, scalar_v = u[:scalar_count].tolist(), v[:scalar_count].tolist()
+    benchmark.run("get_interpolated_vector", lambda: [projection.get_interpolated_vector(u, v) for u, v in
+                                                      zip(scalar_u, scalar_v)], scalar_count)
+    f, g = projection.get_interpolated_vector_array(u, v)[:2]
+    benchmark.run("get_interpolated_vector_array", lambda: projection.get_interpolated_vector_array(u, v),
+                  array_count)
+
+    # newton starts from a guess a little off the point whose image is being inverted
+    u_est, v_est = u * 0.999 + 0.0005, v * 0.999 + 0.0005
+    scalar_f, scalar_g = f[:scalar_count].tolist(), g[:scalar_count].tolist()
+    scalar_u_est, scalar_v_est = u_est[:scalar_count].tolist(), v_est[:scalar_count].tolist()
+    benchmark.run("apply_newtons_method", lambda: [projection.apply_newtons_method(*args, 5) for args in
+                                                   zip(scalar_f, scalar_g, scalar_u_est, scalar_v_est)], scalar_count)
+    benchmark.run("apply_newtons_method_array", lambda: projection.apply_newtons_method_array(f, g, u_est, v_est, 5),
+                  array_count)
+
+    return projection
+
+
+def map_cases(benchmark: Benchmark, projection, geo_path: str, names: list[str], parts: int, ring_vertices: int,
+              array_count: int):
+    import ProjectionToMap
+    from RegionRaster import RegionRaster
+
+    with open(geo_path, "rb") as f:
+        geo_bytes = len(f.read())
+
+    vertices = len(names) * parts * (ring_vertices + 1)
+    benchmark.run("geo_load", lambda: ProjectionToMap.Map(geo_path, projection), vertices, geo_bytes)
+
+    border_map = ProjectionToMap.Map(geo_path, projection)
+    features, _ = border_map.get_index(names)
+    polygons = [poly for feature in features for poly in feature.polygons]
+
+    bounds = np.array([poly.bounds for poly in polygons])
+    rng = np.random.default_rng(1)
+    points = np.column_stack((rng.uniform(bounds[:, 0].min(), bounds[:, 2].max(), array_count),
+                              rng.uniform(bounds[:, 1].min(), bounds[:, 3].max(), array_count)))
+
+    benchmark.run("is_point_inside", lambda: border_map.is_point_inside(names, points), array_count)
+    benchmark.run("distance_to_border", lambda: border_map.distance_to_border(names, points), array_count)
+    benchmark.run("raster_build", lambda: RegionRaster.rasterize(polygons, ProjectionToMap.region_conversion,
+                                                                 ProjectionToMap.radius), vertices)
+
+
+def chunk_cases(benchmark: Benchmark, projection, geo_path: str, names: list[str], sizes: list[int],
+                path_limit: int):
+    import ProjectionToMap
+    from ChunkStore import ChunkStore
+
+    os.makedirs("data", exist_ok=True)
+    regions = []
+    for size in sizes:
+        region_name = f"bench{size}"
+        Synthetic.chunk_store(ChunkStore.path(region_name), size, projection, ProjectionToMap.map_scale,
+                              ProjectionToMap.region_conversion)
+        regions.append({"region_name": region_name, "color": "orange", "states": names})
+
+    conversion = np.array([ProjectionToMap.region_conversion, -ProjectionToMap.region_conversion], dtype=np.int64)
+    for size, region in zip(sizes, regions):
+        path = ChunkStore.path(region["region_name"])
+        benchmark.run(f"chunk_load[{size}]", lambda: ChunkStore.load(region["region_name"]) * conversion, size,
+                      os.path.getsize(path))
+
+    for engine in ProjectionToMap.ProjectionToMap.ENGINES:
+        if not any(benchmark.selected(f"get_points[{engine},{size}]") for size in sizes):
+            continue
+
+        # built around the smallest region so border loading and rasterizing stay out of the timed calls
+        pruner = ProjectionToMap.ProjectionToMap(regions, projection, geo_path, [regions[0]["region_name"]],
+                                                 engine=engine, cache_dir=None)
+
+        for size, region in zip(sizes, regions):
+            if engine == "path" and size > path_limit:
+                continue
+            benchmark.run(f"get_points[{engine},{size}]", lambda: pruner.get_points([region]), size)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks",
+                                     description="benchmark the projection, pruning and chunk loading hot paths")
+    parser.add_argument("--sizes", default="10k,1m", help="chunk list sizes, e.g. 10k,1m,10m")
+    parser.add_argument("--scalar-count", type=Synthetic.size, default=20000, help="points per scalar benchmark")
+    parser.add_argument("--array-count", type=Synthetic.size, default=1000000, help="points per array benchmark")
+    parser.add_argument("--path-limit", type=Synthetic.size, default=1000000,
+                        help="largest chunk list pruned with the path engine")
+    parser.add_argument("--features", type=int, default=50)
+    parser.add_argument("--parts", type=int, default=10, help="polygons per MultiPolygon feature")
+    parser.add_argument("--vertices", type=int, default=200, help="vertices per polygon")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", action="append", help="run benchmarks whose name contains this, repeatable")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak memory run")
+    parser.add_argument("--no-imports", action="store_true", help="skip the import time measurements")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a JSON file written by --output")
+    parser.add_argument("--threshold", type=float, default=1.1,
+                        help="current / baseline time ratio above which a benchmark counts as a regression")
+    args = parser.parse_args()
+
+    sizes = [Synthetic.size(size) for size in args.sizes.split(",")]
+    benchmark = Benchmark(args.repeat, not args.no_memory, args.only)
+
+    if not args.no_imports:
+        for module in IMPORT_MODULES:
+            benchmark.import_time(module)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="bte-bench-") as work_dir:
+        if Synthetic.ensure_conformal_table(work_dir):
+            print("data/conformal not found, using a synthetic table", flush=True)
+
+        # ChunkStore resolves region files under ./data
+        os.chdir(work_dir)
+        try:
+            geo_path = os.path.join(work_dir, "states.json")
+            names = Synthetic.geojson(geo_path, args.features, args.parts, args.vertices)
+
+            projection = projection_cases(benchmark, args.scalar_count, args.array_count)
+            map_cases(benchmark, projection, geo_path, names, args.parts, args.vertices, args.array_count)
+            chunk_cases(benchmark, projection, geo_path, names, sizes, args.path_limit)
+        finally:
+            os.chdir(cwd)
+
+    if args.output:
+        benchmark.save(args.output, vars(args))
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        regressions = benchmark.compare(args.baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
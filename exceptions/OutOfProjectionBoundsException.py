@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class OutOfProjectionBoundsException(Exception):
 
     @staticmethod
@@ -14,5 +17,10 @@ class OutOfProjectionBoundsException(Exception):
     def check_longitude_latitude_in_range(longitude: float, latitude: float) -> None:
         OutOfProjectionBoundsException.check_in_range(longitude, latitude, 180, 90)
 
+    @staticmethod
+    def check_longitude_latitude_array_in_range(longitudes: np.ndarray, latitudes: np.ndarray) -> None:
+        if np.any(np.abs(longitudes) > 180.1) or np.any(np.abs(latitudes) > 90.1):
+            raise OutOfProjectionBoundsException.get()
+
     def __init__(self):
         super()
@@ -1,85 +1,409 @@
+import argparse
+import contextlib
 import json
+import os
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-import paramiko
+import numpy as np
 
-from ProjectionToMap import ProjectionToMap
-from projections.BTEDymaxionProjection import BTEDymaxionProjection
+from ChunkListing import ChunkListing
+from ChunkStore import ChunkStore
+from ExecListing import ExecListing
+from Instrumentation import Instrumentation
+from RemoteDeleter import DeletionJournal, RemoteDeleter
+from SftpPool import SftpPool
 
 
-def ftp(host: str, port: int, username: str, password: str, world_name: str, output_filename: str):
-    transport = paramiko.Transport((host, port))
-    transport.connect(username=username, password=password)
-    sftp = paramiko.SFTPClient.from_transport(transport)
+def ftp(host: str, port: int, username: str, password: str, world_name: str, output_filename: str,
+        pool: SftpPool = None, backend: str = "auto"):
+    # backend "auto" lists over SSH exec and falls back to SFTP when the server does not allow it
+    own_pool = pool is None
+    if own_pool:
+        pool = SftpPool(host, port, password)
 
-    with open("data/" + output_filename, "w") as outfile:
-        for file in sftp.listdir_iter('./' + world_name + '/region2d'):
-            nums = file.filename.split('.')
-            x = nums[0]
-            y = nums[1]
-            if nums[-1] == "2dr":
-                outfile.write(f'{x} {y}\n')
+    chunks_path = os.path.join("data", output_filename + ChunkStore.EXTENSION)
+    legacy_path = os.path.join("data", output_filename)
+    listing_path = legacy_path + "_listing.npz"
 
-    sftp.close()
-    transport.close()
+    if not os.path.exists(chunks_path) and os.path.exists(legacy_path):
+        ChunkStore.write(chunks_path, ChunkStore.read_legacy(legacy_path))
 
+    previous = ChunkListing.load(listing_path) if os.path.exists(chunks_path) else None
 
-def update_chunk_list(regions, host, port, password):
-    for region in regions:
-        ftp(host, port, region["username"], password, region["world_name"],
-            region["region_name"] + "_chunks")
+    directory = './' + world_name + '/region2d'
+    listing = ChunkListing()
+    try:
+        if backend == "sftp" or not ExecListing.list_directory(pool, username, directory, listing):
+            if backend == "exec":
+                raise RuntimeError(f"Listing {directory} over SSH exec failed for {username}")
+
+            listing = ChunkListing()
+            with Instrumentation.stage("sftp_listing", region=output_filename) as record, pool.sftp(username) as sftp:
+                for file in sftp.listdir_iter(directory):
+                    if ChunkListing.region_of(file.filename) is not None:
+                        listing.add(file.filename, file.st_mtime, file.st_size)
+                record["files"] = len(listing.entries)
+    finally:
+        if own_pool:
+            pool.close()
+
+    added, removed = listing.diff(previous)
+
+    if previous is None:
+        ChunkStore.write(chunks_path, [ChunkListing.region_of(name) for name in listing.entries])
+    elif added or removed:
+        ChunkStore.apply_delta(chunks_path, [ChunkListing.region_of(name) for name in added],
+                               [ChunkListing.region_of(name) for name in removed])
+
+    listing.save(listing_path)
 
+    return added, removed
 
-def main(should_update_chunk_list=True, should_prune_chunks=True, should_show_map=False):
-    config = None
 
-    print("Loading configuration")
+def update_chunk_list(regions, host, port, password, workers=1, backend="auto"):
+    with SftpPool(host, port, password, max_channels=workers) as pool:
+        if workers <= 1:
+            for region in regions:
+                ftp(host, port, region["username"], password, region["world_name"],
+                    region["region_name"] + "_chunks", pool, backend)
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(ftp, host, port, region["username"], password, region["world_name"],
+                                       region["region_name"] + "_chunks", pool, backend) for region in regions]
+
+            for future in futures:
+                future.result()
+
+
+def load_config(path="config.json"):
+    print("Loading configuration", file=sys.stderr)
 
     try:
-        with open("config.json") as json_file:
+        with Instrumentation.stage("config_load", bytes=os.path.getsize(path)), open(path) as json_file:
             config = json.load(json_file)
     except IOError:
-        print("No configuration file found.")
+        print("No configuration file found.", file=sys.stderr)
         sys.exit(1)
 
-    print("Config loaded.")
+    print("Config loaded.", file=sys.stderr)
+    return config
+
+
+def select_regions(config, region_names):
+    if not region_names:
+        return config["regions"]
+
+    known = [region["region_name"] for region in config["regions"]]
+    unknown = [name for name in region_names if name not in known]
+    if unknown:
+        print(f"Unknown region(s) {', '.join(unknown)}, expected some of {', '.join(known)}.", file=sys.stderr)
+        sys.exit(1)
+
+    return [region for region in config["regions"] if region["region_name"] in region_names]
+
+
+def load_map(config, region_names=None, engine="path", cache_dir=None, workers=1):
+    # matplotlib and the conformal table are only imported by the commands that project anything
+    from CacheUtils import CacheUtils
+    from ProjectionToMap import ProjectionToMap
+    from projections.BTEDymaxionProjection import BTEDymaxionProjection
+
+    print("Loading projection and chunk data.", file=sys.stderr)
+    with Instrumentation.stage("projection_init"):
+        projection = BTEDymaxionProjection()
+
+    with Instrumentation.stage("map_load") as record:
+        map = ProjectionToMap(config["regions"], projection, config["geo"], region_names or [], engine,
+                              CacheUtils.DEFAULT_DIR if cache_dir is None else cache_dir, workers,
+                              config.get("simplify", False))
+        record["points"] = len(map.points_list)
+
+    print(f"Chunk data loaded. Loaded {len(map.points_list)}", file=sys.stderr)
+    return map
+
 
-    if should_update_chunk_list:
-        print("Updating chunk list.")
-        start_time = time.time()
-        update_chunk_list(config["regions"], config["host"], config["port"], config["password"])
-        end_time = time.time()
-        execution_time = end_time - start_time
-        print("Chunk list updated. Execution time:", str(round(execution_time, 2)), "seconds.")
-    else:
-        print("Skipping chunk list update.")
+def emit(rows, output_format, columns):
+    if output_format == "json":
+        print(json.dumps(rows, indent=2))
+        return
+
+    print("  ".join(f"{column:>12}" if i else f"{column:<20}" for i, column in enumerate(columns)))
+    for row in rows:
+        print("  ".join(f"{row.get(column, '')!s:>12}" if i else f"{row.get(column, '')!s:<20}"
+                        for i, column in enumerate(columns)))
+
+
+def sync(config, region_names=None, workers=1, output_format="text", backend="auto"):
+    regions = select_regions(config, region_names)
+
+    print("Updating chunk list.", file=sys.stderr)
+    start_time = time.time()
+    with Instrumentation.stage("chunk_list_update", workers=workers):
+        update_chunk_list(regions, config["host"], config["port"], config["password"], workers, backend)
+    print(f"Chunk list updated. Execution time: {round(time.time() - start_time, 2)} seconds.", file=sys.stderr)
+
+    emit([{"region": region["region_name"], "chunks": len(ChunkStore.load(region["region_name"]))}
+          for region in regions], output_format, ["region", "chunks"])
+
+
+def prune(config, region_names=None, engine="path", cache_dir=None, workers=1, output_format="text"):
+    regions = select_regions(config, region_names)
+    map = load_map(config, region_names, engine, cache_dir, workers)
+
+    with Instrumentation.stage("prune", points=len(map.points_list)):
+        inside = map.get_points_inside()
+
+    totals = map.points_list.counts(len(map.regions))
+    kept = inside.counts(len(map.regions))
+
+    rows = []
+    for region in regions:
+        region_id = map.regions.index(region)
+        rows.append({"region": region["region_name"], "chunks": int(totals[region_id]),
+                     "inside": int(kept[region_id]), "pruned": int(totals[region_id] - kept[region_id])})
+
+    emit(rows, output_format, ["region", "chunks", "inside", "pruned"])
+
+
+# share of a region's chunks clean --apply deletes without --force
+MAX_DELETE_SHARE = 0.5
+
+
+def clean(config, region_names=None, engine="path", cache_dir=None, workers=1, apply=False, output_format="text",
+          force=False, max_share=MAX_DELETE_SHARE):
+    # deletes the region files of every chunk outside the borders, or with apply unset only reports what would go
+    from ProjectionToMap import region_conversion
+
+    regions = select_regions(config, region_names)
+    map = load_map(config, region_names, engine, cache_dir, workers)
+    inside = map.points_list.inside
+
+    # a misspelled state loads no border at all, and every chunk of its region would then be planned for deletion
+    missing = map.missing_states()
+    if missing:
+        print(f"State(s) {', '.join(missing)} not found in {config['geo']}, nothing was planned.", file=sys.stderr)
+        sys.exit(1)
+
+    oversized = []
+    for region in regions:
+        in_region = map.points_list.region == map.regions.index(region)
+        total = np.count_nonzero(in_region)
+        outside = np.count_nonzero(in_region & ~inside)
+        if total and (outside == total or outside > max_share * total):
+            oversized.append(f"{region['region_name']} ({outside} of {total} chunks)")
 
-    print("Loading projection and chunk data.")
-    projection = BTEDymaxionProjection()
-    print("Projection loaded.")
+    if oversized:
+        message = f"The plan deletes all or more than {max_share:.0%} of the chunks of {', '.join(oversized)}."
+        if apply and not force:
+            print(message + " Check the region states, or run again with --force to delete them.", file=sys.stderr)
+            sys.exit(1)
+        print(message, file=sys.stderr)
 
-    map = ProjectionToMap(config["regions"], projection, config["geo"])
-    num_chunks = sum([len(region["points"]) for region in map.points_list])
-    print(f"Chunk data loaded. Loaded {num_chunks}")
+    rows = []
+    with SftpPool(config["host"], config["port"], config["password"], max_channels=workers) as pool:
+        for region in regions:
+            name = region["region_name"]
+            mask = (map.points_list.region == map.regions.index(region)) & ~inside
+            outside = np.column_stack((map.points_list.x[mask], -map.points_list.y[mask])) // region_conversion
 
-    if should_prune_chunks:
-        print("Pruning chunks to region and state boundaries")
+            with Instrumentation.stage("deletion_plan", region=name, chunks=len(outside)):
+                region2d, region3d = RemoteDeleter.plan(outside, RemoteDeleter.list_region3d(
+                    pool, region["username"], region["world_name"]))
+
+            paths = region2d + region3d
+            with open(os.path.join("data", name + "_deletion_plan.txt"), "w") as f:
+                f.write("".join(path + "\n" for path in paths))
+
+            journal_path = os.path.join("data", name + "_deletion_journal.txt")
+            with DeletionJournal(journal_path) as journal:
+                row = {"region": name, "region2d": len(region2d), "region3d": len(region3d),
+                       "done": sum(path in journal.done for path in paths)}
+
+                if apply:
+                    deleter = RemoteDeleter(pool, region["username"], region["world_name"], journal, workers)
+                    try:
+                        row["removed"], failed = deleter.apply(paths)
+                    finally:
+                        # whatever the server confirmed gone is dropped locally, even when the run stopped partway
+                        forget_regions(name, RemoteDeleter.finished_regions(region2d, region3d, journal.done))
+
+                    row["failed"] = len(failed)
+                    for path in failed[:10]:
+                        print(f"Could not remove {region['world_name']}/{path}", file=sys.stderr)
+
+            if apply and not failed and os.path.exists(journal_path):
+                os.remove(journal_path)
+
+            rows.append(row)
+
+    columns = ["region", "region2d", "region3d", "done"] + (["removed", "failed"] if apply else [])
+    emit(rows, output_format, columns)
+    if not apply:
+        print("Dry run, nothing was deleted. Run again with --apply to delete the planned files.", file=sys.stderr)
+
+
+def forget_regions(region_name, removed):
+    # drops deleted region2d files from the local chunk store and listing, as the next sync would
+    if not removed:
+        return
+
+    ChunkStore.apply_delta(ChunkStore.path(region_name), [], removed)
+
+    listing_path = ChunkStore.legacy_path(region_name) + "_listing.npz"
+    listing = ChunkListing.load(listing_path)
+    if listing is not None:
+        for x, z in removed:
+            listing.entries.pop(f"{x}.{z}.2dr", None)
+        listing.save(listing_path)
+
+
+def render(config, region_names=None, engine="path", cache_dir=None, workers=1, mode="raster", output=None,
+           prune_chunks=True):
+    select_regions(config, region_names)
+    map = load_map(config, region_names, engine, cache_dir, workers)
+
+    if prune_chunks:
+        with Instrumentation.stage("prune", points=len(map.points_list)):
+            map.points_list = map.get_points_inside()
+
+    print("Saving map" if output else "Opening map", file=sys.stderr)
+    map.print(mode, output)
+
+
+def export(config, output_dir, region_names=None, engine="path", cache_dir=None, workers=1, min_zoom=0,
+           max_zoom=None, output_format="text"):
+    select_regions(config, region_names)
+    map = load_map(config, region_names, engine, cache_dir, workers)
+
+    with Instrumentation.stage("prune", points=len(map.points_list)):
         map.points_list = map.get_points_inside()
-        num_pruned_chunks = sum([len(region["points"]) for region in map.points_list])
-        print(f"Pruned {num_chunks - num_pruned_chunks} chunks.")
-    else:
-        print("Skipping chunk pruning.")
 
-    if should_show_map:
-        print("Opening map")
-        map.print()
-    else:
-        print("Skipping map")
+    print(f"Exporting tiles to {output_dir}", file=sys.stderr)
+    result = map.export_tiles(output_dir, min_zoom, max_zoom, workers)
+    emit([{"output": output_dir, **result}], output_format, ["output", "tiles", "rendered", "removed"])
+
+
+def stats(config, region_names=None, output_format="text"):
+    # what the last sync stored, read without touching the server or the projection
+    rows = []
+    for region in select_regions(config, region_names):
+        name = region["region_name"]
+        stored = next((path for path in (ChunkStore.path(name), ChunkStore.legacy_path(name))
+                       if os.path.exists(path)), None)
+        listing = ChunkListing.load(ChunkStore.legacy_path(name) + "_listing.npz")
+
+        rows.append({
+            "region": name,
+            "states": len(region["states"]),
+            "chunks": ChunkStore.count(name),
+            "region_bytes": sum(size for _, size in listing.entries.values()) if listing is not None else None,
+            "synced": time.strftime("%Y-%m-%d %H:%M", time.localtime(os.path.getmtime(stored))) if stored else None,
+        })
+
+    emit(rows, output_format, ["region", "states", "chunks", "region_bytes", "synced"])
+
+
+def common_arguments(suppress=False):
+    # given to the top level parser and again, suppressed, to every command so they can go on either side of it
+    def default(value):
+        return argparse.SUPPRESS if suppress else value
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--config", default=default("config.json"), help="configuration file, default config.json")
+    common.add_argument("--regions", action="append", metavar="NAME", default=default(None),
+                        help="only these regions, comma separated or repeated, default all")
+    common.add_argument("--workers", type=int, default=default(1))
+    common.add_argument("--format", dest="output_format", choices=("text", "json"), default=default("text"))
+    common.add_argument("--metrics", default=default(None), help="write stage metrics to this file instead of stderr")
+    common.add_argument("--metrics-format", choices=Instrumentation.FORMATS, default=default("table"))
+    common.add_argument("--profile", action="append", metavar="STAGE", default=default(None),
+                        help="run a stage under cProfile")
+    common.add_argument("--trace-memory", action="append", metavar="STAGE", default=default(None),
+                        help="record the peak traced allocation of a stage")
+
+    return common
+
+
+def build_parser():
+    common = common_arguments(suppress=True)
+
+    pipeline = argparse.ArgumentParser(add_help=False)
+    pipeline.add_argument("--engine", choices=("path", "raster"), default="path", help="pruning engine")
+    pipeline.add_argument("--cache-dir", default=None, help="classification cache, '' disables it")
+
+    parser = argparse.ArgumentParser(prog="main.py", parents=[common_arguments()],
+                                     description="sync, prune and render BTE region coverage; without a command "
+                                                 "the chunk lists are pruned as with prune")
+    subparsers = parser.add_subparsers(dest="command")
+
+    sync_parser = subparsers.add_parser("sync", parents=[common], help="list region2d files into the chunk stores")
+    sync_parser.add_argument("--listing", choices=("auto", "exec", "sftp"), default="auto",
+                             help="list with one compressed remote find, over SFTP, or the first that works")
+    subparsers.add_parser("prune", parents=[common, pipeline], help="classify chunks against the state borders")
+    subparsers.add_parser("stats", parents=[common], help="summarize the stored chunk lists")
+
+    clean_parser = subparsers.add_parser("clean", parents=[common, pipeline],
+                                         help="delete the region2d and region3d files of chunks outside the borders")
+    clean_parser.add_argument("--apply", action="store_true",
+                              help="delete the planned files, without it only the plan is written and reported")
+    clean_parser.add_argument("--force", action="store_true",
+                              help="apply a plan that deletes all of a region or more than --max-share of it")
+    clean_parser.add_argument("--max-share", type=float, default=MAX_DELETE_SHARE,
+                              help=f"largest share of a region's chunks deleted without --force, "
+                                   f"default {MAX_DELETE_SHARE}")
+
+    render_parser = subparsers.add_parser("render", parents=[common, pipeline], help="draw the pruned coverage")
+    render_parser.add_argument("--mode", choices=("polygons", "raster"), default="raster")
+    render_parser.add_argument("--output", help="save the figure to this file instead of opening a window")
+    render_parser.add_argument("--no-prune", action="store_true", help="draw every chunk, not only those inside")
+
+    export_parser = subparsers.add_parser("export", parents=[common, pipeline],
+                                          help="write pruned coverage as a z/x/y PNG tile pyramid")
+    export_parser.add_argument("output_dir", nargs="?", default="tiles")
+    export_parser.add_argument("--min-zoom", type=int, default=0)
+    export_parser.add_argument("--max-zoom", type=int, default=None)
+
+    return parser
+
+
+def cli(argv=None):
+    args = build_parser().parse_args(argv)
+    region_names = [name for names in args.regions or [] for name in names.split(",") if name]
+
+    with contextlib.ExitStack() as stack:
+        metrics = stack.enter_context(open(args.metrics, "w")) if args.metrics else sys.stderr
+        instrumentation = stack.enter_context(Instrumentation(metrics, args.metrics_format, args.profile,
+                                                              args.trace_memory))
+
+        config = load_config(args.config)
+
+        if args.command is None:
+            # the chunk lists are pruned as before, now honouring --config, --regions and --format like prune
+            prune(config, region_names, workers=args.workers, output_format=args.output_format)
+        elif args.command == "sync":
+            sync(config, region_names, args.workers, args.output_format, args.listing)
+        elif args.command == "prune":
+            prune(config, region_names, args.engine, args.cache_dir, args.workers, args.output_format)
+        elif args.command == "clean":
+            clean(config, region_names, args.engine, args.cache_dir, args.workers, args.apply, args.output_format,
+                  args.force, args.max_share)
+        elif args.command == "render":
+            render(config, region_names, args.engine, args.cache_dir, args.workers, args.mode, args.output,
+                   not args.no_prune)
+        elif args.command == "export":
+            export(config, args.output_dir, region_names, args.engine, args.cache_dir, args.workers, args.min_zoom,
+                   args.max_zoom, args.output_format)
+        elif args.command == "stats":
+            stats(config, region_names, args.output_format)
+
+        instrumentation.report()
 
 
 # Press the green button in the gutter to run the script.
 if __name__ == '__main__':
-    main(False, True, False)
+    cli()
 
 # See PyCharm help at https://www.jetbrains.com/help/pycharm/
@@ -1,5 +1,7 @@
 import math
 
+import numpy as np
+
 from MathUtils import MathUtils
 from exceptions.OutOfProjectionBoundsException import OutOfProjectionBoundsException
 from projections.ConformalDynmaxionProjection import ConformalDynmaxionProjection
@@ -45,6 +47,20 @@ class BTEDymaxionProjection(ConformalDynmaxionProjection):
 
         return c[0], c[1]
 
+    def from_geo_array(self, longitudes: np.ndarray, latitudes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        x, y = super().from_geo_array(longitudes, latitudes)
+
+        easia = self.is_eurasian_part_array(x, y)
+
+        y = y - 0.75 * BTEDymaxionProjection.ARC * MathUtils.ROOT3
+
+        x_easia = x + BTEDymaxionProjection.ARC
+        x, y = (np.where(easia, BTEDymaxionProjection.COS_THETA * x_easia - BTEDymaxionProjection.SIN_THETA * y,
+                         x - BTEDymaxionProjection.ARC),
+                np.where(easia, BTEDymaxionProjection.SIN_THETA * x_easia + BTEDymaxionProjection.COS_THETA * y, y))
+
+        return y, -x
+
     def to_geo(self, x: float, y: float) -> tuple[float, float]:
         easia = False
         if y < 0:
@@ -73,6 +89,31 @@ class BTEDymaxionProjection(ConformalDynmaxionProjection):
         
         return super().to_geo(x, y)
 
+    def to_geo_array(self, x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+
+        easia = np.where(y < 0, x > 0,
+                         np.where(y > BTEDymaxionProjection.ARC / 2,
+                                  x > -MathUtils.ROOT3 * BTEDymaxionProjection.ARC / 2,
+                                  y * -MathUtils.ROOT3 < x))
+
+        x, y = -y, x
+
+        x, y = (np.where(easia, BTEDymaxionProjection.COS_THETA * x + BTEDymaxionProjection.SIN_THETA * y
+                         - BTEDymaxionProjection.ARC, x + BTEDymaxionProjection.ARC),
+                np.where(easia, BTEDymaxionProjection.COS_THETA * y - BTEDymaxionProjection.SIN_THETA * x, y))
+
+        y = y + 0.75 * BTEDymaxionProjection.ARC * MathUtils.ROOT3
+
+        longitudes, latitudes, valid = super().to_geo_array(x, y)
+
+        bad = easia != self.is_eurasian_part_array(x, y)
+        longitudes[bad] = np.nan
+        latitudes[bad] = np.nan
+
+        return longitudes, latitudes, valid & ~bad
+
     def is_eurasian_part(self, x: float, y: float) -> bool:
         if x > 0:
             return False
@@ -95,6 +136,21 @@ class BTEDymaxionProjection(ConformalDynmaxionProjection):
 
         return y > BTEDymaxionProjection.ALEUTIAN_M * x + BTEDymaxionProjection.ALEUTIAN_B
 
+    def is_eurasian_part_array(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        return np.select(
+            [x > 0,
+             x < -0.5 * BTEDymaxionProjection.ARC,
+             y > MathUtils.ROOT3 * BTEDymaxionProjection.ARC / 4,
+             y < BTEDymaxionProjection.ALEUTIAN_Y,
+             y > BTEDymaxionProjection.BERING_Y],
+            [False,
+             True,
+             x < 0,
+             y < (BTEDymaxionProjection.ALEUTIAN_Y + BTEDymaxionProjection.ALEUTIAN_XL) - x,
+             np.where(y < BTEDymaxionProjection.ARCTIC_Y, x < BTEDymaxionProjection.BERING_X,
+                      y < BTEDymaxionProjection.ARCTIC_M * x + BTEDymaxionProjection.ARCTIC_B)],
+            y > BTEDymaxionProjection.ALEUTIAN_M * x + BTEDymaxionProjection.ALEUTIAN_B)
+
     def bounds(self) -> tuple[float, float, float, float]:
         return (-1.5 * BTEDymaxionProjection.ARC * MathUtils.ROOT3,
                 -1.5 * BTEDymaxionProjection.ARC,
@@ -0,0 +1,137 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from projections.GeographicProjection import GeographicProjection
+
+
+class LruCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+
+            return value
+
+    def put(self, key, value) -> None:
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict[str, float]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self.entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+class CachedProjection(GeographicProjection):
+    # bounded LRU memo of single point from_geo / to_geo calls on another projection. with a quantum set, inputs are
+    # rounded to multiples of it before lookup, so nearby points share the result of whichever was projected first
+    def __init__(self, projection: GeographicProjection, max_size: int = 65536, geo_quantum: float = None,
+                 projected_quantum: float = None):
+        self.projection = projection
+        self.geo_quantum = geo_quantum
+        self.projected_quantum = projected_quantum
+
+        self.forward = LruCache(max_size)
+        self.inverse = LruCache(max_size)
+
+    @staticmethod
+    def quantize(a: float, b: float, quantum: float):
+        if quantum is None:
+            return a, b
+
+        return round(a / quantum), round(b / quantum)
+
+    def from_geo(self, longitude: float, latitude: float) -> tuple[float, float]:
+        key = CachedProjection.quantize(longitude, latitude, self.geo_quantum)
+
+        result = self.forward.get(key)
+        if result is None:
+            # out of bounds errors propagate without being cached
+            result = self.projection.from_geo(longitude, latitude)
+            self.forward.put(key, result)
+
+        return result
+
+    def to_geo(self, x: float, y: float) -> tuple[float, float]:
+        key = CachedProjection.quantize(x, y, self.projected_quantum)
+
+        result = self.inverse.get(key)
+        if result is None:
+            result = self.projection.to_geo(x, y)
+            self.inverse.put(key, result)
+
+        return result
+
+    def from_geo_array(self, longitudes: np.ndarray, latitudes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        return self.projection.from_geo_array(longitudes, latitudes)
+
+    def to_geo_array(self, x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self.projection.to_geo_array(x, y)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        return {"from_geo": self.forward.stats(), "to_geo": self.inverse.stats()}
+
+    def clear(self) -> None:
+        self.forward.clear()
+        self.inverse.clear()
+
+    def name(self) -> str:
+        # exact lookups return what the wrapped projection would, so only quantizing makes cached geometry differ
+        name = self.projection.name()
+        if self.geo_quantum is not None or self.projected_quantum is not None:
+            name += f"@{self.geo_quantum},{self.projected_quantum}"
+
+        return name
+
+    def meters_per_unit(self) -> float:
+        return self.projection.meters_per_unit()
+
+    def bounds(self) -> tuple[float, float, float, float]:
+        return self.projection.bounds()
+
+    def upright(self) -> bool:
+        return self.projection.upright()
+
+    def vector(self, x: float, y: float, north: float, east: float) -> tuple[float, float]:
+        return self.projection.vector(x, y, north, east)
+
+    def tissot(self, longitude: float, latitude: float) -> tuple[float, float, float, float]:
+        return self.projection.tissot(longitude, latitude)
+
+    def azimuth(self, x: float, y: float, angle: float) -> float:
+        return self.projection.azimuth(x, y, angle)
+
+    def properties(self) -> dict[str, object]:
+        return self.projection.properties()
+
+    def properties(self) -> dict[str, object]:
+        return self.projection.properties()
+
+    def __str__(self) -> str:
+        return f"Cached {self.projection}"
@@ -1,6 +1,11 @@
 import math
-import struct
+import os
+import threading
 
+import numpy as np
+
+from CacheUtils import CacheUtils
+from Instrumentation import Instrumentation
 from projections.DymaxionProjection import DymaxionProjection
 from MathUtils import MathUtils
 
@@ -9,21 +14,183 @@ class ConformalDynmaxionProjection(DymaxionProjection):
     VECTOR_SCALE_FACTOR = 1.0 / 1.1473979730192934
     SIDE_LENGTH = 256
 
-    vx = []
-    vy = []
-
-    for i in range(SIDE_LENGTH + 1):
-        vx.append([0] * (SIDE_LENGTH + 1 - i))
-        vy.append([0] * (SIDE_LENGTH + 1 - i))
-
-    f = open("./data/conformal", "rb")
-
-    for v in range(SIDE_LENGTH + 1):
-        for u in range(SIDE_LENGTH + 1 - v):
-            vx[u][v] = struct.unpack('>d', f.read(8))[0] * VECTOR_SCALE_FACTOR
-            vy[u][v] = struct.unpack('>d', f.read(8))[0] * VECTOR_SCALE_FACTOR
-
-    f.close()
+    VECTOR_COUNT = (SIDE_LENGTH + 1) * (SIDE_LENGTH + 2) // 2
+
+    DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "conformal")
+
+    # the table is stored row by row in v, so row v starts after the (SIDE_LENGTH + 1 - k) entries of every row k < v
+    ROW_OFFSETS_ARRAY = np.concatenate(([0], np.cumsum(np.arange(SIDE_LENGTH + 1, 1, -1)))).astype(np.intp)
+    ROW_OFFSETS = ROW_OFFSETS_ARRAY.tolist()
+
+    @staticmethod
+    def load_vectors(path: str, count: int, scale: float) -> np.ndarray:
+        cache_path = path + ".npy"
+        shape = (count, 2)
+
+        try:
+            if os.path.getmtime(cache_path) >= os.path.getmtime(path):
+                vectors = np.load(cache_path, mmap_mode="r")
+                if vectors.shape == shape and vectors.dtype == np.float64:
+                    return vectors
+        except (OSError, ValueError):
+            pass
+
+        vectors = np.fromfile(path, dtype=">f8", count=shape[0] * shape[1]).reshape(shape)
+        vectors = vectors.astype(np.float64) * scale
+
+        try:
+            temp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                np.save(f, vectors)
+            os.replace(temp_path, cache_path)
+            return np.load(cache_path, mmap_mode="r")
+        except OSError:
+            return vectors
+
+    VECTORS: np.ndarray = None
+    VECTORS_LOCK = threading.Lock()
+
+    # regular grid over the forward field's image holding the (u, v) each node maps back to, so the newton solve can
+    # start next to its answer. INVERSE_STEPS is one more than the fewest refinement steps whose worst error over a
+    # random sample stays under INVERSE_TOLERANCE triangle units (1e-12 is about 1e-5 blocks), and INVERSE_MAX_ERROR
+    # is the worst sample error after INVERSE_STEPS, both measured when the grid is built
+    INVERSE_GRID_SIZE = 512
+    INVERSE_TOLERANCE = 1e-12
+    INVERSE_MAX_STEPS = 5
+    INVERSE_SAMPLES = 100000
+    INVERSE_VERSION = 1
+
+    INVERSE_U: np.ndarray = None
+    INVERSE_V: np.ndarray = None
+    INVERSE_BOUNDS: tuple[float, float, float, float] = None
+    INVERSE_STEPS = 5
+    INVERSE_MAX_ERROR: float = None
+
+    def __init__(self):
+        super().__init__()
+
+        if ConformalDynmaxionProjection.VECTORS is None:
+            with ConformalDynmaxionProjection.VECTORS_LOCK:
+                if ConformalDynmaxionProjection.VECTORS is None:
+                    with Instrumentation.stage("conformal_load") as record:
+                        ConformalDynmaxionProjection.VECTORS = ConformalDynmaxionProjection.load_vectors(
+                            ConformalDynmaxionProjection.DATA_PATH, ConformalDynmaxionProjection.VECTOR_COUNT,
+                            ConformalDynmaxionProjection.VECTOR_SCALE_FACTOR)
+                        record["points"] = len(ConformalDynmaxionProjection.VECTORS)
+                        record["bytes"] = ConformalDynmaxionProjection.VECTORS.nbytes
+
+                    with Instrumentation.stage("conformal_inverse_load") as record:
+                        self.load_inverse_grid(ConformalDynmaxionProjection.DATA_PATH + ".inverse.npz")
+                        record["points"] = ConformalDynmaxionProjection.INVERSE_U.size
+                        record["max_error"] = ConformalDynmaxionProjection.INVERSE_MAX_ERROR
+                        record["steps"] = ConformalDynmaxionProjection.INVERSE_STEPS
+
+    def load_inverse_grid(self, path: str) -> None:
+        key = CacheUtils.key(CacheUtils.file_digest(ConformalDynmaxionProjection.DATA_PATH),
+                             ConformalDynmaxionProjection.INVERSE_GRID_SIZE,
+                             ConformalDynmaxionProjection.INVERSE_TOLERANCE,
+                             ConformalDynmaxionProjection.INVERSE_VERSION)
+
+        data = CacheUtils.load_npz(path)
+        if data is None or str(data["key"]) != key:
+            data = self.build_inverse_grid(ConformalDynmaxionProjection.INVERSE_GRID_SIZE)
+            CacheUtils.save_npz(path, key=np.array(key), **data)
+
+        ConformalDynmaxionProjection.INVERSE_U = data["u"]
+        ConformalDynmaxionProjection.INVERSE_V = data["v"]
+        ConformalDynmaxionProjection.INVERSE_BOUNDS = tuple(data["bounds"].tolist())
+        ConformalDynmaxionProjection.INVERSE_STEPS = int(data["steps"])
+        ConformalDynmaxionProjection.INVERSE_MAX_ERROR = float(data["max_error"])
+
+    def build_inverse_grid(self, size: int) -> dict[str, np.ndarray]:
+        vectors = ConformalDynmaxionProjection.VECTORS
+        lower = vectors.min(axis=0)
+        upper = vectors.max(axis=0)
+        step = (upper - lower) / (size - 1)
+
+        grid_x, grid_y = np.meshgrid(lower[0] + step[0] * np.arange(size), lower[1] + step[1] * np.arange(size))
+        initial_u = grid_x / ConformalDynmaxionProjection.ARC + 0.5
+        initial_v = grid_y / ConformalDynmaxionProjection.ARC + MathUtils.ROOT3 / 6
+
+        # the field is piecewise linear, so newton lands exactly once the estimate is inside the right cell
+        u, v = self.apply_newtons_method_array(grid_x, grid_y, initial_u, initial_v, 20)
+        ConformalDynmaxionProjection.INVERSE_U = np.where(np.isfinite(u), u, initial_u)
+        ConformalDynmaxionProjection.INVERSE_V = np.where(np.isfinite(v), v, initial_v)
+        ConformalDynmaxionProjection.INVERSE_BOUNDS = (float(lower[0]), float(lower[1]), float(step[0]), float(step[1]))
+
+        # points with a known answer: sample (u, v) in the unit triangle and push them through the forward field
+        rng = np.random.default_rng(0)
+        a = rng.random(ConformalDynmaxionProjection.INVERSE_SAMPLES)
+        b = rng.random(ConformalDynmaxionProjection.INVERSE_SAMPLES)
+        folded = a + b > 1
+        a[folded], b[folded] = 1 - a[folded], 1 - b[folded]
+        sample_u, sample_v = a + 0.5 * b, MathUtils.ROOT3 / 2 * b
+        sample_x, sample_y = self.get_interpolated_vector_array(sample_u, sample_v)[:2]
+
+        estimate_u, estimate_v = self.inverse_grid_estimate_array(sample_x, sample_y)
+        steps = 0
+        while True:
+            error = float(np.max(np.hypot(estimate_u - sample_u, estimate_v - sample_v)))
+            if error <= ConformalDynmaxionProjection.INVERSE_TOLERANCE or \
+                    steps == ConformalDynmaxionProjection.INVERSE_MAX_STEPS:
+                break
+
+            estimate_u, estimate_v = self.apply_newtons_method_array(sample_x, sample_y, estimate_u, estimate_v, 1)
+            steps += 1
+
+        # one step of margin for points the sample missed
+        if steps < ConformalDynmaxionProjection.INVERSE_MAX_STEPS:
+            estimate_u, estimate_v = self.apply_newtons_method_array(sample_x, sample_y, estimate_u, estimate_v, 1)
+            error = float(np.max(np.hypot(estimate_u - sample_u, estimate_v - sample_v)))
+            steps += 1
+
+        return {"u": ConformalDynmaxionProjection.INVERSE_U, "v": ConformalDynmaxionProjection.INVERSE_V,
+                "bounds": np.array(ConformalDynmaxionProjection.INVERSE_BOUNDS), "steps": np.array(steps),
+                "max_error": np.array(error)}
+
+    @staticmethod
+    def inverse_grid_estimate(x: float, y: float) -> tuple[float, float]:
+        x0, y0, dx, dy = ConformalDynmaxionProjection.INVERSE_BOUNDS
+        last = ConformalDynmaxionProjection.INVERSE_GRID_SIZE - 2
+
+        gx = (x - x0) / dx
+        gy = (y - y0) / dy
+        i = min(max(int(math.floor(gx)), 0), last)
+        j = min(max(int(math.floor(gy)), 0), last)
+        fx = gx - i
+        fy = gy - j
+
+        grid_u = ConformalDynmaxionProjection.INVERSE_U
+        grid_v = ConformalDynmaxionProjection.INVERSE_V
+
+        u = ((1 - fx) * (1 - fy) * grid_u[j, i] + fx * (1 - fy) * grid_u[j, i + 1] +
+             (1 - fx) * fy * grid_u[j + 1, i] + fx * fy * grid_u[j + 1, i + 1])
+        v = ((1 - fx) * (1 - fy) * grid_v[j, i] + fx * (1 - fy) * grid_v[j, i + 1] +
+             (1 - fx) * fy * grid_v[j + 1, i] + fx * fy * grid_v[j + 1, i + 1])
+
+        return float(u), float(v)
+
+    @staticmethod
+    def inverse_grid_estimate_array(x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        x0, y0, dx, dy = ConformalDynmaxionProjection.INVERSE_BOUNDS
+        last = ConformalDynmaxionProjection.INVERSE_GRID_SIZE - 2
+
+        gx = (x - x0) / dx
+        gy = (y - y0) / dy
+        i = np.clip(np.floor(gx), 0, last).astype(np.intp)
+        j = np.clip(np.floor(gy), 0, last).astype(np.intp)
+        fx = gx - i
+        fy = gy - j
+
+        grid_u = ConformalDynmaxionProjection.INVERSE_U
+        grid_v = ConformalDynmaxionProjection.INVERSE_V
+
+        u = ((1 - fx) * (1 - fy) * grid_u[j, i] + fx * (1 - fy) * grid_u[j, i + 1] +
+             (1 - fx) * fy * grid_u[j + 1, i] + fx * fy * grid_u[j + 1, i + 1])
+        v = ((1 - fx) * (1 - fy) * grid_v[j, i] + fx * (1 - fy) * grid_v[j, i + 1] +
+             (1 - fx) * fy * grid_v[j + 1, i] + fx * fy * grid_v[j + 1, i + 1])
+
+        return u, v
 
     def triangle_transform(self, vec: tuple[float, float, float]) -> tuple[float, float]:
         c = list(super().triangle_transform(vec))
@@ -31,13 +198,8 @@ class ConformalDynmaxionProjection(DymaxionProjection):
         x = c[0]
         y = c[1]
 
-        c[0] /= ConformalDynmaxionProjection.ARC
-        c[1] /= ConformalDynmaxionProjection.ARC
-
-        c[0] += 0.5
-        c[1] += MathUtils.ROOT3 / 6
-
-        c = list(self.apply_newtons_method(x, y, c[0], c[1], 5))
+        c = list(self.inverse_grid_estimate(x, y))
+        c = list(self.apply_newtons_method(x, y, c[0], c[1], ConformalDynmaxionProjection.INVERSE_STEPS))
 
         c[0] -= 0.5
         c[1] -= MathUtils.ROOT3 / 6
@@ -47,6 +209,15 @@ class ConformalDynmaxionProjection(DymaxionProjection):
 
         return c[0], c[1]
 
+    def triangle_transform_array(self, x: np.ndarray, y: np.ndarray, z: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        x, y = super().triangle_transform_array(x, y, z)
+
+        u, v = self.inverse_grid_estimate_array(x, y)
+        u, v = self.apply_newtons_method_array(x, y, u, v, ConformalDynmaxionProjection.INVERSE_STEPS)
+
+        return ((u - 0.5) * ConformalDynmaxionProjection.ARC,
+                (v - MathUtils.ROOT3 / 6) * ConformalDynmaxionProjection.ARC)
+
     def inverse_triangle_transform(self, x: float, y: float) -> tuple[float, float, float]:
 
         x /= ConformalDynmaxionProjection.ARC
@@ -60,12 +231,25 @@ class ConformalDynmaxionProjection(DymaxionProjection):
 
         return super().inverse_triangle_transform(c[0], c[1])
 
+    def inverse_triangle_transform_array(self, x: np.ndarray, y: np.ndarray) -> tuple[
+            np.ndarray, np.ndarray, np.ndarray]:
+        x = x / ConformalDynmaxionProjection.ARC + 0.5
+        y = y / ConformalDynmaxionProjection.ARC + MathUtils.ROOT3 / 6
+
+        c = self.get_interpolated_vector_array(x, y)
+
+        return super().inverse_triangle_transform_array(c[0], c[1])
+
     def meters_per_unit(self) -> float:
         return (40075017.0 / (2.0 * math.pi)) / ConformalDynmaxionProjection.VECTOR_SCALE_FACTOR
 
     def __str__(self) -> str:
         return "Conformal Dymaxion"
 
+    def get_vector(self, u: int, v: int) -> tuple[float, float]:
+        vector = ConformalDynmaxionProjection.VECTORS[ConformalDynmaxionProjection.ROW_OFFSETS[v] + u]
+        return float(vector[0]), float(vector[1])
+
     def get_interpolated_vector(self, x: float, y: float) -> tuple[float, float, float, float, float, float]:
         x *= ConformalDynmaxionProjection.SIDE_LENGTH
         y *= ConformalDynmaxionProjection.SIDE_LENGTH
@@ -86,34 +270,22 @@ class ConformalDynmaxionProjection(DymaxionProjection):
         elif v1 >= ConformalDynmaxionProjection.SIDE_LENGTH - u1:
             v1 = ConformalDynmaxionProjection.SIDE_LENGTH - u1 - 1
 
-        valx1 = 0
-        valy1 = 0
-        valx2 = 0
-        valy2 = 0
-        valx3 = 0
-        valy3 = 0
         y3 = 0
         x3 = 0
 
         flip = 1
 
         if (y < -MathUtils.ROOT3 * (x - u1 - v1 - 1)) or (v1 == ConformalDynmaxionProjection.SIDE_LENGTH - u1 - 1):
-            valx1 = self.vx[u1][v1]
-            valy1 = self.vy[u1][v1]
-            valx2 = self.vx[u1][v1 + 1]
-            valy2 = self.vy[u1][v1 + 1]
-            valx3 = self.vx[u1 + 1][v1]
-            valy3 = self.vy[u1 + 1][v1]
+            valx1, valy1 = self.get_vector(u1, v1)
+            valx2, valy2 = self.get_vector(u1, v1 + 1)
+            valx3, valy3 = self.get_vector(u1 + 1, v1)
 
             y3 = 0.5 * MathUtils.ROOT3 * v1
             x3 = (u1 + 1) + 0.5 * v1
         else:
-            valx1 = self.vx[u1][v1 + 1]
-            valy1 = self.vy[u1][v1 + 1]
-            valx2 = self.vx[u1 + 1][v1]
-            valy2 = self.vy[u1 + 1][v1]
-            valx3 = self.vx[u1 + 1][v1 + 1]
-            valy3 = self.vy[u1 + 1][v1 + 1]
+            valx1, valy1 = self.get_vector(u1, v1 + 1)
+            valx2, valy2 = self.get_vector(u1 + 1, v1)
+            valx3, valy3 = self.get_vector(u1 + 1, v1 + 1)
 
             flip = -1
             y = -y
@@ -150,3 +322,73 @@ class ConformalDynmaxionProjection(DymaxionProjection):
             y_est -= determinant * (-dgdx * f + dfdx * g)
 
         return x_est, y_est
+
+    def get_interpolated_vector_array(self, x: np.ndarray, y: np.ndarray) -> tuple[
+            np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        side_length = ConformalDynmaxionProjection.SIDE_LENGTH
+
+        x = x * side_length
+        y = y * side_length
+
+        v = 2 * y / MathUtils.ROOT3
+        u = x - v * 0.5
+
+        u1 = np.clip(np.trunc(u), 0, side_length - 1).astype(np.intp)
+        v1 = np.trunc(v).astype(np.intp)
+        v1 = np.where(v1 < 0, 0, np.where(v1 >= side_length - u1, side_length - u1 - 1, v1))
+
+        lower = (y < -MathUtils.ROOT3 * (x - u1 - v1 - 1)) | (v1 == side_length - u1 - 1)
+
+        # lower triangles sample (u1, v1), (u1, v1 + 1), (u1 + 1, v1); upper ones shift the first and last sample
+        upper = (~lower).astype(np.intp)
+
+        u_a = u1
+        v_a = v1 + upper
+        u_b = u1 + upper
+        v_b = v1 + 1 - upper
+        u_c = u1 + 1
+        v_c = v1 + upper
+
+        offsets = ConformalDynmaxionProjection.ROW_OFFSETS_ARRAY
+        vectors = ConformalDynmaxionProjection.VECTORS
+
+        valx1, valy1 = np.moveaxis(vectors[offsets[v_a] + u_a], -1, 0)
+        valx2, valy2 = np.moveaxis(vectors[offsets[v_b] + u_b], -1, 0)
+        valx3, valy3 = np.moveaxis(vectors[offsets[v_c] + u_c], -1, 0)
+
+        flip = np.where(lower, 1, -1)
+        y = y * flip
+
+        y3 = np.where(lower, 0.5 * MathUtils.ROOT3 * v1, -(0.5 * MathUtils.ROOT3 * (v1 + 1)))
+        x3 = np.where(lower, (u1 + 1) + 0.5 * v1, (u1 + 1) + 0.5 * (v1 + 1))
+
+        w1 = -(y - y3) / MathUtils.ROOT3 - (x - x3)
+        w2 = 2 * (y - y3) / MathUtils.ROOT3
+        w3 = 1 - w1 - w2
+
+        return (valx1 * w1 + valx2 * w2 + valx3 * w3,
+                valy1 * w1 + valy2 * w2 + valy3 * w3,
+                (valx3 - valx1) * side_length,
+                side_length * flip * (2 * valx2 - valx1 - valx3) / MathUtils.ROOT3,
+                (valy3 - valy1) * side_length,
+                side_length * flip * (2 * valy2 - valy1 - valy3) / MathUtils.ROOT3)
+
+    def apply_newtons_method_array(self, expected_f: np.ndarray, expected_g: np.ndarray, x_est: np.ndarray,
+                                   y_est: np.ndarray, _iter: int) -> tuple[np.ndarray, np.ndarray]:
+        for i in range(_iter):
+            c = self.get_interpolated_vector_array(x_est, y_est)
+
+            f = c[0] - expected_f
+            g = c[1] - expected_g
+
+            dfdx = c[2]
+            dfdy = c[3]
+            dgdx = c[4]
+            dgdy = c[5]
+
+            determinant = 1 / (dfdx * dgdy - dfdy * dgdx)
+
+            x_est = x_est - determinant * (dgdy * f - dfdy * g)
+            y_est = y_est - determinant * (-dgdx * f + dfdx * g)
+
+        return x_est, y_est
@@ -1,5 +1,8 @@
 import math
 import sys
+import threading
+
+import numpy as np
 
 from projections.GeographicProjection import GeographicProjection
 from MathUtils import MathUtils
@@ -16,7 +19,7 @@ class DymaxionProjection(GeographicProjection):
 
     NEWTON = 5
 
-    VERTICES = [
+    VERTICES = (
         (10.536199, 64.700000),
         (-5.245390, 2.300882),
         (58.157706, 10.447378),
@@ -29,7 +32,7 @@ class DymaxionProjection(GeographicProjection):
         (-121.842290, -10.447350),
         (-57.700000, -39.100000),
         (-169.463800, -64.700000),
-    ]
+    )
 
     ISO = [
         (2, 1, 6),
@@ -56,30 +59,30 @@ class DymaxionProjection(GeographicProjection):
         (3, 7, 8)
     ]
 
-    CENTER_MAP = [
-        [-3, 7],
-        [-2, 5],
-        [-1, 7],
-        [2, 5],
-        [4, 5],
-        [-4, 1],
-        [-3, -1],
-        [-2, 1],
-        [-1, -1],
-        [0, 1],
-        [1, -1],
-        [2, 1],
-        [3, -1],
-        [4, 1],
-        [5, -1],
-        [-3, -5],
-        [-1, -5],
-        [1, -5],
-        [2, -7],
-        [-4, -7],
-        [-5, -5],
-        [-2, -7]
-    ]
+    CENTER_GRID = (
+        (-3, 7),
+        (-2, 5),
+        (-1, 7),
+        (2, 5),
+        (4, 5),
+        (-4, 1),
+        (-3, -1),
+        (-2, 1),
+        (-1, -1),
+        (0, 1),
+        (1, -1),
+        (2, 1),
+        (3, -1),
+        (4, 1),
+        (5, -1),
+        (-3, -5),
+        (-1, -5),
+        (1, -5),
+        (2, -7),
+        (-4, -7),
+        (-5, -5),
+        (-2, -7)
+    )
 
     FLIP_TRIANGLE = [
         True, False, True, False, False,
@@ -88,20 +91,33 @@ class DymaxionProjection(GeographicProjection):
         True, False
     ]
 
-    CENTROIDS: list[tuple[float, float, float]] = [None] * 22
-
-    ROTATION_MATRICES: list[
-        tuple[tuple[float, float, float], tuple[float, float, float], tuple[float, float, float]]] = [None] * 22
-
-    INVERSE_ROTATION_MATRICES: list[
-        tuple[tuple[float, float, float], tuple[float, float, float], tuple[float, float, float]]] = [None] * 22
-
     FACE_ON_GRID = [
         -1, -1, 0, 1, 2, -1, -1, 3, -1, 4, -1,
         -1, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14,
         20, 19, 15, 21, 16, -1, 17, 18, -1, -1, -1,
     ]
 
+    # everything below is derived from the constants above by initialize() the first time a projection is built
+    INITIALIZED = False
+    INIT_LOCK = threading.Lock()
+
+    CENTER_MAP: list[tuple[float, float]] = None
+
+    VERTICES_SPHERICAL: list[tuple[float, float]] = None
+
+    CENTROIDS: list[tuple[float, float, float]] = None
+
+    ROTATION_MATRICES: list[
+        tuple[tuple[float, float, float], tuple[float, float, float], tuple[float, float, float]]] = None
+
+    INVERSE_ROTATION_MATRICES: list[
+        tuple[tuple[float, float, float], tuple[float, float, float], tuple[float, float, float]]] = None
+
+    CENTROIDS_ARRAY: np.ndarray = None
+    ROTATION_MATRICES_ARRAY: np.ndarray = None
+    INVERSE_ROTATION_MATRICES_ARRAY: np.ndarray = None
+    CENTER_MAP_ARRAY: np.ndarray = None
+
     # begin static math shit
 
     @staticmethod
@@ -139,6 +155,29 @@ class DymaxionProjection(GeographicProjection):
 
         return DymaxionProjection.FACE_ON_GRID[row * 11 + col]
 
+    @staticmethod
+    def find_triangle_grid_array(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        xp = x / DymaxionProjection.ARC
+        yp = y / (DymaxionProjection.ARC * MathUtils.ROOT3)
+
+        row = np.select([yp > 0.75, yp >= 0.25, yp > -0.25, yp >= -0.75], [-1, 0, 1, 2], -1)
+        yp = np.select([row == 0, row == 2], [0.5 - yp, -yp - 0.5], yp)
+
+        yp += 0.25
+
+        xr = xp - yp
+        yr = xp + yp
+
+        gx = np.floor(xr)
+        gy = np.floor(yr)
+
+        col = 2 * gx + (gy != gx) + 6
+
+        valid = (row != -1) & (col >= 0) & (col < 11)
+        index = np.where(valid, row * 11 + col, 0).astype(np.intp)
+
+        return np.where(valid, DymaxionProjection.FACE_ON_GRID_ARRAY[index], -1)
+
     @staticmethod
     def y_rot(spherical, rot: float) -> tuple[float, float]:
         c = MathUtils.spherical_to_cartesian(spherical)
@@ -154,41 +193,67 @@ class DymaxionProjection(GeographicProjection):
 
         return math.atan2(c[1], c[0]), math.atan2(math.sqrt(c[0] * c[0] + c[1] * c[1]), c[2])
 
-    vertices_cartesian = [[]] * len(VERTICES)
+    FLIP_TRIANGLE_ARRAY = np.array(FLIP_TRIANGLE)
+    FACE_ON_GRID_ARRAY = np.array(FACE_ON_GRID)
+
+    @staticmethod
+    def initialize() -> None:
+        if DymaxionProjection.INITIALIZED:
+            return
+
+        with DymaxionProjection.INIT_LOCK:
+            if DymaxionProjection.INITIALIZED:
+                return
+
+            center_map = [(x * 0.5 * DymaxionProjection.ARC, y * DymaxionProjection.ARC * MathUtils.ROOT3 / 12)
+                          for x, y in DymaxionProjection.CENTER_GRID]
+
+            vertices_spherical = [MathUtils.geo_to_spherical(vertex) for vertex in DymaxionProjection.VERTICES]
+            vertices_cartesian = [MathUtils.spherical_to_cartesian(vertex) for vertex in vertices_spherical]
 
-    for i in range(22):
-        CENTER_MAP[i][0] *= 0.5 * ARC
-        CENTER_MAP[i][1] *= ARC * MathUtils.ROOT3 / 12
+            centroids = [None] * 22
+            rotation_matrices = [None] * 22
+            inverse_rotation_matrices = [None] * 22
 
-    for i in range(len(VERTICES)):
-        vertex_spherical = MathUtils.geo_to_spherical(VERTICES[i])
-        vertex = MathUtils.spherical_to_cartesian(vertex_spherical)
-        vertices_cartesian[i] = vertex
-        VERTICES[i] = vertex_spherical
+            for i in range(22):
+                vec1 = vertices_cartesian[DymaxionProjection.ISO[i][0]]
+                vec2 = vertices_cartesian[DymaxionProjection.ISO[i][1]]
+                vec3 = vertices_cartesian[DymaxionProjection.ISO[i][2]]
 
-    for i in range(22):
-        vec1 = vertices_cartesian[ISO[i][0]]
-        vec2 = vertices_cartesian[ISO[i][1]]
-        vec3 = vertices_cartesian[ISO[i][2]]
+                xsum = vec1[0] + vec2[0] + vec3[0]
+                ysum = vec1[1] + vec2[1] + vec3[1]
+                zsum = vec1[2] + vec2[2] + vec3[2]
+                mag = math.sqrt(xsum * xsum + ysum * ysum + zsum * zsum)
+                centroids[i] = (xsum / mag, ysum / mag, zsum / mag)
 
-        xsum = vec1[0] + vec2[0] + vec3[0]
-        ysum = vec1[1] + vec2[1] + vec3[1]
-        zsum = vec1[2] + vec2[2] + vec3[2]
-        mag = math.sqrt(xsum * xsum + ysum * ysum + zsum * zsum)
-        CENTROIDS[i] = (xsum / mag, ysum / mag, zsum / mag)
+                centroid_spherical = MathUtils.cartesian_to_spherical(centroids[i])
+                centroid_lambda = centroid_spherical[0]
+                centroid_phi = centroid_spherical[1]
 
-        centroid_spherical = MathUtils.cartesian_to_spherical(CENTROIDS[i])
-        centroid_lambda = centroid_spherical[0]
-        centroid_phi = centroid_spherical[1]
+                vertex = vertices_spherical[DymaxionProjection.ISO[i][0]]
+                v = (vertex[0] - centroid_lambda, vertex[1])
+                v = DymaxionProjection.y_rot(v, -centroid_phi)
 
-        vertex = VERTICES[ISO[i][0]]
-        v = (vertex[0] - centroid_lambda, vertex[1])
-        v = y_rot(v, -centroid_phi)
+                rotation_matrices[i] = MathUtils.produce_zyz_rotation_matrix(-centroid_lambda, -centroid_phi,
+                                                                             (math.pi / 2) - v[0])
+                inverse_rotation_matrices[i] = MathUtils.produce_zyz_rotation_matrix(v[0] - (math.pi / 2),
+                                                                                     centroid_phi, centroid_lambda)
 
-        ROTATION_MATRICES[i] = MathUtils.produce_zyz_rotation_matrix(-centroid_lambda, -centroid_phi,
-                                                                     (math.pi / 2) - v[0])
-        INVERSE_ROTATION_MATRICES[i] = MathUtils.produce_zyz_rotation_matrix(v[0] - (math.pi / 2), centroid_phi,
-                                                                             centroid_lambda)
+            DymaxionProjection.CENTER_MAP = center_map
+            DymaxionProjection.VERTICES_SPHERICAL = vertices_spherical
+            DymaxionProjection.CENTROIDS = centroids
+            DymaxionProjection.ROTATION_MATRICES = rotation_matrices
+            DymaxionProjection.INVERSE_ROTATION_MATRICES = inverse_rotation_matrices
+
+            DymaxionProjection.CENTROIDS_ARRAY = np.array(centroids)
+            DymaxionProjection.ROTATION_MATRICES_ARRAY = np.array(rotation_matrices)
+            DymaxionProjection.INVERSE_ROTATION_MATRICES_ARRAY = np.array(inverse_rotation_matrices)
+            DymaxionProjection.CENTER_MAP_ARRAY = np.array(center_map)
+
+            DymaxionProjection.INITIALIZED = True
+
+    def __init__(self):
+        DymaxionProjection.initialize()
 
     def find_triangle(self, vector: list[float]) -> int:
         _min = sys.float_info.max
@@ -210,6 +275,16 @@ class DymaxionProjection(GeographicProjection):
 
         return face
 
+    def find_triangle_array(self, x: np.ndarray, y: np.ndarray, z: np.ndarray) -> np.ndarray:
+        centroids = DymaxionProjection.CENTROIDS_ARRAY[:20, :, np.newaxis]
+
+        xd = centroids[:, 0] - x
+        yd = centroids[:, 1] - y
+        zd = centroids[:, 2] - z
+
+        # the scalar early exit at dissq < 0.1 can only ever fire on the nearest centroid
+        return np.argmin(xd * xd + yd * yd + zd * zd, axis=0)
+
     def triangle_transform(self, vec: tuple[float, float, float]) -> tuple[float, float]:
         s = DymaxionProjection.Z / vec[2]
 
@@ -222,6 +297,18 @@ class DymaxionProjection(GeographicProjection):
 
         return 0.5 * (b - c), (2 * a - b - c) / (2 * MathUtils.ROOT3)
 
+    def triangle_transform_array(self, x: np.ndarray, y: np.ndarray, z: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        s = DymaxionProjection.Z / z
+
+        xp = s * x
+        yp = s * y
+
+        a = np.arctan((2 * yp / MathUtils.ROOT3 - DymaxionProjection.EL6) / DymaxionProjection.DVE)
+        b = np.arctan((xp - yp / MathUtils.ROOT3 - DymaxionProjection.EL6) / DymaxionProjection.DVE)
+        c = np.arctan((-xp - yp / MathUtils.ROOT3 - DymaxionProjection.EL6) / DymaxionProjection.DVE)
+
+        return 0.5 * (b - c), (2 * a - b - c) / (2 * MathUtils.ROOT3)
+
     def inverse_triangle_transform_newton(self, xpp: float, ypp: float) -> tuple[float, float, float]:
         tanaoff = math.tan(MathUtils.ROOT3 * ypp + xpp)
         tanboff = math.tan(2 * xpp)
@@ -261,6 +348,47 @@ class DymaxionProjection(GeographicProjection):
     def inverse_triangle_transform(self, x: float, y: float) -> tuple[float, float, float]:
         return self.inverse_triangle_transform_newton(x, y)
 
+    def inverse_triangle_transform_newton_array(self, xpp: np.ndarray, ypp: np.ndarray) -> tuple[
+            np.ndarray, np.ndarray, np.ndarray]:
+        tanaoff = np.tan(MathUtils.ROOT3 * ypp + xpp)
+        tanboff = np.tan(2 * xpp)
+
+        anumer = tanaoff * tanaoff + 1
+        bnumer = tanboff * tanboff + 1
+
+        tana = tanaoff
+        tanb = tanboff
+        tanc = np.zeros_like(tanaoff)
+
+        adenom = 1
+        bdenom = 1
+
+        for i in range(DymaxionProjection.NEWTON):
+            f = tana + tanb + tanc - DymaxionProjection.R
+            fp = anumer * adenom * adenom + bnumer * bdenom * bdenom + 1
+
+            tanc = tanc - f / fp
+
+            adenom = 1 / (1 - tanc * tanaoff)
+            bdenom = 1 / (1 - tanc * tanboff)
+
+            tana = (tanc + tanaoff) * adenom
+            tanb = (tanc + tanboff) * bdenom
+
+        yp = MathUtils.ROOT3 * (DymaxionProjection.DVE * tana + DymaxionProjection.EL6) / 2
+        xp = DymaxionProjection.DVE * tanb + yp / MathUtils.ROOT3 + DymaxionProjection.EL6
+
+        xpoz = xp / DymaxionProjection.Z
+        ypoz = yp / DymaxionProjection.Z
+
+        z = 1 / np.sqrt(1 + xpoz * xpoz + ypoz * ypoz)
+
+        return z * xpoz, z * ypoz, z
+
+    def inverse_triangle_transform_array(self, x: np.ndarray, y: np.ndarray) -> tuple[
+            np.ndarray, np.ndarray, np.ndarray]:
+        return self.inverse_triangle_transform_newton_array(x, y)
+
     def from_geo(self, longitude: float, latitude: float) -> tuple[float, float]:
         OutOfProjectionBoundsException.check_longitude_latitude_in_range(longitude, latitude)
 
@@ -287,6 +415,36 @@ class DymaxionProjection(GeographicProjection):
 
         return projected_vec[0], projected_vec[1]
 
+    def from_geo_array(self, longitudes: np.ndarray, latitudes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        shape = np.broadcast_shapes(longitudes.shape, latitudes.shape)
+        longitudes = np.broadcast_to(longitudes, shape).ravel()
+        latitudes = np.broadcast_to(latitudes, shape).ravel()
+
+        OutOfProjectionBoundsException.check_longitude_latitude_array_in_range(longitudes, latitudes)
+
+        x, y, z = MathUtils.spherical_to_cartesian_array(*MathUtils.geo_to_spherical_array(longitudes, latitudes))
+
+        face = self.find_triangle_array(x, y, z)
+
+        px, py, pz = MathUtils.mat_vec_prod_d_array(DymaxionProjection.ROTATION_MATRICES_ARRAY[face], x, y, z)
+        px, py = self.triangle_transform_array(px, py, pz)
+
+        flip = DymaxionProjection.FLIP_TRIANGLE_ARRAY[face]
+        px = np.where(flip, -px, px)
+        py = np.where(flip, -py, py)
+
+        wrap = (((face == 15) & (px > py * MathUtils.ROOT3)) | (face == 14)) & (px > 0)
+        px, py = (np.where(wrap, 0.5 * px - 0.5 * MathUtils.ROOT3 * py, px),
+                  np.where(wrap, 0.5 * MathUtils.ROOT3 * px + 0.5 * py, py))
+        face = np.where(wrap, face + 6, face)
+
+        px += DymaxionProjection.CENTER_MAP_ARRAY[face, 0]
+        py += DymaxionProjection.CENTER_MAP_ARRAY[face, 1]
+
+        return px.reshape(shape), py.reshape(shape)
+
     def to_geo(self, x: float, y: float) -> tuple[float, float]:
         face = self.find_triangle_grid(x, y)
 
@@ -319,10 +477,43 @@ class DymaxionProjection(GeographicProjection):
         y = c[1]
         z = c[2]
 
-        vecp = MathUtils.mat_vec_prod_d(DymaxionProjection.ROTATION_MATRICES[face], [x, y, z])
+        vecp = MathUtils.mat_vec_prod_d(DymaxionProjection.INVERSE_ROTATION_MATRICES[face], [x, y, z])
 
         return MathUtils.spherical_to_geo(MathUtils.cartesian_to_spherical(vecp))
 
+    def to_geo_array(self, x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        shape = np.broadcast_shapes(x.shape, y.shape)
+        x = np.broadcast_to(x, shape).ravel()
+        y = np.broadcast_to(y, shape).ravel()
+
+        face = self.find_triangle_grid_array(x, y)
+        valid = face != -1
+        face = np.where(valid, face, 0)
+
+        x = x - DymaxionProjection.CENTER_MAP_ARRAY[face, 0]
+        y = y - DymaxionProjection.CENTER_MAP_ARRAY[face, 1]
+
+        valid &= ~((face == 14) & (x > 0))
+        valid &= ~((face == 20) & (-y * MathUtils.ROOT3 > x))
+        valid &= ~((face == 15) & (x > 0) & (x > y * MathUtils.ROOT3))
+        valid &= ~((face == 21) & ((x < 0) | (-y * MathUtils.ROOT3 > x)))
+
+        flip = DymaxionProjection.FLIP_TRIANGLE_ARRAY[face]
+        x = np.where(flip, -x, x)
+        y = np.where(flip, -y, y)
+
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            c = self.inverse_triangle_transform_array(x, y)
+            vecp = MathUtils.mat_vec_prod_d_array(DymaxionProjection.INVERSE_ROTATION_MATRICES_ARRAY[face], *c)
+            longitudes, latitudes = MathUtils.spherical_to_geo_array(*MathUtils.cartesian_to_spherical_array(*vecp))
+
+        longitudes[~valid] = np.nan
+        latitudes[~valid] = np.nan
+
+        return longitudes.reshape(shape), latitudes.reshape(shape), valid.reshape(shape)
+
     def bounds(self) -> tuple[float, float, float, float]:
         return (
             -3 * DymaxionProjection.ARC, -0.75 * DymaxionProjection.ARC * MathUtils.ROOT3, 2.5 * DymaxionProjection.ARC,
@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class GeographicProjection:
     def to_geo(self, x: float, y: float) -> tuple[float, float]:
         raise NotImplementedError
@@ -5,6 +8,12 @@ class GeographicProjection:
     def from_geo(self, longitude: float, latitude: float) -> tuple[float, float]:
         raise NotImplementedError
 
+    def to_geo_array(self, x: np.ndarray, y: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
+    def from_geo_array(self, longitudes: np.ndarray, latitudes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
     def meters_per_unit(self) -> float:
         raise NotImplementedError
 
@@ -25,3 +34,6 @@ class GeographicProjection:
 
     def properties(self) -> dict[str, object]:
         raise NotImplementedError
+
+    def name(self) -> str:
+        return type(self).__name__
@@ -0,0 +1,137 @@
+import os
+import socket
+import subprocess
+import threading
+
+import paramiko
+
+PASSWORD = "password"
+HOST_KEY = paramiko.RSAKey.generate(1024)
+
+
+class StubServer:
+    # local SSH server over a directory, serving SFTP and, when allowed, exec of shell commands run in that directory
+    def __init__(self, root: str, allow_exec: bool = False, drop_after_removes: int = None):
+        self.root = root
+        self.allow_exec = allow_exec
+        self.drop_after_removes = drop_after_removes
+
+        self.lock = threading.Lock()
+        self.transports = []
+        self.removes = 0
+        self.execs = 0
+
+        self.socket = socket.socket()
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(("127.0.0.1", 0))
+        self.socket.listen(16)
+        self.port = self.socket.getsockname()[1]
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def serve(self):
+        while True:
+            try:
+                connection, _ = self.socket.accept()
+            except OSError:
+                return
+
+            transport = paramiko.Transport(connection)
+            transport.add_server_key(HOST_KEY)
+            transport.set_subsystem_handler("sftp", paramiko.SFTPServer, StubSftp, self)
+            transport.start_server(server=StubAuth(self))
+            with self.lock:
+                self.transports.append(transport)
+
+    def removed(self):
+        # counts a remove and drops every connection once drop_after_removes of them went through
+        with self.lock:
+            self.removes += 1
+            drop = self.removes == self.drop_after_removes
+
+        if drop:
+            for transport in self.transports:
+                transport.close()
+
+    def close(self):
+        self.socket.close()
+        for transport in self.transports:
+            transport.close()
+
+
+class StubAuth(paramiko.ServerInterface):
+    def __init__(self, server: StubServer):
+        self.server = server
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL if password == PASSWORD else paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_exec_request(self, channel, command):
+        if not self.server.allow_exec:
+            return False
+
+        self.server.execs += 1
+
+        def run():
+            result = subprocess.run(["sh", "-c", command.decode()], cwd=self.server.root, capture_output=True)
+            channel.sendall(result.stdout)
+            channel.send_exit_status(result.returncode)
+            channel.close()
+
+        threading.Thread(target=run, daemon=True).start()
+        return True
+
+
+class StubSftp(paramiko.SFTPServerInterface):
+    def __init__(self, auth: StubAuth, server: StubServer, *args, **kwargs):
+        super().__init__(auth, *args, **kwargs)
+        self.server = server
+
+    def local(self, path):
+        return os.path.join(self.server.root, os.path.normpath("/" + path).lstrip("/"))
+
+    def list_folder(self, path):
+        folder = self.local(path)
+        if not os.path.isdir(folder):
+            return paramiko.SFTP_NO_SUCH_FILE
+
+        files = []
+        for name in sorted(os.listdir(folder)):
+            attributes = paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(folder, name)))
+            attributes.filename = name
+            files.append(attributes)
+        return files
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self.local(path)))
+        except OSError:
+            return paramiko.SFTP_NO_SUCH_FILE
+
+    lstat = stat
+
+    def remove(self, path):
+        try:
+            os.remove(self.local(path))
+        except FileNotFoundError:
+            return paramiko.SFTP_NO_SUCH_FILE
+        except OSError:
+            return paramiko.SFTP_PERMISSION_DENIED
+        finally:
+            self.server.removed()
+
+        return paramiko.SFTP_OK
+
+
+def touch(root: str, *paths: str, mtime: int = 1700000000, size: int = 0):
+    for path in paths:
+        path = os.path.join(root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"\0" * size)
+        os.utime(path, (mtime, mtime))
@@ -0,0 +1,86 @@
+import pytest
+
+from exceptions.OutOfProjectionBoundsException import OutOfProjectionBoundsException
+from projections.BTEDymaxionProjection import BTEDymaxionProjection
+from projections.CachedProjection import CachedProjection, LruCache
+from projections.GeographicProjection import GeographicProjection
+
+
+class CountingProjection(GeographicProjection):
+    def __init__(self):
+        self.calls = 0
+
+    def from_geo(self, longitude, latitude):
+        self.calls += 1
+        if abs(latitude) > 90:
+            raise OutOfProjectionBoundsException()
+        return longitude * 2, latitude * 2
+
+    def to_geo(self, x, y):
+        self.calls += 1
+        return x / 2, y / 2
+
+
+def test_repeated_lookups_hit_the_cache():
+    inner = CountingProjection()
+    projection = CachedProjection(inner)
+
+    assert projection.from_geo(10.0, 20.0) == (20.0, 40.0)
+    assert projection.from_geo(10.0, 20.0) == (20.0, 40.0)
+    assert projection.to_geo(20.0, 40.0) == (10.0, 20.0)
+    assert inner.calls == 2
+
+    stats = projection.stats()
+    assert (stats["from_geo"]["hits"], stats["from_geo"]["misses"]) == (1, 1)
+    assert stats["from_geo"]["hit_rate"] == 0.5
+    assert (stats["to_geo"]["hits"], stats["to_geo"]["misses"]) == (0, 1)
+
+    projection.clear()
+    assert projection.stats()["from_geo"]["size"] == 0
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = LruCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1 and cache.stats()["size"] == 2
+
+
+def test_quantized_inputs_share_an_entry_and_change_the_name():
+    inner = CountingProjection()
+    projection = CachedProjection(inner, geo_quantum=1e-3)
+
+    first = projection.from_geo(10.0001, 20.0001)
+    assert projection.from_geo(10.0002, 20.0002) == first
+    assert inner.calls == 1
+
+    assert CachedProjection(inner).name() == "CountingProjection"
+    assert projection.name() != CachedProjection(inner).name()
+
+
+def test_out_of_bounds_errors_are_not_cached():
+    inner = CountingProjection()
+    projection = CachedProjection(inner)
+
+    for _ in range(2):
+        with pytest.raises(OutOfProjectionBoundsException):
+            projection.from_geo(0.0, 100.0)
+    assert inner.calls == 2
+    assert projection.stats()["from_geo"]["size"] == 0
+
+
+def test_exact_lookups_match_the_wrapped_projection():
+    bte = BTEDymaxionProjection()
+    projection = CachedProjection(bte, max_size=4)
+
+    for longitude, latitude in [(-80.0, 35.0), (2.35, 48.85), (-80.0, 35.0), (151.2, -33.9)]:
+        x, y = projection.from_geo(longitude, latitude)
+        assert (x, y) == bte.from_geo(longitude, latitude)
+        assert projection.to_geo(x, y) == bte.to_geo(x, y)
+
+    assert projection.stats()["from_geo"]["hits"] == 1
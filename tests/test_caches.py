@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+
+import ProjectionToMap as projection_to_map
+from CacheUtils import CacheUtils
+from ChunkListing import ChunkListing
+from ChunkStore import ChunkStore
+from ProjectionToMap import ProjectionToMap, region_conversion
+
+
+def test_listing_diff_only_reports_added_and_removed_names():
+    previous = ChunkListing({"0.0.2dr": (1, 10), "1.0.2dr": (1, 10)})
+    current = ChunkListing({"0.0.2dr": (2, 20), "2.0.2dr": (1, 10)})
+
+    assert current.diff(previous) == (["2.0.2dr"], ["1.0.2dr"])
+    assert current.diff(None) == (["0.0.2dr", "2.0.2dr"], [])
+
+
+def cached_pruner(cache_dir, key, calls):
+    pruner = ProjectionToMap.__new__(ProjectionToMap)
+    pruner.cache_dir = cache_dir
+    pruner.border_key = lambda states: key
+
+    def classify(states, points):
+        calls.append(len(points))
+        return points[:, 0] > 0
+
+    pruner.classify = classify
+    return pruner
+
+
+def test_inside_cache_reuses_results_and_evicts_older_border_keys(tmp_path):
+    cache_dir = str(tmp_path)
+    region = {"region_name": "south", "states": ["A"]}
+    points = np.array([(-1, 0), (1, 0), (2, 3)]) * np.array([region_conversion, -region_conversion])
+    other_region = CacheUtils.path(cache_dir, "inside-south2", "a" * 32, ".npz")
+    CacheUtils.save_npz(other_region, keys=np.zeros(0, dtype=np.int64), inside=np.zeros(0, dtype=bool))
+
+    calls = []
+    old = cached_pruner(cache_dir, "0" * 32, calls)
+    assert old.classify_with_cache(region, points).tolist() == [False, True, True]
+    assert old.classify_with_cache(region, points[:2]).tolist() == [False, True]
+    assert calls == [3]
+
+    # a new border key classifies again and removes the files written under the old one
+    new = cached_pruner(cache_dir, "1" * 32, calls)
+    assert new.classify_with_cache(region, points).tolist() == [False, True, True]
+    assert calls == [3, 3]
+    assert sorted(os.listdir(cache_dir)) == sorted([os.path.basename(other_region),
+                                                    "inside-south-" + "1" * 32 + ".npz"])
+
+
+class SpyPruner:
+    started = 0
+
+    def __init__(self, border_map, workers):
+        SpyPruner.started += 1
+        self.closed = False
+
+    def is_point_inside(self, states, points):
+        return points[:, 0] > 0
+
+    def close(self):
+        self.closed = True
+
+
+def test_process_pool_starts_only_when_the_inside_cache_misses(tmp_path, monkeypatch):
+    monkeypatch.setattr(projection_to_map, "ParallelPruner", SpyPruner)
+    monkeypatch.setattr(ChunkStore, "load", staticmethod(lambda name: np.array([(-1, 0), (1, 0), (2, 3)])))
+    SpyPruner.started = 0
+
+    region = {"region_name": "south", "states": ["A"]}
+    pruner = ProjectionToMap.__new__(ProjectionToMap)
+    pruner.regions = [region]
+    pruner.engine = "path"
+    pruner.workers = 4
+    pruner.pruner = None
+    pruner.cache_dir = str(tmp_path)
+    pruner.border_map = None
+    pruner.border_key = lambda states: "0" * 32
+
+    pruner.get_points([region])
+    assert SpyPruner.started == 1 and pruner.pruner is None
+
+    # every point answered by the inside cache, no pool is started
+    pruner.get_points([region])
+    assert SpyPruner.started == 1
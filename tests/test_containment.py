@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from ProjectionToMap import Feature, Map, MyPolygon, radius, region_conversion
+
+
+def square(center, half):
+    x, y = center
+    return np.array([(x - half, y - half), (x + half, y - half), (x + half, y + half), (x - half, y + half)])
+
+
+def circle(center, size, vertices):
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    return np.asarray(center) + size * np.column_stack((np.cos(angles), np.sin(angles)))
+
+
+def archipelago():
+    # a polygon with two holes, an island in one of them with its own lake, and small islands around it
+    size = region_conversion * 30
+    polygons = [
+        MyPolygon.from_projected([circle((0, 0), size, 80), square((-size / 3, 0), size / 5),
+                                  circle((size / 3, 0), size / 4, 40)]),
+        MyPolygon.from_projected([circle((size / 3, 0), size / 8, 20), square((size / 3, 0), size / 30)]),
+    ]
+    polygons += [MyPolygon.from_projected([circle((1.5 * size * np.cos(a), 1.5 * size * np.sin(a)), size / 12, 8)])
+                 for a in np.linspace(0, 2 * np.pi, 40, endpoint=False)]
+    return [Feature.from_polygons("A", polygons)]
+
+
+def lattice(features, step):
+    bounds = np.array([poly.bounds for feature in features for poly in feature.polygons])
+    low = bounds[:, :2].min(axis=0)
+    high = bounds[:, 2:].max(axis=0)
+    x, y = np.meshgrid(np.arange(low[0], high[0], step), np.arange(low[1], high[1], step))
+    return np.column_stack((x.ravel(), y.ravel()))
+
+
+def polygon_by_polygon(features, points, radius):
+    contains = np.zeros(len(points), dtype=bool)
+    for feature in features:
+        for poly in feature.polygons:
+            contains |= poly.contains_points(points, radius)
+    return contains
+
+
+@pytest.mark.parametrize("buffer", [0, radius, -radius / 4])
+def test_compound_and_polygon_strategies_agree(monkeypatch, buffer):
+    features = archipelago()
+    index = Map.build_index(features)
+    points = lattice(features, region_conversion / 2)
+    expected = polygon_by_polygon(features, points, buffer)
+
+    # the holes, the island in a hole and the lake on that island are all told apart
+    assert expected.any() and not expected.all()
+    assert np.array_equal(features[0].contains_points(points, buffer), expected)
+    assert np.array_equal(Map.contains_points(features, index, points, buffer), expected)
+
+    monkeypatch.setattr(Map, "compound_candidates", staticmethod(
+        lambda feature, hits: np.unique(np.concatenate([candidates for _, candidates in hits]))))
+    assert np.array_equal(Map.contains_points(features, index, points, buffer), expected)
+
+    monkeypatch.setattr(Map, "compound_candidates", staticmethod(lambda feature, hits: None))
+    assert np.array_equal(Map.contains_points(features, index, points, buffer), expected)
+
+
+def test_points_in_holes_and_on_islands():
+    features = archipelago()
+    size = region_conversion * 30
+    points = np.array([(0, size / 2), (-size / 3, 0), (size / 3 + size / 5, 0), (size / 3 + size / 16, 0),
+                       (size / 3, 0), (5 * size, 0)])
+
+    assert Map.contains_points(features, Map.build_index(features), points, 0).tolist() == [
+        True, False, False, True, False, False]
@@ -0,0 +1,99 @@
+import gzip
+import os
+
+import pytest
+
+import main
+from ChunkListing import ChunkListing
+from ExecListing import ExecListing
+from SftpPool import SftpPool
+from tests.sftp_stub import PASSWORD, StubServer, touch
+
+LINES = b"1.2.2dr 1700000000.2500000000 4096\n-3.-4.2dr 1700000001.0 0\nold copy 5.6.2dr 1700000002.5 7\n"
+
+
+def chunks(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 7, 1 << 16])
+def test_parse_stream_split_across_chunks(size):
+    listing = ChunkListing()
+    assert ExecListing.parse(chunks(gzip.compress(LINES + ExecListing.TRAILER + b"\n"), size), listing)
+
+    # whole seconds like SFTP reports them, and a name with spaces is kept whole and skipped as no region
+    assert listing.entries == {"1.2.2dr": (1700000000, 4096), "-3.-4.2dr": (1700000001, 0)}
+
+
+def test_parse_without_trailer_is_incomplete():
+    assert not ExecListing.parse(chunks(gzip.compress(LINES), 5), ChunkListing())
+    # a stream cut off partway
+    assert not ExecListing.parse(chunks(gzip.compress(LINES + ExecListing.TRAILER + b"\n")[:-12], 5), ChunkListing())
+
+
+def test_parse_rejects_malformed_lines():
+    with pytest.raises(ValueError):
+        ExecListing.parse([gzip.compress(b"1.2.2dr\n" + ExecListing.TRAILER + b"\n")], ChunkListing())
+
+
+@pytest.fixture
+def world(tmp_path, monkeypatch):
+    root = tmp_path / "server"
+    touch(str(root), "W/region2d/1.2.2dr", "W/region2d/-3.-4.2dr", mtime=1700000123, size=10)
+    touch(str(root), "W/region2d/old copy 5.6.2dr", "W/region2d/notes.txt", "W/region3d/0.0.0.3dr")
+
+    # ftp keeps its stores under ./data
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data")
+    return str(root)
+
+
+def listed(server: StubServer, backend: str) -> dict:
+    with SftpPool("127.0.0.1", server.port, PASSWORD) as pool:
+        main.ftp("127.0.0.1", server.port, "user", PASSWORD, "W", "region_chunks", pool, backend)
+
+    return ChunkListing.load(os.path.join("data", "region_chunks_listing.npz")).entries
+
+
+def test_exec_listing_matches_sftp(world):
+    server = StubServer(world, allow_exec=True)
+    try:
+        over_exec = listed(server, "exec")
+        assert server.execs == 1
+        over_sftp = listed(server, "sftp")
+    finally:
+        server.close()
+
+    assert over_exec == over_sftp == {"1.2.2dr": (1700000123, 10), "-3.-4.2dr": (1700000123, 10)}
+
+
+def test_refused_exec_falls_back_to_sftp(world):
+    server = StubServer(world, allow_exec=False)
+    try:
+        assert listed(server, "auto") == {"1.2.2dr": (1700000123, 10), "-3.-4.2dr": (1700000123, 10)}
+        with pytest.raises(RuntimeError):
+            listed(server, "exec")
+    finally:
+        server.close()
+
+
+def test_failing_or_hanging_exec_falls_back_to_sftp(world, monkeypatch):
+    server = StubServer(world, allow_exec=True)
+    try:
+        with SftpPool("127.0.0.1", server.port, PASSWORD) as pool:
+            # a find without -printf prints nothing and no trailer
+            monkeypatch.setattr(ExecListing, "command", lambda directory: "false | gzip")
+            assert not ExecListing.list_directory(pool, "user", "./W/region2d", ChunkListing())
+
+            # output that is not gzip
+            monkeypatch.setattr(ExecListing, "command", lambda directory: "echo plain")
+            assert not ExecListing.list_directory(pool, "user", "./W/region2d", ChunkListing())
+
+            # no output before the timeout
+            monkeypatch.setattr(ExecListing, "TIMEOUT", 0.2)
+            monkeypatch.setattr(ExecListing, "command", lambda directory: "sleep 2")
+            assert not ExecListing.list_directory(pool, "user", "./W/region2d", ChunkListing())
+
+        assert listed(server, "auto") == {"1.2.2dr": (1700000123, 10), "-3.-4.2dr": (1700000123, 10)}
+    finally:
+        server.close()
@@ -0,0 +1,58 @@
+import json
+import random
+
+import pytest
+
+from GeoJsonReader import GeoJsonReader
+
+# characters the tokenizer has to see through inside strings
+TRICKY = '{}[]"\\:, \n\t/é€'
+
+
+def tricky_string(rng, length):
+    return "".join(rng.choice(TRICKY + "abc") for _ in range(length))
+
+
+def feature(rng, name, key="name"):
+    ring = [[round(rng.uniform(-180, 180), 6), round(rng.uniform(-90, 90), 6)] for _ in range(rng.randint(3, 8))]
+    return {
+        "type": "Feature",
+        "properties": {key: name, "note": tricky_string(rng, 12), "features": [{"nested": "}"}], "empty": {}},
+        "geometry": rng.choice([{"type": "Polygon", "coordinates": [ring + ring[:1]]},
+                                {"type": "MultiPolygon", "coordinates": [[ring + ring[:1]], [ring[:3] + ring[:1]]]}]),
+    }
+
+
+def document(seed):
+    # "features" keys and brackets in strings and in other top level objects must not be taken for the feature array
+    rng = random.Random(seed)
+    names = ["Alabama", 'Quote "State"', "Brace {State}", "Back\\slash", tricky_string(rng, 8), "Ünïcode"]
+    features = [feature(rng, name, rng.choice(["name", "NAME", "ADMIN"])) for name in names]
+    features.append({"type": "Feature", "properties": None, "geometry": None})
+
+    collection = {"type": "FeatureCollection", "name": 'x {"features": [', "crs": {"features": [{"a": 1}]},
+                  "features": features, "bbox": [-180, -90, 180, 90]}
+    text = json.dumps(collection, indent=rng.choice([None, 1, 4]), ensure_ascii=rng.random() < 0.5)
+    return text.replace('"features": [', '"features" :\n [', rng.randint(0, 3))
+
+
+@pytest.mark.parametrize("seed", range(8))
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 20])
+def test_features_match_json_load(tmp_path, seed, chunk_size):
+    path = tmp_path / "geo.json"
+    path.write_text(document(seed), encoding="utf-8")
+    expected = json.loads(path.read_text(encoding="utf-8"))["features"]
+
+    assert list(GeoJsonReader.iter_features(str(path), chunk_size=chunk_size)) == expected
+
+    names = {GeoJsonReader.feature_name(expected[0]["properties"]),
+             GeoJsonReader.feature_name(expected[2]["properties"]), "Missing"}
+    assert list(GeoJsonReader.iter_features(str(path), names, chunk_size=chunk_size)) == [
+        item for item in expected if item["properties"] and GeoJsonReader.feature_name(item["properties"]) in names]
+
+
+def test_features_key_inside_other_objects_only(tmp_path):
+    path = tmp_path / "geo.json"
+    path.write_text(json.dumps({"type": "FeatureCollection", "meta": {"features": [{"type": "Feature"}]}}))
+
+    assert list(GeoJsonReader.iter_features(str(path), chunk_size=5)) == []
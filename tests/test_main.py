@@ -0,0 +1,97 @@
+import json
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import main
+from PointTable import PointTable
+
+
+def write_config(path, regions):
+    with open(path, "w") as f:
+        json.dump({"regions": regions, "host": "host", "port": 22, "password": "password", "geo": "geo.json"}, f)
+
+
+def test_stats_reads_a_legacy_chunk_list_without_converting_it(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data")
+    with open(os.path.join("data", "old_chunks"), "w") as f:
+        f.write("1 2\n3 4\n-5 6\n")
+
+    regions = [{"region_name": name, "states": ["A"]} for name in ("old", "never")]
+    main.stats({"regions": regions}, output_format="json")
+
+    rows = json.loads(capsys.readouterr().out)
+    assert [(row["region"], row["chunks"], row["synced"] is not None) for row in rows] == [
+        ("old", 3, True), ("never", 0, False)]
+    assert os.listdir("data") == ["old_chunks"]
+
+
+def test_no_command_prunes_with_the_shared_flags(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(main, "prune", lambda config, region_names, **kwargs: calls.append(
+        (config["regions"][0]["region_name"], region_names, kwargs)))
+    write_config(tmp_path / "other.json", [{"region_name": "south", "states": []}])
+
+    main.cli(["--config", str(tmp_path / "other.json"), "--regions", "south", "--format", "json", "--workers", "3",
+              "--metrics", str(tmp_path / "metrics.txt")])
+
+    assert calls == [("south", ["south"], {"workers": 3, "output_format": "json"})]
+
+
+class CleanMap:
+    # what clean reads of a loaded ProjectionToMap: the regions, their classified points and the missing states
+    def __init__(self, regions, inside, missing=()):
+        self.regions = regions
+        self.points_list = PointTable(np.arange(len(inside)), np.zeros(len(inside)), np.zeros(len(inside)), inside)
+        self.missing = list(missing)
+
+    def missing_states(self):
+        return self.missing
+
+
+class NoServer:
+    def __init__(self, *args, **kwargs):
+        raise AssertionError("clean opened a connection")
+
+
+def run_clean(monkeypatch, inside, missing=(), **kwargs):
+    regions = [{"region_name": "south", "username": "user", "world_name": "world", "states": ["Alabama"]}]
+    monkeypatch.setattr(main, "load_map", lambda *args: CleanMap(regions, inside, missing))
+    monkeypatch.setattr(main, "SftpPool", NoServer)
+    main.clean({"regions": regions, "geo": "geo.json", "host": "host", "port": 22, "password": "password"}, **kwargs)
+
+
+def test_clean_stops_before_planning_when_a_state_is_missing(monkeypatch, capsys):
+    with pytest.raises(SystemExit):
+        run_clean(monkeypatch, [False] * 4, missing=["Alabma"])
+
+    assert "Alabma not found in geo.json" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("inside", [[False] * 4, [False, False, False, True]])
+def test_clean_refuses_to_apply_a_plan_deleting_most_of_a_region(monkeypatch, capsys, inside):
+    with pytest.raises(SystemExit):
+        run_clean(monkeypatch, inside, apply=True)
+
+    assert "--force" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("kwargs", [{"apply": True, "force": True}, {"apply": False},
+                                    {"apply": True, "max_share": 0.8}])
+def test_clean_plans_when_forced_dry_run_or_under_the_share(monkeypatch, kwargs):
+    # getting as far as the server means the guards let the plan through
+    with pytest.raises(AssertionError, match="opened a connection"):
+        run_clean(monkeypatch, [False, False, False, True], **kwargs)
+
+
+def test_missing_states_are_the_configured_states_without_a_feature():
+    from ProjectionToMap import ProjectionToMap
+
+    map = ProjectionToMap.__new__(ProjectionToMap)
+    map.filtered_states = ["Alabama", "Alabma", "Alabama"]
+    map.border_map = SimpleNamespace(features=[SimpleNamespace(name="Alabama")])
+
+    assert map.missing_states() == ["Alabma"]
@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from MathUtils import MathUtils
+from exceptions.OutOfProjectionBoundsException import OutOfProjectionBoundsException
+from projections.BTEDymaxionProjection import BTEDymaxionProjection
+from projections.ConformalDynmaxionProjection import ConformalDynmaxionProjection
+from projections.DymaxionProjection import DymaxionProjection
+
+PROJECTIONS = [DymaxionProjection, ConformalDynmaxionProjection, BTEDymaxionProjection]
+
+
+@pytest.fixture(scope="module", params=PROJECTIONS, ids=lambda cls: cls.__name__)
+def projection(request):
+    return request.param()
+
+
+def random_geo(seed, count=400):
+    # uniform over the sphere, the poles and the antimeridian included
+    rng = np.random.default_rng(seed)
+    longitudes = np.concatenate((rng.uniform(-180, 180, count), [180, -180, 0, 0]))
+    latitudes = np.concatenate((np.degrees(np.arcsin(rng.uniform(-1, 1, count))), [0, 0, 90, -90]))
+    return longitudes, latitudes
+
+
+def test_from_geo_array_matches_from_geo(projection):
+    longitudes, latitudes = random_geo(0)
+    x, y = projection.from_geo_array(longitudes, latitudes)
+
+    expected = np.array([projection.from_geo(lon, lat) for lon, lat in zip(longitudes.tolist(), latitudes.tolist())])
+    np.testing.assert_allclose(np.column_stack((x, y)), expected, rtol=0, atol=1e-12)
+
+
+def test_from_geo_array_keeps_the_input_shape(projection):
+    longitudes, latitudes = random_geo(1, 12)
+    x, y = projection.from_geo_array(longitudes[:12].reshape(3, 4), latitudes[:12].reshape(3, 4))
+
+    assert x.shape == y.shape == (3, 4)
+    np.testing.assert_array_equal(x.ravel(), projection.from_geo_array(longitudes[:12], latitudes[:12])[0])
+
+
+def random_projected(projection, seed, count=400):
+    # spread a little past the bounds, so points outside the projection are drawn too
+    rng = np.random.default_rng(seed)
+    west, south, east, north = projection.bounds()
+    return rng.uniform(1.1 * west, 1.1 * east, count), rng.uniform(1.1 * south, 1.1 * north, count)
+
+
+def scalar_to_geo(projection, x, y):
+    results = []
+    for point in zip(x.tolist(), y.tolist()):
+        try:
+            results.append((*projection.to_geo(*point), True))
+        except OutOfProjectionBoundsException:
+            results.append((np.nan, np.nan, False))
+    return np.array(results)
+
+
+def test_to_geo_array_matches_to_geo_and_its_exceptions(projection):
+    x, y = random_projected(projection, 2)
+    longitudes, latitudes, valid = projection.to_geo_array(x, y)
+    expected = scalar_to_geo(projection, x, y)
+
+    # valid is False exactly where the scalar inverse raises, and those points come back as NaN
+    assert 0 < np.count_nonzero(valid) < len(valid)
+    np.testing.assert_array_equal(valid, expected[:, 2].astype(bool))
+    assert np.isnan(longitudes[~valid]).all() and np.isnan(latitudes[~valid]).all()
+    np.testing.assert_allclose(np.column_stack((longitudes, latitudes))[valid], expected[valid, :2], rtol=0,
+                               atol=1e-9)
+
+
+def test_dymaxion_round_trips():
+    projection = DymaxionProjection()
+    longitudes, latitudes = random_geo(3)
+    # the poles have no single longitude to come back to
+    longitudes, latitudes = longitudes[np.abs(latitudes) < 89], latitudes[np.abs(latitudes) < 89]
+
+    x, y = projection.from_geo_array(longitudes, latitudes)
+    back_longitudes, back_latitudes, valid = projection.to_geo_array(x, y)
+    assert valid.all()
+
+    scalar = np.array([projection.to_geo(*point) for point in zip(x.tolist(), y.tolist())])
+    for back in (np.column_stack((back_longitudes, back_latitudes)), scalar):
+        np.testing.assert_allclose((back[:, 0] - longitudes + 180) % 360 - 180, 0, atol=1e-5)
+        np.testing.assert_allclose(back[:, 1], latitudes, atol=1e-5)
+
+
+def rotated_onto_faces(projection, longitudes, latitudes):
+    # the face-local unit vectors from_geo hands to triangle_transform
+    vectors = []
+    for point in zip(longitudes.tolist(), latitudes.tolist()):
+        vector = MathUtils.spherical_to_cartesian(MathUtils.geo_to_spherical(point))
+        face = projection.find_triangle(vector)
+        vectors.append(MathUtils.mat_vec_prod_d(DymaxionProjection.ROTATION_MATRICES[face], vector))
+    return np.array(vectors)
+
+
+def five_step_solve(projection, vector):
+    # the conformal forward transform before the inverse grid: five newton steps from the affine guess
+    x, y = DymaxionProjection.triangle_transform(projection, vector)
+    u, v = projection.apply_newtons_method(x, y, x / DymaxionProjection.ARC + 0.5,
+                                           y / DymaxionProjection.ARC + MathUtils.ROOT3 / 6, 5)
+    return (u - 0.5) * DymaxionProjection.ARC, (v - MathUtils.ROOT3 / 6) * DymaxionProjection.ARC
+
+
+def test_inverse_grid_solve_matches_the_five_step_solve():
+    projection = ConformalDynmaxionProjection()
+    vectors = rotated_onto_faces(projection, *random_geo(4, 1000))
+    expected = np.array([five_step_solve(projection, vector) for vector in vectors])
+
+    assert ConformalDynmaxionProjection.INVERSE_STEPS <= ConformalDynmaxionProjection.INVERSE_MAX_STEPS
+    assert ConformalDynmaxionProjection.INVERSE_MAX_ERROR <= ConformalDynmaxionProjection.INVERSE_TOLERANCE
+
+    # both within the documented tolerance of the old solve, in triangle units
+    scalar = np.array([projection.triangle_transform(vector) for vector in vectors])
+    array = np.column_stack(projection.triangle_transform_array(*vectors.T))
+    for result in (scalar, array):
+        error = np.abs(result - expected).max() / DymaxionProjection.ARC
+        assert error <= ConformalDynmaxionProjection.INVERSE_TOLERANCE
@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from ProjectionToMap import Feature, Map, MyPolygon, ParallelPruner, ProjectionToMap, radius, region_conversion
+from RegionRaster import RegionRaster
+
+
+def star(rng, center, size, vertices):
+    angles = np.sort(rng.uniform(0, 2 * np.pi, vertices))
+    radii = size * rng.uniform(0.6, 1.0, vertices)
+    return np.asarray(center) + np.column_stack((radii * np.cos(angles), radii * np.sin(angles)))
+
+
+def features(seed):
+    rng = np.random.default_rng(seed)
+    size = region_conversion * 40
+    polygons = [
+        MyPolygon.from_projected([star(rng, (0, 0), size, 60), star(rng, (0, 0), size / 3, 30)]),
+        MyPolygon.from_projected([star(rng, (2.2 * size, 0.3 * size), size, 200)]),
+        MyPolygon.from_projected([star(rng, (0.1 * size, 2.1 * size), size / 5, 12)]),
+    ]
+    return [Feature.from_polygons("A", polygons[:2]), Feature.from_polygons("B", polygons[2:])]
+
+
+def lattice(polygons, margin):
+    bounds = np.array([poly.bounds for poly in polygons])
+    low = np.floor(bounds[:, :2].min(axis=0) / region_conversion) - margin
+    high = np.ceil(bounds[:, 2:].max(axis=0) / region_conversion) + margin
+    x, y = np.meshgrid(np.arange(low[0], high[0] + 1), np.arange(low[1], high[1] + 1))
+    return np.column_stack((x.ravel(), y.ravel())) * region_conversion
+
+
+def test_raster_matches_the_path_engine_on_the_region_lattice():
+    for seed in range(3):
+        selected = features(seed)
+        polygons = [poly for feature in selected for poly in feature.polygons]
+        points = lattice(polygons, 3)
+
+        raster = RegionRaster.rasterize(polygons, region_conversion, radius)
+        expected = Map.contains_points(selected, Map.build_index(selected), points)
+
+        assert expected.any() and not expected.all()
+        assert np.array_equal(raster.contains_points(points), expected)
+
+
+def test_raster_save_and_load_round_trip(tmp_path):
+    polygons = [poly for feature in features(5) for poly in feature.polygons]
+    raster = RegionRaster.rasterize(polygons, region_conversion, radius)
+    raster.save(str(tmp_path / "raster.npz"))
+
+    loaded = RegionRaster.load(str(tmp_path / "raster.npz"))
+    points = lattice(polygons, 1)
+    assert np.array_equal(loaded.contains_points(points), raster.contains_points(points))
+
+
+class BorderMap:
+    def __init__(self, selected):
+        self.selected = selected
+
+    def get_index(self, states):
+        return self.selected, Map.build_index(self.selected)
+
+
+def test_get_raster_without_a_cache_dir():
+    pruner = ProjectionToMap.__new__(ProjectionToMap)
+    pruner.cache_dir = None
+    pruner.rasters = {}
+    pruner.border_map = BorderMap(features(1))
+    pruner.border_key = lambda states: "key"
+
+    raster = pruner.get_raster(["A", "B"])
+    assert pruner.get_raster(["A", "B"]) is raster
+    assert raster.mask.any()
+
+
+def test_unknown_render_mode_is_refused():
+    pruner = ProjectionToMap.__new__(ProjectionToMap)
+
+    with pytest.raises(ValueError, match="render mode 'outline'"):
+        pruner.print("outline")
+
+
+def test_parallel_pruner_matches_the_single_process_path():
+    border_map = Map.__new__(Map)
+    border_map.features = features(2)
+    border_map.indexes = {}
+
+    polygons = [poly for feature in border_map.features for poly in feature.polygons]
+    # a count that is no multiple of 8, so the packed shards end partway through a byte
+    points = lattice(polygons, 2)[:-3]
+
+    with ParallelPruner(border_map, 2) as pruner:
+        for states in (["A", "B"], ["B"]):
+            expected = Map.contains_points(*border_map.get_index(states), points)
+
+            assert expected.any() and not expected.all()
+            assert np.array_equal(pruner.is_point_inside(states, points), expected)
+
+        assert pruner.is_point_inside(["A"], np.zeros((0, 2))).shape == (0,)
@@ -0,0 +1,155 @@
+import os
+
+import paramiko
+import pytest
+from paramiko.sftp import CMD_STATUS
+
+from RemoteDeleter import DeletionJournal, RemoteDeleter
+from SftpPool import SftpPool
+from tests.sftp_stub import PASSWORD, StubServer, touch
+
+
+class ReversedSftp:
+    # stands in for an SFTPClient whose server answers the newest outstanding request first
+    def __init__(self, codes):
+        self.codes = codes
+        self.pending = []
+        self.request_number = 0
+        self.max_in_flight = 0
+
+    def _adjust_cwd(self, path):
+        return path
+
+    def _async_request(self, fileobj, t, path):
+        self.pending.append((fileobj, self.request_number, path))
+        self.max_in_flight = max(self.max_in_flight, len(self.pending))
+        self.request_number += 1
+        return self.request_number - 1
+
+    def _read_response(self):
+        fileobj, num, path = self.pending.pop()
+        msg = paramiko.Message()
+        msg.add_int(self.codes.get(path, paramiko.SFTP_OK))
+        msg.add_string("")
+        msg.rewind()
+        fileobj._async_response(CMD_STATUS, msg, num)
+
+
+def test_plan_maps_region3d_columns_with_floor_division():
+    region2d, region3d = RemoteDeleter.plan([(-1, -1), (3, 0)], [
+        "-1.5.-1.3dr", "-2.0.-2.3dr", "-2.-7.-1.3dr",  # region2d (-1, -1)
+        "0.0.-1.3dr", "-3.0.-1.3dr", "-1.0.0.3dr",  # neighbours of it
+        "6.0.1.3dr", "7.-1.0.3dr", "8.0.0.3dr",  # (3, 0) and a neighbour
+        "1.2.3dr", "a.b.c.3dr", "1.2.3.2dr",  # not region3d files
+    ])
+
+    assert region2d == ["region2d/-1.-1.2dr", "region2d/3.0.2dr"]
+    assert region3d == sorted(["region3d/-1.5.-1.3dr", "region3d/-2.0.-2.3dr", "region3d/-2.-7.-1.3dr",
+                               "region3d/6.0.1.3dr", "region3d/7.-1.0.3dr"])
+
+
+def test_plan_without_regions_or_region3d_files():
+    assert RemoteDeleter.plan([], ["0.0.0.3dr"]) == ([], [])
+    assert RemoteDeleter.plan([(0, 0)], []) == (["region2d/0.0.2dr"], [])
+
+
+def test_finished_regions_keep_columns_with_region3d_files_left():
+    region2d = ["region2d/-1.-1.2dr", "region2d/3.0.2dr", "region2d/4.4.2dr"]
+    region3d = ["region3d/-2.0.-2.3dr", "region3d/6.0.1.3dr"]
+    done = {"region2d/-1.-1.2dr", "region2d/3.0.2dr", "region3d/-2.0.-2.3dr"}
+
+    assert RemoteDeleter.finished_regions(region2d, region3d, done) == [(-1, -1)]
+
+
+def test_journal_ignores_and_cuts_a_truncated_last_line(tmp_path):
+    path = tmp_path / "journal.txt"
+    path.write_text("region2d/1.2.2dr\nregion2d/3.4.2dr\nregion3d/5.6.")
+
+    with DeletionJournal(str(path)) as journal:
+        assert journal.done == {"region2d/1.2.2dr", "region2d/3.4.2dr"}
+        journal.record(["region3d/5.6.7.3dr"])
+
+    assert path.read_text() == "region2d/1.2.2dr\nregion2d/3.4.2dr\nregion3d/5.6.7.3dr\n"
+    assert DeletionJournal(str(path)).done == {"region2d/1.2.2dr", "region2d/3.4.2dr", "region3d/5.6.7.3dr"}
+
+
+def test_journal_is_not_created_without_deletions(tmp_path):
+    with DeletionJournal(str(tmp_path / "journal.txt")) as journal:
+        journal.record([])
+
+    assert not os.path.exists(tmp_path / "journal.txt")
+
+
+def test_remove_pipelined_matches_replies_answered_out_of_order():
+    paths = [f"region2d/{i}.0.2dr" for i in range(200)]
+    sftp = ReversedSftp({paths[5]: paramiko.SFTP_NO_SUCH_FILE, paths[150]: paramiko.SFTP_PERMISSION_DENIED})
+
+    codes = RemoteDeleter.remove_pipelined(sftp, paths, window=16)
+
+    expected = [paramiko.SFTP_OK] * len(paths)
+    expected[5] = paramiko.SFTP_NO_SUCH_FILE
+    expected[150] = paramiko.SFTP_PERMISSION_DENIED
+    assert codes == expected
+    assert sftp.max_in_flight == 16
+
+
+@pytest.fixture
+def world(tmp_path):
+    root = tmp_path / "server"
+    paths = [f"region2d/{x}.{z}.2dr" for x in range(-5, 5) for z in range(-3, 3)]
+    touch(str(root), *("./W/" + path for path in paths))
+    return str(root), paths
+
+
+def test_apply_removes_and_reports_failures(world, tmp_path):
+    root, paths = world
+    os.remove(os.path.join(root, "W", paths[0]))
+    os.makedirs(os.path.join(root, "W", "region3d", "0.0.0.3dr"))
+    server = StubServer(root)
+
+    try:
+        with SftpPool("127.0.0.1", server.port, PASSWORD) as pool, \
+                DeletionJournal(str(tmp_path / "journal.txt")) as journal:
+            removed, failed = RemoteDeleter(pool, "user", "W", journal, 2).apply(paths + ["region3d/0.0.0.3dr"])
+    finally:
+        server.close()
+
+    # the file that was already gone counts as removed, the directory cannot be removed
+    assert removed == len(paths)
+    assert failed == ["region3d/0.0.0.3dr"]
+    assert os.listdir(os.path.join(root, "W", "region2d")) == []
+    assert DeletionJournal(str(tmp_path / "journal.txt")).done == set(paths)
+
+
+def test_apply_resumes_after_a_dropped_connection(world, tmp_path, monkeypatch):
+    root, paths = world
+    monkeypatch.setattr(RemoteDeleter, "BATCH", 8)
+    journal_path = str(tmp_path / "journal.txt")
+
+    # the connection drops partway, the batches it takes down are reported failed instead of raising
+    server = StubServer(root, drop_after_removes=20)
+    try:
+        with SftpPool("127.0.0.1", server.port, PASSWORD, max_channels=2) as pool, \
+                DeletionJournal(journal_path) as journal:
+            removed, failed = RemoteDeleter(pool, "user", "W", journal, 2).apply(paths)
+    finally:
+        server.close()
+
+    assert failed and removed == len(paths) - len(failed)
+    assert removed >= 8
+    left = {"region2d/" + name for name in os.listdir(os.path.join(root, "W", "region2d"))}
+    assert left <= set(failed)
+
+    # a new run skips what the journal holds and counts files removed without a reply as done
+    server = StubServer(root)
+    try:
+        with SftpPool("127.0.0.1", server.port, PASSWORD) as pool, DeletionJournal(journal_path) as journal:
+            assert not journal.done & set(failed)
+            removed, failed_again = RemoteDeleter(pool, "user", "W", journal, 1).apply(paths)
+    finally:
+        server.close()
+
+    assert (removed, failed_again) == (len(failed), [])
+    assert server.removes == len(failed)
+    assert os.listdir(os.path.join(root, "W", "region2d")) == []
+    assert DeletionJournal(journal_path).done == set(paths)
@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+
+import paramiko
+import pytest
+
+import main
+from ChunkStore import ChunkStore
+from SftpPool import SftpPool
+
+FILES = {
+    "W1": ["0.0.2dr", "1.-1.2dr", "junk.txt"],
+    "W2": ["-5.3.2dr"],
+    "W3": ["7.7.2dr", "8.7.2dr"],
+    "W4": [],
+}
+
+
+class FakeTransport:
+    def is_active(self):
+        return True
+
+    def open_session(self):
+        raise paramiko.ChannelException(1, "exec is not allowed")
+
+    def close(self):
+        pass
+
+
+class FakeClient:
+    # an SFTP session that takes a while to list a world, counting how many listings run at once
+    active = 0
+    most_active = 0
+    lock = threading.Lock()
+
+    def __init__(self):
+        self.closed = False
+
+    def listdir_iter(self, path):
+        with FakeClient.lock:
+            FakeClient.active += 1
+            FakeClient.most_active = max(FakeClient.most_active, FakeClient.active)
+        time.sleep(0.1)
+        with FakeClient.lock:
+            FakeClient.active -= 1
+
+        for name in FILES[path.split("/")[1]]:
+            attributes = paramiko.SFTPAttributes()
+            attributes.filename = name
+            attributes.st_mtime = 1700000000
+            attributes.st_size = 512
+            yield attributes
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def stub_pool(monkeypatch, tmp_path):
+    opened = []
+
+    def get_transport(self, username):
+        with self.lock:
+            if username not in self.transports:
+                self.transports[username] = FakeTransport()
+                self.idle[username] = []
+                self.open_counts[username] = 0
+            return self.transports[username]
+
+    def from_transport(transport):
+        client = FakeClient()
+        opened.append(client)
+        return client
+
+    monkeypatch.setattr(SftpPool, "get_transport", get_transport)
+    monkeypatch.setattr(paramiko.SFTPClient, "from_transport", staticmethod(from_transport))
+    FakeClient.active = FakeClient.most_active = 0
+
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data")
+    return opened
+
+
+def test_concurrent_listing_fills_every_chunk_store(stub_pool):
+    regions = [{"region_name": f"r{i}", "username": "user", "world_name": world} for i, world in enumerate(FILES)]
+    main.update_chunk_list(regions, "host", 22, "password", workers=2)
+
+    for region in regions:
+        expected = [tuple(map(int, name.split(".")[:2])) for name in FILES[region["world_name"]]
+                    if name.endswith(".2dr")]
+        assert sorted(map(tuple, ChunkStore.load(region["region_name"]).tolist())) == sorted(expected)
+
+    # two sessions on the one transport, reused for the four worlds, and two listings at a time
+    assert len(stub_pool) == 2
+    assert FakeClient.most_active == 2
+
+
+def test_sessions_per_user_stay_within_max_channels(stub_pool):
+    pool = SftpPool("host", 22, "password", max_channels=2)
+    barrier = threading.Barrier(4)
+    seen = []
+
+    def work():
+        barrier.wait()
+        with pool.sftp("user") as client:
+            seen.append(client)
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(stub_pool) == 2
+    assert len(set(map(id, seen))) == 2
+    assert len(pool.idle["user"]) == 2
+
+
+def test_broken_channel_is_released_as_broken(stub_pool, monkeypatch):
+    pool = SftpPool("host", 22, "password", max_channels=1)
+    releases = []
+    release = SftpPool.release
+    monkeypatch.setattr(SftpPool, "release", lambda self, username, client, broken=False: (
+        releases.append(broken), release(self, username, client, broken)))
+
+    with pytest.raises(EOFError):
+        with pool.sftp("user"):
+            raise EOFError("channel dropped")
+
+    assert releases == [True]
+    assert stub_pool[0].closed
+    assert pool.open_counts["user"] == 0 and pool.idle["user"] == []
+
+    # the next session is a new one, not the broken client
+    with pool.sftp("user") as client:
+        assert client is stub_pool[1]
+    assert releases == [True, False]
+
+
+def test_refused_sessions_lower_the_channel_limit(stub_pool, monkeypatch):
+    pool = SftpPool("host", 22, "password", max_channels=4)
+    first = pool.acquire("user")
+
+    def refuse(transport):
+        raise paramiko.ChannelException(1, "too many sessions")
+
+    monkeypatch.setattr(paramiko.SFTPClient, "from_transport", staticmethod(refuse))
+    released = threading.Timer(0.1, pool.release, ("user", first))
+    released.start()
+
+    # no second session can be opened, so the caller waits for the first one instead
+    assert pool.acquire("user") is first
+    assert pool.limits["user"] == 1
+    released.join()
+
+
+def test_listing_keeps_only_region_files(stub_pool):
+    main.ftp("host", 22, "user", "password", "W1", "r_chunks")
+    assert sorted(map(tuple, ChunkStore.load("r").tolist())) == [(0, 0), (1, -1)]
@@ -0,0 +1,153 @@
+import copy
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from PolygonSimplifier import PolygonSimplifier
+from ProjectionToMap import Feature, Map, MyPolygon, radius, region_conversion, simplify_tolerance
+
+
+def wiggle(rng, start, stop, vertices, amplitude):
+    # a densely sampled winding border between two corners, both corners included
+    t = np.linspace(0, 1, vertices + 2)[:, np.newaxis]
+    normal = np.array([start[1] - stop[1], stop[0] - start[0]]) / np.hypot(*(stop - start))
+    offsets = (amplitude * np.sin(2 * np.pi * rng.integers(1, 4) * t) + rng.uniform(-10, 10, t.shape)) * normal
+    offsets[[0, -1]] = 0
+    return start + t * (stop - start) + offsets
+
+
+def lake(rng, center, size, vertices):
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    sizes = size * (1 + np.sin(3 * angles) / 5) + rng.uniform(-10, 10, vertices)
+    return np.asarray(center) + sizes[:, np.newaxis] * np.column_stack((np.cos(angles), np.sin(angles)))
+
+
+def states(seed, cells=3):
+    # a jittered grid of states whose borders are shared point for point, the way neighbouring features come out of
+    # the projected GeoJSON
+    rng = np.random.default_rng(seed)
+    size = region_conversion * 16
+    corners = (np.stack(np.meshgrid(np.arange(cells + 1), np.arange(cells + 1), indexing="ij"), axis=-1) * size
+               + rng.uniform(-size / 6, size / 6, (cells + 1, cells + 1, 2)))
+
+    borders = {}
+
+    def border(a, b):
+        if (b, a) in borders:
+            return borders[(b, a)][::-1]
+        if (a, b) not in borders:
+            borders[(a, b)] = wiggle(rng, corners[a], corners[b], int(rng.integers(20, 150)), rng.uniform(0, 800))
+        return borders[(a, b)]
+
+    features = []
+    for i in range(cells):
+        for j in range(cells):
+            path = [(i, j), (i + 1, j), (i + 1, j + 1), (i, j + 1), (i, j)]
+            ring = np.concatenate([border(a, b)[:-1] for a, b in zip(path[:-1], path[1:])])
+            polygon = MyPolygon.from_projected([np.concatenate((ring, ring[:1]))])
+            features.append(Feature.from_polygons(f"S{i}{j}", [polygon]))
+
+    return features
+
+
+def lakeland(seed):
+    # a state with a lake, and an island state filling that lake exactly, starting elsewhere on it and running the
+    # other way round
+    rng = np.random.default_rng(seed)
+    size = region_conversion * 40
+    hole = lake(rng, (0, 0), size / 2, 300)
+    return [Feature.from_polygons("Lakeland", [MyPolygon.from_projected([lake(rng, (0, 0), size, 300), hole])]),
+            Feature.from_polygons("Island", [MyPolygon.from_projected([np.roll(hole[::-1], 17, axis=0)])])]
+
+
+def edge_counts(features):
+    counts = Counter()
+    for feature in features:
+        for poly in feature.polygons:
+            for ring in poly.rings:
+                for start, stop in zip(ring, np.roll(ring, -1, axis=0)):
+                    if not np.array_equal(start, stop):
+                        counts[tuple(sorted((tuple(start), tuple(stop))))] += 1
+    return counts
+
+
+def simplified(features):
+    features = copy.deepcopy(features)
+    Map.simplify_features(features, simplify_tolerance)
+    return features
+
+
+def region_lattice(features):
+    bounds = np.array([poly.bounds for feature in features for poly in feature.polygons])
+    low = np.ceil(bounds[:, :2].min(axis=0) / region_conversion)
+    high = np.floor(bounds[:, 2:].max(axis=0) / region_conversion)
+    x, y = np.meshgrid(np.arange(low[0], high[0] + 1), np.arange(low[1], high[1] + 1))
+    return np.column_stack((x.ravel(), y.ravel())) * float(region_conversion)
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_shared_borders_stay_shared(seed):
+    features = states(seed)
+    before = edge_counts(features)
+    after = edge_counts(simplified(features))
+
+    assert sum(after.values()) < 0.8 * sum(before.values())
+
+    # every simplified edge is either on the outline of the whole grid or shared by exactly two rings, no slivers
+    outline = {point for edge, count in before.items() if count == 1 for point in edge}
+    assert set(after.values()) <= {1, 2}
+    assert all(point in outline for edge, count in after.items() if count == 1 for point in edge)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_segment_index_drops_simplified_shared_edges(seed):
+    features = simplified(states(seed))
+    grid, owners = Map.build_segment_index(features)
+    # explicitly closed rings add a zero length edge of their own
+    edges = np.any(grid.start != grid.stop, axis=1)
+
+    assert np.count_nonzero(edges) == sum(count == 1 for count in edge_counts(features).values())
+
+
+@pytest.mark.parametrize("make, seed", [(states, seed) for seed in range(6)] + [(lakeland, 0)])
+def test_lattice_classification_unchanged(make, seed):
+    features = make(seed)
+    after = simplified(features)
+    points = region_lattice(features)
+
+    for original, feature in zip(features, after):
+        for before_poly, after_poly in zip(original.polygons, feature.polygons):
+            assert np.array_equal(after_poly.contains_points(points, radius),
+                                  before_poly.contains_points(points, radius))
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_island_and_lake_keep_the_same_vertices(seed):
+    features = simplified(lakeland(seed))
+    hole = features[0].polygons[0].rings[1]
+    island = features[1].polygons[0].rings[0]
+
+    assert len(hole) < 150
+    assert {tuple(point) for point in hole} == {tuple(point) for point in island}
+
+    grid, owners = Map.build_segment_index(features)
+    assert not len(owners) or "Island" not in {features[owner].name for owner in owners}
+
+
+def test_chains_split_at_junctions():
+    # three rings meeting at two points: the two shared chains are simplified once each
+    top = wiggle(np.random.default_rng(1), np.array([0.0, 0.0]), np.array([4096.0, 0.0]), 30, 100)
+    bottom = wiggle(np.random.default_rng(2), np.array([4096.0, 0.0]), np.array([0.0, 0.0]), 30, 100)
+    upper = np.array([[4096.0, 2048.0], [0.0, 2048.0]])
+    lower = np.array([[0.0, -2048.0], [4096.0, -2048.0]])
+
+    rings = [np.concatenate((top, upper)), np.concatenate((bottom, lower)), np.concatenate((top[:-1], bottom[:-1]))]
+    ids = PolygonSimplifier.vertex_ids(rings)
+    nodes = PolygonSimplifier.nodes(rings, ids)
+    keeps = PolygonSimplifier.simplify_chains(rings, ids, 64)
+
+    assert [ring[positions].tolist() for ring, positions in zip(rings, nodes)][2] == [[0, 0], [4096, 0]]
+    assert np.array_equal(keeps[0][:32], keeps[2][:32])
+    assert np.array_equal(keeps[1][:32], np.append(keeps[2][31:], keeps[2][0]))
+    assert not keeps[2].all()
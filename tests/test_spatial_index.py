@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from SpatialIndex import SegmentGrid
+
+
+def brute_force(points, start, stop):
+    distances = np.stack([np.sqrt(SegmentGrid.squared_distances(points, np.broadcast_to(a, points.shape),
+                                                                np.broadcast_to(b, points.shape)))
+                          for a, b in zip(start, stop)], axis=1)
+    return distances.min(axis=1)
+
+
+def check(start, stop, points):
+    grid = SegmentGrid(start, stop)
+    distance, nearest = grid.nearest(points)
+    expected = brute_force(points, start, stop)
+
+    np.testing.assert_allclose(distance, expected, rtol=0, atol=1e-9 * max(1.0, np.abs(points).max()))
+    # the id returned is of a segment that is actually that far away
+    np.testing.assert_allclose(np.sqrt(SegmentGrid.squared_distances(points, start[nearest], stop[nearest])),
+                               distance, rtol=0, atol=1e-9 * max(1.0, np.abs(points).max()))
+
+
+def polygon(rng, vertices, scale):
+    angles = np.sort(rng.uniform(0, 2 * np.pi, vertices))
+    radii = scale * rng.uniform(0.5, 1.0, vertices)
+    ring = np.column_stack((radii * np.cos(angles), radii * np.sin(angles))) + rng.uniform(-1e6, 1e6, 2)
+    return ring, np.roll(ring, -1, axis=0)
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_random_segments(seed):
+    rng = np.random.default_rng(seed)
+    count = int(rng.integers(1, 300))
+    start = rng.uniform(-1e4, 1e4, (count, 2)) * rng.uniform(0.01, 1)
+    stop = start + rng.normal(0, rng.uniform(1, 3000), (count, 2))
+    points = np.concatenate((rng.uniform(-2e4, 2e4, (500, 2)), start[:50], stop[:50]))
+
+    check(start, stop, points)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_closed_polygons(seed):
+    rng = np.random.default_rng(100 + seed)
+    start, stop = polygon(rng, int(rng.integers(500, 5000)), 16 * 32 * rng.uniform(10, 500))
+    bounds = np.concatenate((start.min(axis=0), start.max(axis=0)))
+    points = np.column_stack((rng.uniform(bounds[0], bounds[2], 1000), rng.uniform(bounds[1], bounds[3], 1000)))
+
+    check(start, stop, np.concatenate((points, start)))
+
+
+def test_axis_aligned():
+    # region aligned squares with edges on the grid's cell boundaries and points on the lattice
+    rng = np.random.default_rng(7)
+    corners = rng.integers(-50, 50, (30, 2)) * 512
+    sides = rng.integers(1, 10, (30, 1)) * 512
+    start = []
+    stop = []
+    for corner, side in zip(corners, sides):
+        ring = corner + np.array([(0, 0), (1, 0), (1, 1), (0, 1)]) * side
+        start.append(ring)
+        stop.append(np.roll(ring, -1, axis=0))
+    start = np.concatenate(start).astype(np.float64)
+    stop = np.concatenate(stop).astype(np.float64)
+
+    lattice = np.stack(np.meshgrid(np.arange(-60, 70), np.arange(-60, 70)), axis=-1).reshape(-1, 2) * 512.0
+    check(start, stop, lattice)
+
+
+def test_degenerate_input():
+    grid = SegmentGrid(np.zeros((0, 2)), np.zeros((0, 2)))
+    distance, nearest = grid.nearest(np.array([[1.0, 2.0]]))
+    assert np.isinf(distance[0]) and nearest[0] == -1
+
+    # a single point-like segment
+    check(np.array([[3.0, 4.0]]), np.array([[3.0, 4.0]]), np.array([[0.0, 0.0], [3.0, 4.0], [-100.0, 50.0]]))
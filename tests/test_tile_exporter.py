@@ -0,0 +1,52 @@
+import numpy as np
+from PIL import Image
+
+from PointTable import PointTable
+from TileExporter import TileExporter
+
+REGION = 512
+
+
+def exporter(colors, points):
+    # regions 0 and 1 far apart, so they never share a tile at the zoom levels exported
+    points = np.asarray(points)
+    table = PointTable(points[:, 0] * REGION, points[:, 1] * REGION, points[:, 2])
+    border = np.array([(0, 0), (REGION * 8, 0), (REGION * 8, REGION * 8)], dtype=np.float64)
+    return TileExporter(table, colors, [border], REGION, "border")
+
+
+POINTS = [(0, 0, 0), (1, 0, 0), (2, 3, 0), (4000, 4000, 1), (4001, 4000, 1)]
+
+
+def export(tmp_path, colors, points):
+    return exporter(colors, points).export(str(tmp_path), min_zoom=7, max_zoom=9, workers=2)
+
+
+def test_unchanged_input_renders_nothing(tmp_path):
+    first = export(tmp_path, ["red", "blue"], POINTS)
+    second = export(tmp_path, ["red", "blue"], POINTS)
+
+    assert first["rendered"] == first["tiles"] > 0
+    assert second == {"tiles": first["tiles"], "rendered": 0, "removed": 0}
+
+
+def test_changed_color_redraws_only_the_tiles_of_that_region(tmp_path):
+    export(tmp_path, ["red", "blue"], POINTS)
+    result = export(tmp_path, ["red", "green"], POINTS)
+
+    # one tile of region 1 per zoom level
+    assert result["rendered"] == 3
+    x, y = exporter(["red", "green"], POINTS).to_pixels(4000 * REGION, 4000 * REGION, 9)
+    size = TileExporter.TILE_SIZE
+    with Image.open(tmp_path / f"9/{int(x) // size}/{int(y) // size}.png") as image:
+        assert image.getpixel((int(x) % size, int(y) % size)) == (0, 128, 0, 255)
+
+
+def test_changed_coverage_redraws_and_removes_the_affected_tiles(tmp_path):
+    export(tmp_path, ["red", "blue"], POINTS)
+    result = export(tmp_path, ["red", "blue"], POINTS[:3] + [(4002, 4000, 1)])
+
+    assert result["rendered"] == 3 and result["removed"] == 0
+
+    result = export(tmp_path, ["red", "blue"], POINTS[:3])
+    assert result["rendered"] == 0 and result["removed"] == 3